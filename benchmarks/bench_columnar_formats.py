@@ -0,0 +1,110 @@
+"""Benchmark columnar storage options for the monthly dataset.
+
+Writes a synthetic dataset partitioned by 'période' and sorted by 'siren', like
+`post_join_processing.py` does, using several file formats, compression codecs and
+bloom filter settings. For each setting, the size on disk, writing time, and the
+execution time of a single siren lookup and of a month slice are reported.
+
+USAGE
+    spark-submit bench_columnar_formats.py [--n_siren N] [--n_months M]
+    [--n_features F] [--block_size BYTES]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pyspark.sql.functions as F
+
+import sf_datalake.io
+import sf_datalake.utils
+
+parser = argparse.ArgumentParser(description="Benchmark columnar storage options.")
+parser.add_argument("--n_siren", type=int, default=200_000)
+parser.add_argument("--n_months", type=int, default=60)
+parser.add_argument("--n_features", type=int, default=30)
+parser.add_argument("--block_size", type=int, default=16 * 2**20)
+args = parser.parse_args()
+
+spark = sf_datalake.utils.get_spark_session()
+
+df = (
+    spark.range(args.n_siren)
+    .select(F.format_string("%09d", "id").alias("siren"))
+    .crossJoin(
+        spark.range(args.n_months).select(
+            F.expr("add_months(to_date('2016-01-01'), cast(id as int))").alias(
+                "période"
+            )
+        )
+    )
+    .select(
+        "siren",
+        "période",
+        *(F.rand(seed=i).alias(f"feature_{i}") for i in range(args.n_features)),
+    )
+    .cache()
+)
+df.count()
+
+settings = [
+    ("orc", None, None),
+    ("orc", "zlib", ["siren"]),
+    ("parquet", "snappy", None),
+    ("parquet", "snappy", ["siren"]),
+]
+if sf_datalake.utils.spark_version() >= (3, 2):
+    settings.append(("parquet", "zstd", ["siren"]))
+
+lookup_siren = f"{args.n_siren // 2:09d}"
+slice_month = "2018-06-01"
+
+
+def directory_size(root: str) -> int:
+    """Returns the total size of the files found under some directory."""
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(root)
+        for name in names
+    )
+
+
+print(
+    f"{args.n_siren} SIREN x {args.n_months} months, {args.n_features} features, "
+    f"spark {spark.version}"
+)
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for i, (file_format, compression, bloom_filter_columns) in enumerate(settings):
+        output_path = os.path.join(tmp_dir, str(i))
+        start = time.perf_counter()
+        sf_datalake.io.write_data(
+            df,
+            output_path,
+            file_format,
+            partition_by=["période"],
+            sort_by=["période", "siren"],
+            compression=compression,
+            block_size=args.block_size,
+            bloom_filter_columns=bloom_filter_columns,
+        )
+        write_time = time.perf_counter() - start
+        timings = {}
+        for query, condition in (
+            ("lookup", F.col("siren") == lookup_siren),
+            ("slice", F.col("période") == slice_month),
+        ):
+            _, loaded_df = sf_datalake.io.load_data(
+                {"dataset": output_path}, file_format=file_format, filters=condition
+            ).popitem()
+            start = time.perf_counter()
+            loaded_df.agg(F.sum("feature_0")).collect()
+            timings[query] = time.perf_counter() - start
+        name = f"{file_format}/{compression or 'default'}" + (
+            "+bloom" if bloom_filter_columns else ""
+        )
+        print(
+            f"{name:>20}: {directory_size(output_path) / 2 ** 20:8.1f} MiB | "
+            f"write {write_time:7.2f} s | lookup {timings['lookup']:6.2f} s | "
+            f"slice {timings['slice']:6.2f} s"
+        )
@@ -0,0 +1,87 @@
+"""Benchmark interval expansion: range join against a date index vs explosion.
+
+Mimics the spreading of time intervals over a monthly (or daily) time index done in
+the `extract_*.py` preprocessing scripts. The former approach builds a pandas date
+range on the driver and joins it with a non-equi condition, the latter uses
+`sf_datalake.transform.IntervalExploder`. Execution time and physical plan operators
+are reported for each approach.
+
+USAGE
+    spark-submit bench_interval_exploder.py [--n_rows N] [--frequency {month,day}]
+
+"""
+import argparse
+import time
+
+import pandas as pd
+import pyspark.sql.functions as F
+from plan_utils import plan_summary
+
+import sf_datalake.transform
+import sf_datalake.utils
+
+parser = argparse.ArgumentParser(description="Benchmark interval expansion.")
+parser.add_argument("--n_rows", type=int, default=1_000_000)
+parser.add_argument("--frequency", choices=["month", "day"], default="month")
+parser.add_argument("--min_date", default="2014-01-01")
+parser.add_argument("--max_date", default="2024-01-01")
+parser.add_argument("--max_length", type=int, default=365, help="In days.")
+args = parser.parse_args()
+
+spark = sf_datalake.utils.get_spark_session()
+
+n_days = (pd.Timestamp(args.max_date) - pd.Timestamp(args.min_date)).days
+df = (
+    spark.range(args.n_rows)
+    .select(
+        F.col("id").cast("string").alias("siren"),
+        F.expr(
+            f"date_add(to_date('{args.min_date}'), cast(rand(0) * {n_days} as int))"
+        ).alias("date_début"),
+        F.rand(seed=1).alias("value"),
+    )
+    .withColumn(
+        "date_fin",
+        F.expr(f"date_add(date_début, 1 + cast(rand(2) * {args.max_length} as int))"),
+    )
+    .cache()
+)
+df.count()
+
+date_range = spark.createDataFrame(
+    pd.DataFrame(
+        pd.date_range(
+            args.min_date,
+            args.max_date,
+            freq="MS" if args.frequency == "month" else "D",
+        )
+        .to_series()
+        .dt.date,
+        columns=["période"],
+    )
+)
+approaches = {
+    "range join": df.join(
+        date_range,
+        on=date_range["période"].between(
+            df["date_début"], F.date_sub(df["date_fin"], 1)
+        ),
+        how="inner",
+    ),
+    "explode": sf_datalake.transform.IntervalExploder(
+        start="date_début",
+        end="date_fin",
+        frequency=args.frequency,
+        min_date=args.min_date,
+        max_date=args.max_date,
+    ).transform(df),
+}
+
+operators = ("Exchange", "BroadcastNestedLoopJoin", "CartesianProduct", "Generate")
+print(f"{args.n_rows} intervals, {args.frequency} frequency, spark {spark.version}")
+for name, output_df in approaches.items():
+    start = time.perf_counter()
+    n_rows = output_df.count()
+    elapsed = time.perf_counter() - start
+    summary = plan_summary(output_df, operators=operators)
+    print(f"{name:>10}: {elapsed:8.2f} s | {n_rows} rows | {summary}")
@@ -0,0 +1,70 @@
+"""Benchmark `sf_datalake.transform.LinearInterpolationOperator` computation modes.
+
+A mock monthly dataset is generated with a fraction of missing values in each
+interpolated column. For each mode, the analysis (planning) time, physical plan operator
+counts and execution time are reported.
+
+USAGE
+    spark-submit bench_linear_interpolation.py [--n_siren N] [--n_months M] \
+[--n_columns C]
+
+"""
+import argparse
+import time
+
+import pyspark.sql.functions as F
+from plan_utils import plan_summary
+
+import sf_datalake.transform
+import sf_datalake.utils
+
+parser = argparse.ArgumentParser(description="Benchmark linear interpolation modes.")
+parser.add_argument("--n_siren", type=int, default=100_000)
+parser.add_argument("--n_months", type=int, default=120)
+parser.add_argument("--n_columns", type=int, default=20)
+parser.add_argument("--null_ratio", type=float, default=0.3)
+parser.add_argument("--modes", nargs="+", default=["projection", "pandas"])
+args = parser.parse_args()
+
+spark = sf_datalake.utils.get_spark_session()
+columns = [f"x{i}" for i in range(args.n_columns)]
+df = (
+    spark.range(args.n_siren)
+    .select(F.col("id").cast("string").alias("siren"))
+    .crossJoin(
+        spark.range(args.n_months).select(
+            F.expr("add_months(to_date('2014-01-01'), cast(id as int))").alias(
+                "période"
+            )
+        )
+    )
+    .select(
+        "siren",
+        "période",
+        *(
+            F.when(F.rand(seed=i) > args.null_ratio, F.randn(seed=i)).alias(col)
+            for i, col in enumerate(columns)
+        ),
+    )
+    .cache()
+)
+df.count()
+
+print(
+    f"{args.n_siren} SIREN x {args.n_months} months x {args.n_columns} columns, "
+    f"spark {spark.version}"
+)
+for mode in args.modes:
+    start = time.perf_counter()
+    output_df = sf_datalake.transform.LinearInterpolationOperator(
+        inputCols=columns, mode=mode
+    ).transform(df)
+    summary = plan_summary(output_df)
+    analysis_time = time.perf_counter() - start
+    start = time.perf_counter()
+    output_df.agg(*(F.count(col) for col in columns)).collect()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{mode:>10}: analysis {analysis_time:6.2f} s, execution {elapsed:8.2f} s | "
+        f"{summary}"
+    )
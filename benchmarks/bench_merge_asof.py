@@ -0,0 +1,75 @@
+"""Benchmark the as-of merge of monthly data with yearly data.
+
+Mimics the join of the monthly dataset with yearly DGFiP data performed in
+`join_datasets.py`. For each merge direction, the number of shuffles (`Exchange`),
+sorts and window operators found in the physical plan is reported, as well as the
+execution time.
+
+USAGE
+    spark-submit bench_merge_asof.py [--n_siren N] [--n_months M] [--n_features F]
+
+"""
+import argparse
+import time
+
+import pyspark.sql.functions as F
+from plan_utils import plan_summary
+
+import sf_datalake.utils
+
+parser = argparse.ArgumentParser(description="Benchmark asof merge.")
+parser.add_argument("--n_siren", type=int, default=1_000_000)
+parser.add_argument("--n_months", type=int, default=120)
+parser.add_argument("--n_features", type=int, default=30)
+parser.add_argument("--tolerance", type=int, default=365)
+args = parser.parse_args()
+
+spark = sf_datalake.utils.get_spark_session()
+
+sirens = spark.range(args.n_siren).select(F.col("id").cast("string").alias("siren"))
+df_monthly = (
+    sirens.crossJoin(
+        spark.range(args.n_months).select(
+            F.expr("add_months(to_date('2014-01-01'), cast(id as int))").alias(
+                "période"
+            )
+        )
+    )
+    .withColumn("ca", F.rand(seed=0))
+    .cache()
+)
+df_yearly = (
+    sirens.crossJoin(
+        spark.range(args.n_months // 12 + 1).select(
+            F.expr("add_months(to_date('2013-12-31'), 12 * cast(id as int))").alias(
+                "période"
+            )
+        )
+    )
+    .select(
+        "siren",
+        "période",
+        *(F.rand(seed=i).alias(f"feature_{i}") for i in range(args.n_features)),
+    )
+    .cache()
+)
+df_monthly.count()
+df_yearly.count()
+
+print(
+    f"{args.n_siren} SIREN x {args.n_months} months, "
+    f"{args.n_features} yearly features, spark {spark.version}"
+)
+for direction in ("backward", "forward", "nearest"):
+    output_df = sf_datalake.utils.merge_asof(
+        df_monthly,
+        df_yearly,
+        on="période",
+        by="siren",
+        tolerance=args.tolerance,
+        direction=direction,
+    )
+    start = time.perf_counter()
+    output_df.agg(*(F.count(col) for col in output_df.columns)).collect()
+    elapsed = time.perf_counter() - start
+    print(f"{direction:>9}: {elapsed:8.2f} s | {plan_summary(output_df)}")
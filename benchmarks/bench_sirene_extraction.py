@@ -0,0 +1,205 @@
+"""Benchmark sirene categorical extraction: whole-file pandas reads vs spark.
+
+Mimics `extract_sirene_categorical.py` over synthetic `StockEtablissement` and
+`StockUniteLegale` files. The former approach reads both files with pandas and maps
+regions with `Series.map`, the latter reads them with spark and looks regions up inside
+literal maps. Each approach runs in its own process, for which execution time and peak
+resident set size (RSS) are reported. For spark, the peak RSS of the driver JVM is
+reported as well.
+
+USAGE
+    python bench_sirene_extraction.py [--n_rows N] [--n_filler_columns N]
+
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description="Benchmark sirene extraction.")
+parser.add_argument("--n_rows", type=int, default=2_000_000)
+parser.add_argument(
+    "--n_filler_columns",
+    type=int,
+    default=40,
+    help="Number of unused columns, the actual files have about 50 columns.",
+)
+parser.add_argument("--approach", choices=["pandas", "spark"], help=argparse.SUPPRESS)
+parser.add_argument("--data_dir", help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+REGIONS = {f"{i:02d}": f"région_{i % 13}" for i in range(1, 96)}
+REGIONS.update({"97": "DROM", "2A": "Corse-du-Sud", "2B": "Haute-Corse"})
+DROM = {f"97{i}": f"drom_{i}" for i in range(1, 7)}
+
+
+def generate_data(data_dir: str):
+    """Writes synthetic "établissement" and "unité légale" files."""
+    rng = random.Random(0)
+    fillers = [f"filler{i}" for i in range(args.n_filler_columns)]
+    departments = list(REGIONS) + ["98"]
+    with open(
+        os.path.join(data_dir, "et.csv"), "w", newline="", encoding="utf-8"
+    ) as f_et, open(
+        os.path.join(data_dir, "ul.csv"), "w", newline="", encoding="utf-8"
+    ) as f_ul:
+        et_writer, ul_writer = csv.writer(f_et), csv.writer(f_ul)
+        et_writer.writerow(
+            [
+                "siren",
+                "siret",
+                "etablissementSiege",
+                "codeCommuneEtablissement",
+                "activitePrincipaleEtablissement",
+            ]
+            + fillers
+        )
+        ul_writer.writerow(["siren", "categorieJuridiqueUniteLegale"] + fillers)
+        for i in range(args.n_rows):
+            siren = f"{i // 2:09d}"
+            et_writer.writerow(
+                [
+                    siren,
+                    f"{siren}{i % 2:05d}",
+                    "true" if i % 2 == 0 else "false",
+                    f"{rng.choice(departments)}{rng.randint(0, 999):03d}",
+                    f"{rng.randint(1, 99):02d}.{rng.randint(0, 99):02d}Z",
+                ]
+                + ["x" * 8] * args.n_filler_columns
+            )
+            if i % 2 == 0:
+                ul_writer.writerow(
+                    [siren, str(rng.randint(1000, 9999))]
+                    + ["x" * 8] * args.n_filler_columns
+                )
+
+
+def run_pandas(data_dir: str, output_path: str):
+    """Former approach: whole-file pandas reads and join."""
+    # pylint: disable=import-outside-toplevel
+    import pandas as pd
+
+    df_et = pd.read_csv(
+        os.path.join(data_dir, "et.csv"),
+        usecols=[
+            "siren",
+            "siret",
+            "etablissementSiege",
+            "codeCommuneEtablissement",
+            "activitePrincipaleEtablissement",
+        ],
+        dtype={"siren": str, "siret": str, "codeCommuneEtablissement": str},
+    ).set_index("siren")
+    df_et["région"] = df_et["codeCommuneEtablissement"].str[:2].map(REGIONS)
+    drom = df_et["région"] == "DROM"
+    df_et.loc[drom, "région"] = (
+        df_et.loc[drom, "codeCommuneEtablissement"].str[:3].map(DROM)
+    )
+    df_ul = pd.read_csv(
+        os.path.join(data_dir, "ul.csv"),
+        usecols=["siren", "categorieJuridiqueUniteLegale"],
+        dtype=str,
+    ).set_index("siren")
+    df_et = df_et.loc[df_et["etablissementSiege"]].drop("etablissementSiege", axis=1)
+    df_et.join(df_ul, on="siren", how="inner").to_csv(output_path)
+
+
+def run_spark(data_dir: str, output_path: str) -> float:
+    """New approach: spark reads and literal map lookups.
+
+    Returns:
+        The peak RSS of the driver JVM, in MiB, or NaN if it cannot be read.
+
+    """
+    # pylint: disable=import-outside-toplevel
+    import itertools
+
+    import pyspark.sql.functions as F
+
+    import sf_datalake.io
+    import sf_datalake.utils
+
+    def literal_map(mapping):
+        return F.create_map([F.lit(x) for x in itertools.chain(*mapping.items())])
+
+    spark = sf_datalake.utils.get_spark_session()
+    datasets = sf_datalake.io.load_data(
+        {
+            "et": os.path.join(data_dir, "et.csv"),
+            "ul": os.path.join(data_dir, "ul.csv"),
+        },
+        file_format="csv",
+        infer_schema=False,
+    )
+    df_et = (
+        datasets["et"]
+        .filter(F.col("etablissementSiege").cast("boolean"))
+        .select(
+            "siren",
+            "siret",
+            F.col("codeCommuneEtablissement").alias("code_commune"),
+            F.col("activitePrincipaleEtablissement").alias("code_naf"),
+        )
+    )
+    région = literal_map(REGIONS)[F.substring("code_commune", 1, 2)]
+    df_et = df_et.withColumn(
+        "région",
+        F.when(
+            région == "DROM", literal_map(DROM)[F.substring("code_commune", 1, 3)]
+        ).otherwise(région),
+    )
+    df_ul = datasets["ul"].select("siren", "categorieJuridiqueUniteLegale")
+    sf_datalake.io.write_data(
+        df_et.join(df_ul, on="siren", how="inner"), output_path, "csv"
+    )
+
+    jvm_peak_rss = float("nan")
+    jvm_process = getattr(spark.sparkContext._gateway, "proc", None)
+    if jvm_process is not None:
+        with open(f"/proc/{jvm_process.pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM"):
+                    jvm_peak_rss = int(line.split()[1]) / 1024
+    return jvm_peak_rss
+
+
+if args.approach is None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generate_data(tmp_dir)
+        size = sum(
+            os.path.getsize(os.path.join(tmp_dir, name))
+            for name in ("et.csv", "ul.csv")
+        )
+        print(f"{args.n_rows} rows, {size / 2 ** 20:.0f} MiB of csv input")
+        for approach in ("pandas", "spark"):
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--approach",
+                    approach,
+                    "--data_dir",
+                    tmp_dir,
+                ],
+                check=True,
+            )
+else:
+    output = os.path.join(args.data_dir, f"output_{args.approach}")
+    start = time.perf_counter()
+    if args.approach == "pandas":
+        run_pandas(args.data_dir, output)
+        extra = ""
+    else:
+        extra = f" | driver JVM peak RSS {run_spark(args.data_dir, output):8.0f} MiB"
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is expressed in KiB on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{args.approach:>7}: {elapsed:8.2f} s | python peak RSS {peak_rss:8.0f} MiB"
+        + extra
+    )
@@ -0,0 +1,85 @@
+"""Benchmark time aggregation: chained single-feature operators vs a single pass.
+
+Both approaches compute the same lags, diffs and moving averages over a mock monthly
+dataset. For each approach, the number of shuffles (`Exchange`), sorts and window
+operators found in the physical plan is reported, as well as the execution time.
+
+USAGE
+    spark-submit bench_time_aggregation.py [--n_siren N] [--n_months M]
+
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import pyspark.sql.functions as F
+from plan_utils import plan_summary
+from pyspark.ml import PipelineModel, Transformer
+
+import sf_datalake.configuration
+import sf_datalake.transform
+import sf_datalake.utils
+
+parser = argparse.ArgumentParser(description="Benchmark time aggregation operators.")
+parser.add_argument("--n_siren", type=int, default=100_000)
+parser.add_argument("--n_months", type=int, default=120)
+parser.add_argument("--configuration", default="standard.json")
+args = parser.parse_args()
+
+spark = sf_datalake.utils.get_spark_session()
+time_aggregation: Dict[
+    str, Dict[str, List[int]]
+] = sf_datalake.configuration.ConfigurationHelper(
+    args.configuration
+).preprocessing.time_aggregation
+features = sorted(
+    set(feature for mapping in time_aggregation.values() for feature in mapping)
+)
+
+df = (
+    spark.range(args.n_siren)
+    .select(F.col("id").cast("string").alias("siren"))
+    .crossJoin(
+        spark.range(args.n_months).select(
+            F.expr("add_months(to_date('2014-01-01'), cast(id as int))").alias(
+                "période"
+            )
+        )
+    )
+    .select(
+        "siren",
+        "période",
+        *(F.rand(seed=i).alias(feature) for i, feature in enumerate(features)),
+    )
+    .cache()
+)
+df.count()
+
+chained_stages: List[Transformer] = []
+for feature, n_months in time_aggregation.get("lag", {}).items():
+    chained_stages.append(
+        sf_datalake.transform.LagOperator(inputCol=feature, n_months=n_months)
+    )
+for feature, n_months in time_aggregation.get("diff", {}).items():
+    chained_stages.append(
+        sf_datalake.transform.DiffOperator(inputCol=feature, n_months=n_months)
+    )
+for feature, n_months in time_aggregation.get("mean", {}).items():
+    chained_stages.append(
+        sf_datalake.transform.MovingAverage(inputCol=feature, n_months=n_months)
+    )
+approaches = {
+    "chained": PipelineModel(chained_stages),
+    "single pass": sf_datalake.transform.TimeAggregationOperator(
+        time_aggregation=time_aggregation
+    ),
+}
+
+
+print(f"{args.n_siren} SIREN x {args.n_months} months, spark {spark.version}")
+for name, transformer in approaches.items():
+    output_df = transformer.transform(df)
+    start = time.perf_counter()
+    output_df.agg(*(F.count(col) for col in output_df.columns)).collect()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>12}: {elapsed:8.2f} s | {plan_summary(output_df)}")
@@ -0,0 +1,54 @@
+"""Benchmark `sf_datalake.transform.vector_disassembler` conversion methods.
+
+A DataFrame holding an assembled features vector is generated, cached and then
+disassembled using each available method. Timings include a full aggregation over every
+disassembled column, so that the conversion is actually computed for each row.
+
+USAGE
+    spark-submit bench_vector_disassembler.py [--n_rows N] [--n_features K]
+
+"""
+import argparse
+import time
+
+import pyspark.sql.functions as F
+from pyspark.ml.feature import VectorAssembler
+
+import sf_datalake.transform
+import sf_datalake.utils
+
+parser = argparse.ArgumentParser(description="Benchmark vector disassembling methods.")
+parser.add_argument("--n_rows", type=int, default=3_000_000)
+parser.add_argument("--n_features", type=int, default=60)
+parser.add_argument(
+    "--methods",
+    nargs="+",
+    default=["udf", "native"],
+    help="Methods to benchmark, 'native' requires spark >= 3.0.",
+)
+args = parser.parse_args()
+
+spark = sf_datalake.utils.get_spark_session()
+features = [f"f{i}" for i in range(args.n_features)]
+df = spark.range(args.n_rows).select(
+    F.col("id").cast("string").alias("siren"),
+    *(F.rand(seed=i).alias(feature) for i, feature in enumerate(features)),
+)
+df = (
+    VectorAssembler(inputCols=features, outputCol="features")
+    .transform(df)
+    .select("siren", "features")
+    .cache()
+)
+df.count()
+
+print(f"{args.n_rows} rows, {args.n_features} features, spark {spark.version}")
+for method in args.methods:
+    start = time.perf_counter()
+    sf_datalake.transform.vector_disassembler(
+        df, features, "features", keep=["siren"], method=method
+    ).agg(*(F.sum(feature) for feature in features)).collect()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{method:>8}: {elapsed:8.2f} s ({args.n_rows / elapsed:,.0f} rows / s)",
+    )
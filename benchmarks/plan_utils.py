@@ -0,0 +1,31 @@
+"""Helpers shared by benchmark scripts."""
+import re
+from typing import Iterable
+
+import pyspark.sql
+
+
+def plan_summary(
+    df: pyspark.sql.DataFrame,
+    operators: Iterable[str] = ("Exchange", "Sort", "Window"),
+) -> str:
+    """Counts some costly physical operators found in a DataFrame's executed plan.
+
+    Args:
+        df: A DataFrame.
+        operators: Names of physical plan operators to count.
+
+    Returns:
+        A printable summary of operators counts.
+
+    """
+    plan = (
+        df._jdf.queryExecution()  # pylint: disable=protected-access
+        .executedPlan()
+        .toString()
+    )
+    counts = {
+        operator: len(re.findall(r"\b" + operator + r"\b", plan))
+        for operator in operators
+    }
+    return ", ".join(f"{operator}: {count}" for operator, count in counts.items())
@@ -8,9 +8,11 @@
 * ``evaluation.py`` - Model performance computations.
 * ``explain.py`` - SHAP-based predictions explanation.
 * ``exploration.py`` - Data exploration-dedicated functions.
+* ``feature_store.py`` - Persistent storage of pre-processed datasets.
 * ``io.py`` - I/O functions.
 * ``model_selection.py`` - Data sampling, model selection utilities.
 * ``predictions.py`` - Post-process model predictions (generation of alert levels etc.)
+* ``schemas.py`` - Schemas of the csv data sources.
 * ``transform.py`` - Utilities and classes for handling and transforming datasets.
 * ``utils.py`` - Misc utility functions (e.g. spark session handling, etc.)
 """
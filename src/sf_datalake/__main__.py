@@ -9,7 +9,7 @@ import logging
 import os
 import sys
 from os import path
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 import pyspark
@@ -22,7 +22,9 @@ sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
 # isort: on
 
 import sf_datalake.configuration
+import sf_datalake.evaluation
 import sf_datalake.explain
+import sf_datalake.feature_store
 import sf_datalake.io
 import sf_datalake.model_selection
 import sf_datalake.transform
@@ -59,6 +61,26 @@ path_group.add_argument(
     Path (relative to root_directory) to the dataset that will be used for training,
     test or prediction.""",
 )
+path_group.add_argument(
+    "--dataset_format",
+    type=str,
+    choices=["orc", "parquet", "delta", "table"],
+    help="""
+    Format of the dataset. If 'table', the `dataset` argument should be the name of a
+    table, e.g., a dataset bucketed by SIREN.
+    """,
+)
+path_group.add_argument(
+    "--feature_store",
+    dest="feature_store_path",
+    type=str,
+    help="""
+    Path (relative to root_directory) to a feature store. If set, the fitted
+    pre-processing pipeline and the pre-processed dataset are loaded from this store if
+    they were previously computed using the same data and pre-processing parameters, or
+    saved to it otherwise.
+    """,
+)
 path_group.add_argument(
     "--prediction_path",
     type=str,
@@ -115,27 +137,54 @@ parser.add_argument(
     """,
 )
 
+parser.add_argument(
+    "--instrument",
+    action="store_true",
+    help="""
+    If specified, per-stage metrics of the pre-processing pipeline are computed and
+    written along with the run configuration.
+    """,
+)
+
 args = vars(parser.parse_args())
+logging.basicConfig(level=logging.INFO)
 
 # Parse configuration files and possibly override parameters.
 # Then, dump all used configuration inside the output directory.
 config_file: str = args.pop("configuration")
 dump_keys: List[str] = args.pop("dump_keys")
+instrument: bool = args.pop("instrument")
 
 configuration = sf_datalake.configuration.ConfigurationHelper(
     config_file=config_file, cli_args=args
 )
 configuration.dump(dump_keys)
 
-# Prepare data.
+# Prepare data. Only the columns and months used for training, test or prediction are
+# read.
+train_start_date, train_end_date = (
+    sf_datalake.utils.to_date(date) for date in configuration.learning.train_dates
+)
+prediction_date = sf_datalake.utils.to_date(configuration.learning.prediction_date)
+dataset_location = (
+    configuration.io.dataset_path
+    if configuration.io.dataset_format == "table"
+    else path.join(configuration.io.root_directory, configuration.io.dataset_path)
+)
 _, raw_dataset = sf_datalake.io.load_data(
-    {
-        "dataset": path.join(
-            configuration.io.root_directory, configuration.io.dataset_path
-        )
-    },
-    file_format="orc",
+    {"dataset": dataset_location},
+    file_format=configuration.io.dataset_format,
+    version=configuration.io.dataset_version,
+    columns=configuration.required_columns(),
+    filters=(
+        (train_start_date <= F.col("période")) & (F.col("période") < train_end_date)
+    )
+    | (F.col("période") == prediction_date),
 ).popitem()
+logging.info(
+    "Estimated dataset size: %d bytes.",
+    sf_datalake.utils.estimated_size_in_bytes(raw_dataset),
+)
 
 if configuration.io.sample_ratio != 1.0:
     raw_dataset = raw_dataset.sample(
@@ -144,41 +193,72 @@ if configuration.io.sample_ratio != 1.0:
 
 
 ## Pre-processing pipeline
-preprocessing_pipeline = Pipeline(stages=configuration.encoding_scaling_stages())
-preprocessing_pipeline_model = preprocessing_pipeline.fit(raw_dataset)
-pre_dataset = preprocessing_pipeline_model.transform(raw_dataset).cache()
-
-# Split the dataset into train, test for evaluation.
-train_data, test_data = sf_datalake.model_selection.train_test_split(
-    pre_dataset.filter(
-        (
-            sf_datalake.utils.to_date(configuration.learning.train_dates[0])
-            <= F.col("période")
+# If a feature store is used, pre-processing is skipped whenever its output was stored
+# by a previous run.
+stored_features = None
+if configuration.io.feature_store_path is not None:
+    feature_store_location = path.join(
+        configuration.io.root_directory, configuration.io.feature_store_path
+    )
+    feature_store_key = sf_datalake.feature_store.preprocessing_key(
+        raw_dataset, configuration
+    )
+    stored_features = sf_datalake.feature_store.load_features(
+        feature_store_location, feature_store_key
+    )
+if stored_features is not None:
+    preprocessing_pipeline_model, pre_dataset = stored_features
+    pre_dataset = pre_dataset.cache()
+    if instrument:
+        logging.warning(
+            "Pre-processed dataset was loaded from the feature store, no pipeline "
+            "metrics will be written."
         )
-        & (
-            F.col("période")
-            < sf_datalake.utils.to_date(configuration.learning.train_dates[1])
+else:
+    preprocessing_pipeline = Pipeline(stages=configuration.encoding_scaling_stages())
+    preprocessing_pipeline_model = preprocessing_pipeline.fit(raw_dataset)
+    if instrument:
+        preprocessing_pipeline_model = sf_datalake.transform.InstrumentedPipelineModel(
+            preprocessing_pipeline_model.stages, count_rows=True
         )
-    ),
-    configuration.io.random_seed,
+    pre_dataset = preprocessing_pipeline_model.transform(raw_dataset).cache()
+    if configuration.io.feature_store_path is not None:
+        sf_datalake.feature_store.save_features(
+            feature_store_location,
+            feature_store_key,
+            preprocessing_pipeline_model,
+            pre_dataset,
+        )
+    if instrument:
+        preprocessing_pipeline_model.write_metrics(
+            path.join(
+                configuration.io.root_directory,
+                configuration.io.prediction_path,
+                "pipeline_metrics",
+            )
+        )
+
+# Split the dataset into train, test for evaluation, and prediction subsets. All subsets
+# cardinalities are computed in a single pass.
+subsets, class_counts = sf_datalake.model_selection.learning_subsets(
+    pre_dataset,
+    (train_start_date, train_end_date),
+    prediction_date,
+    class_col=configuration.learning.target["class_col"],
+    random_seed=configuration.io.random_seed,
     train_size=configuration.learning.train_size,
-    group_col="siren",
 )
-prediction_data = pre_dataset.filter(
-    F.col("période")
-    == sf_datalake.utils.to_date(configuration.learning.prediction_date)
+train_data, test_data, prediction_data = (
+    subsets[name] for name in ("train", "test", "prediction")
 )
 
-assert train_data.count() > 0, "Train dataset is empty."
-assert test_data.count() > 0, "Test dataset is empty."
-assert prediction_data.count() > 0, "Prediction dataset is empty."
-
 # Resample train dataset following requested classes balance
 resampler = sf_datalake.transform.RandomResampler(
     class_col=configuration.learning.target["class_col"],
     method=configuration.learning.target["resampling_method"],
     min_class_ratio=configuration.learning.target["target_resampling_ratio"],
     seed=configuration.io.random_seed,
+    class_counts=class_counts["train"],
 )
 resampled_train_data = resampler.transform(train_data)
 
@@ -195,6 +275,26 @@ if isinstance(classifier_model, pyspark.ml.classification.LogisticRegressionMode
     logging.info("Model weights: %.3f", classifier_model.coefficients)
     logging.info("Model intercept: %.3f", classifier_model.intercept)
 
+# Evaluate model over the test set.
+class_col = configuration.learning.target["class_col"]
+test_scores = sf_datalake.transform.vector_disassembler(
+    test_transformed,
+    ["comp_probability", "probability"],
+    assembled_col="probability",
+    keep=[class_col],
+)
+for beta, threshold in sf_datalake.evaluation.spark_optimal_beta_thresholds(
+    test_scores, label_col=class_col
+).items():
+    logging.info(
+        "Test set metrics at F%s-optimal threshold %.2f: %s",
+        beta,
+        threshold,
+        sf_datalake.evaluation.spark_metrics(
+            test_scores, beta=beta, thresh=threshold, label_col=class_col
+        ),
+    )
+
 # Retrieve features names
 def is_scaler_col(x: str) -> bool:
     """Tests if column name starts with a known scaler name."""
@@ -215,30 +315,96 @@ for scaler_col in filter(is_scaler_col, pre_dataset.columns):
             model_features[i] = inner_columns[int(col.split("_")[-1])]
 
 # Compute predictions explanation
-shap_values, expected_value = sf_datalake.explain.explanation_data(
-    model_features,
-    configuration.learning.features_column,
+# Shap values are expressed in log-odds units for these models, they will be converted
+# to [0, 1] range.
+log_odds_output = isinstance(
     classifier_model,
-    train_transformed,
-    prediction_transformed,
-    configuration.explanation.n_train_sample,
+    (
+        pyspark.ml.classification.LogisticRegressionModel,
+        pyspark.ml.classification.GBTClassificationModel,
+    ),
 )
-macro_scores, concerning_scores = sf_datalake.explain.explanation_scores(
-    shap_values,
-    configuration.explanation.topic_groups,
-    configuration.explanation.n_concerning_micro,
+
+
+def log_odds_to_probability(df: pyspark.sql.DataFrame) -> pyspark.sql.DataFrame:
+    """Applies the logistic function to double-typed columns."""
+    return df.select(
+        [
+            (1 / (1 + F.exp(-F.col(field.name)))).alias(field.name)
+            if isinstance(field.dataType, pyspark.sql.types.DoubleType)
+            else field.name
+            for field in df.schema.fields
+        ]
+    )
+
+
+def spark_explanation_scores(
+    shap_df: pyspark.sql.DataFrame,
+) -> Tuple[pyspark.sql.DataFrame, pyspark.sql.DataFrame]:
+    """Computes macro and concerning scores from SHAP values computed by spark."""
+    macro_df, concerning_df = sf_datalake.explain.spark_explanation_scores(
+        shap_df,
+        configuration.explanation.topic_groups,
+        configuration.explanation.n_concerning_micro,
+    )
+    if log_odds_output:
+        return log_odds_to_probability(macro_df), log_odds_to_probability(concerning_df)
+    return macro_df, concerning_df
+
+
+interventional_linear_explanation = (
+    isinstance(classifier_model, pyspark.ml.classification.LogisticRegressionModel)
+    and configuration.explanation.feature_perturbation == "interventional"
 )
-# Convert to [0, 1] range if shap values are expressed in log-odds units.
-if isinstance(
+# Other models are explained on the driver, even if distributed explanation is asked.
+distributed_tree_explanation = configuration.explanation.distributed and isinstance(
     classifier_model,
     (
-        pyspark.ml.classification.LogisticRegressionModel,
+        pyspark.ml.classification.DecisionTreeClassificationModel,
+        pyspark.ml.classification.RandomForestClassificationModel,
         pyspark.ml.classification.GBTClassificationModel,
     ),
-):
-    num_cols = concerning_scores.select_dtypes(include="number").columns
-    concerning_scores.loc[:, num_cols] = 1 / (1 + np.exp(-concerning_scores[num_cols]))
-    macro_scores = 1 / (1 + np.exp(-macro_scores))
+)
+if interventional_linear_explanation:
+    shap_values, expected_value = sf_datalake.explain.spark_linear_explanation_data(
+        model_features,
+        configuration.learning.features_column,
+        classifier_model,
+        train_transformed,
+        prediction_transformed,
+    )
+    macro_scores_df, concerning_scores_df = spark_explanation_scores(shap_values)
+elif distributed_tree_explanation:
+    shap_values, expected_value = sf_datalake.explain.spark_tree_explanation_data(
+        model_features,
+        configuration.learning.features_column,
+        classifier_model,
+        prediction_transformed,
+    )
+    macro_scores_df, concerning_scores_df = spark_explanation_scores(shap_values)
+else:
+    shap_values, expected_value = sf_datalake.explain.explanation_data(
+        model_features,
+        configuration.learning.features_column,
+        classifier_model,
+        train_transformed,
+        prediction_transformed,
+        configuration.explanation.n_train_sample,
+        n_train=resampler.resampled_size(class_counts["train"]),
+    )
+    macro_scores, concerning_scores = sf_datalake.explain.explanation_scores(
+        shap_values,
+        configuration.explanation.topic_groups,
+        configuration.explanation.n_concerning_micro,
+    )
+    if log_odds_output:
+        num_cols = concerning_scores.select_dtypes(include="number").columns
+        concerning_scores.loc[:, num_cols] = 1 / (
+            1 + np.exp(-concerning_scores[num_cols])
+        )
+        macro_scores = 1 / (1 + np.exp(-macro_scores))
+    macro_scores_df = spark.createDataFrame(macro_scores.reset_index())
+    concerning_scores_df = spark.createDataFrame(concerning_scores.reset_index())
 
 # Write outputs.
 sf_datalake.io.write_predictions(
@@ -248,6 +414,19 @@ sf_datalake.io.write_predictions(
 )
 sf_datalake.io.write_explanations(
     path.join(configuration.io.root_directory, configuration.io.prediction_path),
-    spark.createDataFrame(macro_scores.reset_index()),
-    spark.createDataFrame(concerning_scores.reset_index()),
+    macro_scores_df,
+    concerning_scores_df,
+)
+for stage in preprocessing_pipeline_model.stages:
+    if isinstance(stage, sf_datalake.transform.MissingValuesDropper):
+        dropped_rows = stage.dropped_rows()
+        if dropped_rows is not None:
+            logging.info(
+                "%d out of %d rows dropped because of missing values in %s",
+                dropped_rows[1],
+                dropped_rows[0],
+                stage.getInputCols(),
+            )
+logging.info(
+    "Bytes read from input sources: %s", sf_datalake.utils.input_bytes_read(spark)
 )
@@ -121,8 +121,9 @@ class LearningConfiguration:
         )
 
 
+# Attributes mirror the configuration file keys, which are kept flat.
 @dataclass
-class PreprocessingConfiguration:
+class PreprocessingConfiguration:  # pylint: disable=too-many-instance-attributes
     """Pre-processing configuration.
 
     Attributes:
@@ -133,6 +134,8 @@ class PreprocessingConfiguration:
           aggregated to number of months.
         drop_missing_values: If true, drop any missing values from datasets before
           proceeding to training.
+        max_drop_ratio: If set, an error is raised when the ratio of rows dropped
+          because of missing values exceeds this value, for any group of features.
         fill_default_values: Mapping from feature name to associated default value.
         fill_imputation_strategy: Mapping from feature name to method for missing value
           imputation.
@@ -162,6 +165,7 @@ class PreprocessingConfiguration:
     time_aggregation: Dict[str, Dict[str, List[int]]] = None
     # Missing values handling
     drop_missing_values: bool = True
+    max_drop_ratio: float = None
     fill_default_values: Dict[str, Any] = None
     fill_imputation_strategy: Dict[str, Any] = None
     # Transformations
@@ -211,16 +215,25 @@ class ExplanationConfiguration:
           prediction) to extract during explanation
         topic_groups: Mapping from a topic to a list of features associated with this
           topic.
+        distributed: If True, tree-based models predictions are explained on the
+          executors, and the prediction set is never collected by the driver.
+        feature_perturbation: How linear models predictions are explained. Either
+          "correlation_dependent", using shap over a sample of the training set, or
+          "interventional", computed in closed form (assuming independent features)
+          over the whole training set, without collecting any data.
 
     """
 
     n_train_sample: int = 5000
     n_concerning_micro: int = 3
     topic_groups: Dict[str, List[str]] = None
+    distributed: bool = False
+    feature_perturbation: str = "correlation_dependent"
 
 
+# Attributes mirror the configuration file keys, which are kept flat.
 @dataclass
-class IOConfiguration:
+class IOConfiguration:  # pylint: disable=too-many-instance-attributes
     """Input output configuration.
 
     Parameters for reading / writing paths, as well as sampling.
@@ -228,7 +241,21 @@ class IOConfiguration:
     Attributes:
         root_directory: Data root directory.
         dataset_path: Path (relative to root_directory) to a dataset that will be used
-          for training, test or prediction.
+          for training, test or prediction. If `dataset_format` is "table", this is a
+          table name instead.
+        dataset_format: Format of the dataset, either "orc", "parquet", "delta" or
+          "table".
+        dataset_version: If set, the version of the dataset that will be read, in case
+          `dataset_format` is "delta".
+        compression: Compression codec used when writing the dataset, e.g. "snappy" or
+          "zstd". If None, spark's default codec for the format is used.
+        block_size: Size, in bytes, of orc stripes / parquet row groups when writing
+          the dataset. If None, the format's default size is used.
+        bloom_filter_columns: Columns for which bloom filters are written along with
+          the dataset, so that point lookups can skip most blocks.
+        feature_store_path: If set, path (relative to root_directory) to a feature
+          store, where pre-processing outputs are saved and looked up (see
+          `sf_datalake.feature_store`).
         prediction_path: Path (relative to root_directory) where predictions and
           runtime parameters will be saved.
         sample_ratio: Loaded data sample size as a fraction of its full size.
@@ -238,6 +265,14 @@ class IOConfiguration:
 
     root_directory: str = "/projets/TSF"
     dataset_path: str = "data/preprocessed/datasets/full_dataset"
+    dataset_format: str = "orc"
+    dataset_version: int = None
+    compression: str = None
+    block_size: int = None
+    bloom_filter_columns: List[str] = dataclasses.field(
+        default_factory=lambda: ["siren"]
+    )
+    feature_store_path: str = None
     prediction_path: str = path.join(f"predictions/{dt.datetime.now().timestamp()}")
     sample_ratio: float = 1.0
     random_seed: int = random.randint(0, 10000)
@@ -292,6 +327,15 @@ class ConfigurationHelper:
                 f"Override argument(s) '{list(override_args.keys())}' could not be "
                 "matched against any ConfigurationHelper attribute."
             )
+        if self.explanation.feature_perturbation not in {
+            "correlation_dependent",
+            "interventional",
+        }:
+            raise ValueError(
+                "Unknown feature perturbation "
+                f"'{self.explanation.feature_perturbation}', should be either "
+                "'correlation_dependent' or 'interventional'."
+            )
 
         # Duplicate config for time-aggregated variables.
         def add_time_aggregate_features(attribute: dict):
@@ -344,6 +388,23 @@ class ConfigurationHelper:
             )
         )
 
+    def required_columns(self) -> List[str]:
+        """Lists the dataset columns required for training, test and prediction.
+
+        These are the identifiers, the features that are transformed before being fed
+        to the model, the target column and the judgment date column.
+
+        Returns:
+            A list of column names.
+
+        """
+        required = ["siren", "période"]
+        required.extend(self.preprocessing.features_transformers)
+        required.extend(
+            self.learning.target[key] for key in ("class_col", "judgment_date_col")
+        )
+        return list(dict.fromkeys(required))
+
     def encoding_scaling_stages(self) -> List[Transformer]:
         """Generates all stages related to feature encoding and sclaing.
 
@@ -411,6 +472,7 @@ class ConfigurationHelper:
                 (
                     sf_datalake.transform.MissingValuesDropper(
                         inputCols=input_cols,
+                        max_drop_ratio=self.preprocessing.max_drop_ratio,
                     ),
                     VectorAssembler(
                         inputCols=input_cols, outputCol=f"{scaler_name}_input"
@@ -426,6 +488,7 @@ class ConfigurationHelper:
             # Filter out features that have already been assembled.
             sf_datalake.transform.MissingValuesDropper(
                 inputCols=model_features,
+                max_drop_ratio=self.preprocessing.max_drop_ratio,
             ),
             VectorAssembler(
                 inputCols=model_features, outputCol=self.learning.features_column
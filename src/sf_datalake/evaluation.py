@@ -1,8 +1,13 @@
 """Evaluation of model predictions. """
 
-from typing import Dict, Iterable
+import multiprocessing
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 import numpy as np
+import pyspark.sql
+import pyspark.sql.functions as F
+import scipy.sparse
 from sklearn.metrics import (
     average_precision_score,
     balanced_accuracy_score,
@@ -14,11 +19,38 @@ from sklearn.metrics import (
 )
 
 
+def _fbeta_scores(
+    tp: np.ndarray, fp: np.ndarray, fn: np.ndarray, betas: Iterable[float]
+) -> np.ndarray:
+    """Computes :math:`F_\\beta` scores from confusion matrices counts.
+
+    Args:
+        tp: True positives counts, for each candidate threshold.
+        fp: False positives counts, for each candidate threshold.
+        fn: False negatives counts, for each candidate threshold.
+        betas: The required :math:`\\beta` values.
+
+    Returns:
+        An array of shape (number of betas, number of thresholds). Scores are set to 0
+        where they are undefined.
+
+    """
+    beta2 = np.square(np.asarray(list(betas), dtype=float))[:, np.newaxis]
+    numerator = (1 + beta2) * tp
+    denominator = numerator + beta2 * fn + fp
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(denominator.shape),
+        where=denominator > 0,
+    )
+
+
 def optimal_beta_thresholds(
     y_true: np.ndarray,
     y_score: np.ndarray,
     betas: Iterable[float] = (0.5, 2.0),
-    n_thr: int = 101,
+    n_thr: Optional[int] = 101,
 ) -> Dict[float, float]:
     """Computes the classification thresholds that maximise :math:`F_\\beta` score.
 
@@ -27,6 +59,11 @@ def optimal_beta_thresholds(
     precision (e.g., :math:`\\beta = 0.5`), while another alert threshold favors recall
     (e.g., :math:`\\beta = 0.5`).
 
+    Scores are sorted once, and true / false positives counts for every candidate
+    threshold are derived from cumulative counts of positive samples, so that all
+    :math:`F_\\beta` scores are computed at once. If several thresholds maximize
+    :math:`F_\\beta`, the lowest one is returned.
+
     Args:
         y_true: The true outcomes. 0 means "no failure within the next 18
           months", while 1 means "failure within the next 18 months".
@@ -35,20 +72,32 @@ def optimal_beta_thresholds(
         betas: The required :math:`\\beta` values for F-score thresholds
           computation.
         n_thr: Size of an even-spaced array of values spanning the [0, 1]
-          interval that will be used as candidate threshold values.
+          interval that will be used as candidate threshold values. If None, every
+          distinct value of `y_score` is used as a candidate threshold.
 
     Returns:
         A dict of (beta, threshold) couples associated with each :math:`\\beta` input
           values.
 
     """
-    thresh_array = np.linspace(0, 1, n_thr)
+    y_true = np.asarray(y_true).ravel() == 1
+    y_score = np.asarray(y_score).ravel()
+    betas = list(betas)
+
+    order = np.argsort(y_score, kind="mergesort")
+    sorted_score = y_score[order]
+    # Number of positive samples among the i lowest scores, for i in [0, n].
+    cum_positives = np.concatenate(([0], np.cumsum(y_true[order])))
+    n_positives = cum_positives[-1]
 
-    f_beta = np.zeros((len(betas), n_thr))
-    for n_t, threshold in enumerate(thresh_array):
-        y_pred = y_score >= threshold
-        for n_b, beta in enumerate(betas):
-            f_beta[n_b, n_t] = fbeta_score(y_true, y_pred, beta)
+    thresh_array = np.unique(y_score) if n_thr is None else np.linspace(0, 1, n_thr)
+    # A sample is predicted positive if its score is greater or equal to the threshold.
+    n_below = np.searchsorted(sorted_score, thresh_array, side="left")
+    tp = n_positives - cum_positives[n_below]
+    fp = (y_score.size - n_below) - tp
+    fn = n_positives - tp
+
+    f_beta = _fbeta_scores(tp, fp, fn, betas)
     thresholds = thresh_array[np.argmax(f_beta, axis=1)]
 
     return dict(zip(betas, thresholds))
@@ -99,3 +148,376 @@ def metrics(
         "Area under Precision-Recall curve": np.round(aucpr, 2),
         "Area under ROC curve": np.round(roc, 2),
     }
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise division, where division by zero yields zero."""
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(np.broadcast(numerator, denominator).shape),
+        where=denominator > 0,
+    )
+
+
+def _histogram_metrics(  # pylint: disable=too-many-locals
+    negatives: np.ndarray, positives: np.ndarray, n_above: int, beta: float
+) -> Dict[str, np.ndarray]:
+    """Computes evaluation metrics from several weighted scores histograms.
+
+    Args:
+        negatives: An array of shape (n_sets, n_bins) of negative samples weights
+          summed over score bins, sorted by decreasing score.
+        positives: An array of shape (n_sets, n_bins) of positive samples weights
+          summed over score bins, sorted by decreasing score.
+        n_above: Number of (leading) bins whose scores are above the classification
+          threshold.
+        beta: Weighting of recall relative to precision for the F-beta score.
+
+    Returns:
+        A mapping from metric names to arrays of shape (n_sets,).
+
+    """
+    zeros = np.zeros((len(positives), 1))
+    tp_curve = np.hstack((zeros, np.cumsum(positives, axis=1, dtype=float)))
+    fp_curve = np.hstack((zeros, np.cumsum(negatives, axis=1, dtype=float)))
+    n_pos, n_neg = tp_curve[:, -1], fp_curve[:, -1]
+
+    tp, fp = tp_curve[:, n_above], fp_curve[:, n_above]
+    fn, tn = n_pos - tp, n_neg - fp
+    recall = _safe_divide(tp, n_pos)
+    specificity = _safe_divide(tn, n_neg)
+
+    tpr = _safe_divide(tp_curve, n_pos[:, np.newaxis])
+    fpr = _safe_divide(fp_curve, n_neg[:, np.newaxis])
+    precision_curve = _safe_divide(tp_curve, tp_curve + fp_curve)
+
+    return {
+        f"F{beta}-score": _fbeta_scores(tp, fp, fn, [beta])[0],
+        "Precision": _safe_divide(tp, tp + fp),
+        "Recall": recall,
+        "Balanced accuracy": (recall + specificity) / 2,
+        "Area under Precision-Recall curve": np.sum(
+            np.diff(tpr, axis=1) * precision_curve[:, 1:], axis=1
+        ),
+        "Area under ROC curve": np.sum(
+            np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1
+        ),
+    }
+
+
+# Data shared by bootstrap worker processes, set once per process.
+_bootstrap_data: Dict[str, Any] = {}
+
+
+def _init_bootstrap_worker(data: Dict[str, Any]):
+    """Stores bootstrap data inside the current process."""
+    _bootstrap_data.update(data)
+
+
+def _bootstrap_chunk(task: Tuple[int, int]) -> Dict[str, np.ndarray]:
+    """Computes metrics over a chunk of bootstrap resamples.
+
+    Each group of samples is drawn a Poisson(1)-distributed number of times, which is
+    used as a weight for all of its samples. Weighted histograms of all resamples are
+    obtained through a single sparse matrix product.
+
+    Args:
+        task: A random seed, and the number of resamples to draw.
+
+    Returns:
+        A mapping from metric names to arrays of metric values over resamples.
+
+    """
+    seed, n_resamples = task
+    data = _bootstrap_data
+    group_weights = np.random.RandomState(seed).poisson(
+        1.0, size=(data["counts"].shape[1], n_resamples)
+    )
+    histograms = data["counts"].dot(group_weights.astype(np.float32)).T
+    return _histogram_metrics(
+        histograms[:, : data["n_keys"]],
+        histograms[:, data["n_keys"] :],
+        data["n_above"],
+        data["beta"],
+    )
+
+
+def metrics_ci(  # pylint: disable=too-many-arguments, too-many-locals
+    y_true: np.ndarray,
+    y_score: np.ndarray,
+    groups: np.ndarray = None,
+    beta: float = 1,
+    thresh: float = 0.5,
+    n_bootstrap: int = 1000,
+    confidence: float = 0.95,
+    n_bins: Optional[int] = 10000,
+    seed: int = None,
+    n_jobs: int = None,
+    chunk_size: int = 50,
+) -> Dict[str, Dict[str, float]]:
+    """Computes evaluation metrics along with bootstrap confidence intervals.
+
+    Resamples are drawn by groups (e.g., SIREN), so that samples associated with a same
+    company are kept together. Instead of copying data, each resample is represented by
+    a vector of Poisson-distributed group weights, and metrics are computed for chunks
+    of resamples at once from weighted scores histograms. Chunks are spread over a pool
+    of processes.
+
+    Threshold-dependent metrics are exact, while areas under the ROC and
+    precision-recall curves are computed over binned scores, as in `spark_metrics`.
+
+    Args:
+        y_true: An array containing the true values.
+        y_score: The computed probability of a failure state within the next
+          18 months.
+        groups (optional): Group label of each sample. If not set, each sample is its
+          own group.
+        beta: Weighting of recall relative to precision for the evaluation.
+          Corresponds to the beta value of the F_beta score.
+        thresh: The probability above which a binary model should classify a
+          sample as positive.
+        n_bootstrap: Number of bootstrap resamples.
+        confidence: Confidence level of the percentile intervals.
+        n_bins (optional): Number of bins spanning the [0, 1) scores interval. If None,
+          each distinct score value gets its own bin.
+        seed (optional): Random seed used to draw resamples.
+        n_jobs (optional): Number of processes. If not set, all CPUs are used. If 1,
+          computations are made inside the current process.
+        chunk_size: Number of resamples handled at once by a process.
+
+    Returns:
+        A mapping from metric names to mappings containing the metric "estimate" over
+        the whole dataset, and the "lower" and "upper" bounds of its confidence
+        interval.
+
+    """
+    y_true = (np.asarray(y_true).ravel() == 1).astype(int)
+    y_score = np.asarray(y_score, dtype=float).ravel()
+    if groups is None:
+        groups = np.arange(y_score.size)
+    _, group_codes = np.unique(np.asarray(groups).ravel(), return_inverse=True)
+
+    # Bin samples by score and by predicted class, then count them by label, bin and
+    # group. Bins are indexed by decreasing score.
+    if n_bins is None:
+        _, score_bins = np.unique(y_score, return_inverse=True)
+    else:
+        score_bins = np.clip(np.floor(y_score * n_bins), 0, n_bins).astype(int)
+    above = y_score >= thresh
+    _, keys = np.unique(2 * score_bins + above, return_inverse=True)
+    n_keys = keys.max() + 1
+    counts = scipy.sparse.csr_matrix(
+        (
+            np.ones(y_score.size, dtype=np.float32),
+            (y_true * n_keys + (n_keys - 1 - keys), group_codes),
+        ),
+        shape=(2 * n_keys, group_codes.max() + 1),
+    )
+    data = {
+        "counts": counts,
+        "n_keys": n_keys,
+        "n_above": np.unique(keys[above]).size,
+        "beta": beta,
+    }
+
+    histogram = np.asarray(counts.sum(axis=1)).T
+    estimates = _histogram_metrics(
+        histogram[:, :n_keys], histogram[:, n_keys:], data["n_above"], beta
+    )
+
+    chunk_sizes = [chunk_size] * (n_bootstrap // chunk_size)
+    if n_bootstrap % chunk_size:
+        chunk_sizes.append(n_bootstrap % chunk_size)
+    chunk_seeds = np.random.RandomState(seed).randint(
+        np.iinfo(np.int32).max, size=len(chunk_sizes)
+    )
+    tasks = list(zip(chunk_seeds.tolist(), chunk_sizes))
+    if n_jobs == 1:
+        _init_bootstrap_worker(data)
+        results = [_bootstrap_chunk(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(
+            n_jobs or os.cpu_count(),
+            initializer=_init_bootstrap_worker,
+            initargs=(data,),
+        ) as pool:
+            results = pool.map(_bootstrap_chunk, tasks)
+
+    alpha = 100 * (1 - confidence) / 2
+    intervals = {}
+    for name, estimate in estimates.items():
+        values = np.concatenate([result[name] for result in results])
+        lower, upper = np.percentile(values, [alpha, 100 - alpha])
+        intervals[name] = {
+            "estimate": float(estimate[0]),
+            "lower": float(lower),
+            "upper": float(upper),
+        }
+    return intervals
+
+
+def _binned_counts(
+    df: pyspark.sql.DataFrame,
+    label_col: str,
+    score_col: str,
+    n_bins: int,
+    thresh: float = None,
+) -> np.ndarray:
+    """Counts samples by label, binned score, and position relative to a threshold.
+
+    Scores are expected to lie inside the [0, 1] interval, bin `i` contains scores
+    such that `i <= score * n_bins < i + 1`, and the last bin only contains scores
+    equal to 1.
+
+    Args:
+        df: A DataFrame containing labels and scores.
+        label_col: The true outcomes column, holding 0 / 1 or boolean values.
+        score_col: The predicted scores column.
+        n_bins: The number of bins spanning the [0, 1) interval.
+        thresh (optional): A threshold above which (inclusive) samples are predicted
+          as positive.
+
+    Returns:
+        An array of shape (2, n_bins + 1, 2), indexed by label, bin and whether or not
+        the score is greater or equal to `thresh` (always False if `thresh` is None).
+
+    Raises:
+        ValueError: If some label or score is missing (null or NaN).
+
+    """
+    # NaN scores are considered missing, rather than greater than any other score.
+    score = F.nanvl(F.col(score_col).cast("double"), F.lit(None).cast("double"))
+    score_bin = F.least(
+        F.greatest(F.floor(score * n_bins), F.lit(0)), F.lit(n_bins)
+    ).cast("int")
+    above = score >= thresh if thresh is not None else F.lit(False)
+    counts = np.zeros((2, n_bins + 1, 2), dtype=np.int64)
+    for row in (
+        df.select(
+            F.col(label_col).cast("int").alias("label"),
+            score_bin.alias("bin"),
+            above.cast("int").alias("above"),
+        )
+        .groupBy("label", "bin", "above")
+        .count()
+        .collect()
+    ):
+        # Indexing with None would add an axis instead of raising an error.
+        if row["label"] is None or row["bin"] is None:
+            raise ValueError(
+                f"Found {row['count']} samples with missing {label_col} or "
+                f"{score_col} values."
+            )
+        counts[row["label"], row["bin"], row["above"]] = row["count"]
+    return counts
+
+
+def spark_optimal_beta_thresholds(
+    df: pyspark.sql.DataFrame,
+    betas: Iterable[float] = (0.5, 2.0),
+    n_thr: int = 101,
+    label_col: str = "failure",
+    score_col: str = "probability",
+) -> Dict[float, float]:
+    """Computes the classification thresholds that maximise :math:`F_\\beta` score.
+
+    This is the distributed counterpart of `optimal_beta_thresholds`: samples are
+    counted by label and by candidate threshold interval in a single aggregation, so
+    that only `2 * n_thr` counts are collected by the driver. Scores lying exactly on a
+    candidate threshold value may be affected to the neighbouring interval due to
+    floating-point rounding.
+
+    Args:
+        df: A DataFrame containing labels and scores.
+        betas: The required :math:`\\beta` values for F-score thresholds
+          computation.
+        n_thr: Size of an even-spaced array of values spanning the [0, 1]
+          interval that will be used as candidate threshold values.
+        label_col: The true outcomes column.
+        score_col: The predicted scores column.
+
+    Returns:
+        A dict of (beta, threshold) couples associated with each :math:`\\beta` input
+          values.
+
+    """
+    betas = list(betas)
+    counts = _binned_counts(df, label_col, score_col, n_bins=n_thr - 1).sum(axis=2)
+    # Samples are predicted positive at the k-th threshold if their bin is >= k.
+    tp = np.cumsum(counts[1, ::-1])[::-1]
+    fp = np.cumsum(counts[0, ::-1])[::-1]
+    fn = counts[1].sum() - tp
+    f_beta = _fbeta_scores(tp, fp, fn, betas)
+    thresh_array = np.linspace(0, 1, n_thr)
+    return dict(zip(betas, thresh_array[np.argmax(f_beta, axis=1)]))
+
+
+def spark_metrics(  # pylint: disable=too-many-arguments, too-many-locals
+    df: pyspark.sql.DataFrame,
+    beta: float = 1,
+    thresh: float = 0.5,
+    label_col: str = "failure",
+    score_col: str = "probability",
+    n_bins: int = 10000,
+) -> dict:
+    """Computes multiple evaluation metrics for a binary classification model.
+
+    This is the distributed counterpart of `metrics`: a single aggregation over `df`
+    counts samples by label, score bin and predicted class. Threshold-dependent metrics
+    are exact, while areas under the ROC and precision-recall curves are computed over
+    the binned scores histogram, i.e., scores that fall inside the same bin are
+    considered as tied.
+
+    Args:
+        df: A DataFrame containing labels and scores.
+        beta: Weighting of recall relative to precision for the evaluation.
+          Corresponds to the beta value of the F_beta score.
+        thresh: The probability above which a binary model should classify a
+          sample as positive.
+        label_col: The true outcomes column.
+        score_col: The predicted scores column.
+        n_bins: Number of bins used to compute areas under curves.
+
+    Returns:
+        A dictionary containing the evaluation metrics.
+
+    """
+    counts = _binned_counts(df, label_col, score_col, n_bins, thresh)
+
+    # Confusion matrix
+    (tn, fp), (fn, tp) = counts.sum(axis=1)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    specificity = tn / (tn + fp) if tn + fp else 0.0
+    fbeta = _fbeta_scores(np.array([tp]), np.array([fp]), np.array([fn]), [beta])[0, 0]
+
+    # Curves, going through bins by decreasing score.
+    histogram = counts.sum(axis=2)
+    tp_curve = np.concatenate(([0], np.cumsum(histogram[1, ::-1])))
+    fp_curve = np.concatenate(([0], np.cumsum(histogram[0, ::-1])))
+    tpr = tp_curve / max(tp_curve[-1], 1)
+    fpr = fp_curve / max(fp_curve[-1], 1)
+    roc = np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)
+    precision_curve = np.divide(
+        tp_curve,
+        tp_curve + fp_curve,
+        out=np.zeros(tp_curve.shape),
+        where=(tp_curve + fp_curve) > 0,
+    )
+    aucpr = np.sum(np.diff(tpr) * precision_curve[1:])
+
+    return {
+        "Confusion matrix": {
+            "TN": tn,
+            "FP": fp,
+            "FN": fn,
+            "TP": tp,
+        },
+        f"F{beta}-score": np.round(fbeta, 2),
+        "Precision": np.round(precision, 2),
+        "Recall": np.round(recall, 2),
+        "Balanced accuracy": np.round((recall + specificity) / 2, 2),
+        "Area under Precision-Recall curve": np.round(aucpr, 2),
+        "Area under ROC curve": np.round(roc, 2),
+    }
@@ -5,6 +5,9 @@ from typing import Dict, List, Tuple
 import numpy as np
 import pandas as pd
 import pyspark.ml.classification
+import pyspark.sql.functions as F
+import pyspark.sql.types as T
+import scipy.sparse
 import shap
 
 import sf_datalake.transform
@@ -18,6 +21,7 @@ def explanation_data(
     train_data: pyspark.sql.DataFrame,
     prediction_data: pyspark.sql.DataFrame,
     n_train_sample: int,
+    n_train: int = None,
 ) -> Tuple[pd.DataFrame, float]:
     # pylint:disable=too-many-arguments
     """Compute Shapeley coefficients + expected value for predictions.
@@ -35,6 +39,8 @@ def explanation_data(
         prediction_data: Prediction dataset.
         n_train_sample: Number of training set samples used for estimating features
           correlation.
+        n_train (optional): Number of samples in `train_data`, used to sample it. If
+          not set, it will be computed, which triggers a pass over `train_data`.
 
     Returns:
         A tuple containing:
@@ -53,11 +59,13 @@ def explanation_data(
         assert n_train_sample > 0 and isinstance(
             n_train_sample, int
         ), "n_train_sample must be a positive integer."
+        if n_train is None:
+            n_train = train_data.count()
         X_train_sample = (
             sf_datalake.transform.vector_disassembler(
                 df=train_data, columns=features_list, assembled_col=features_column
             )
-            .sample(fraction=min(1.0, n_train_sample / train_data.count()))
+            .sample(fraction=min(1.0, n_train_sample / n_train))
             .toPandas()
         )
 
@@ -107,6 +115,238 @@ def explanation_data(
     return sv, ev
 
 
+def spark_linear_explanation_data(
+    features_list: List[str],
+    features_column: str,
+    model: pyspark.ml.classification.LogisticRegressionModel,
+    train_data: pyspark.sql.DataFrame,
+    prediction_data: pyspark.sql.DataFrame,
+) -> Tuple[pyspark.sql.DataFrame, float]:
+    """Compute interventional Shapeley coefficients + expected value for a linear model.
+
+    Assuming features independence, the shap value of feature :math:`i` for a linear
+    model is exactly :math:`\\beta_i (x_i - \\mathbb{E}[x_i])`, where expectations are
+    taken over the training set. Features means are computed in a single aggregation,
+    and shap values are column expressions over the prediction dataset, so that no
+    sampling nor collection of the data is needed. Coefficients are in log-odds units.
+
+    Args:
+        features_list: A list of names of features, sorted as they were inserted into
+          `features_column`.
+        features_column: A column containing the model's features.
+        model: A pyspark logistic regression model used for prediction.
+        train_data: Training dataset.
+        prediction_data: Prediction dataset.
+
+    Returns:
+        A tuple containing:
+        - A DataFrame containing a "siren" column and shap values associated with each
+          feature.
+        - The expected model output over the training dataset.
+
+    """
+    coefficients = model.coefficients.toArray()
+    means = (
+        sf_datalake.transform.vector_disassembler(
+            df=train_data, columns=features_list, assembled_col=features_column
+        )
+        .agg(*(F.avg(feature).alias(feature) for feature in features_list))
+        .first()
+    )
+    X_prediction = sf_datalake.transform.vector_disassembler(
+        df=prediction_data,
+        columns=features_list,
+        assembled_col=features_column,
+        keep=["siren"],
+    )
+    sv = X_prediction.select(
+        ["siren"]
+        + [
+            (float(coef) * (F.col(feature) - means[feature])).alias(feature)
+            for feature, coef in zip(features_list, coefficients)
+        ]
+    )
+    ev = model.intercept + float(
+        np.dot(coefficients, [means[feature] for feature in features_list])
+    )
+    return sv, ev
+
+
+def spark_tree_explanation_data(
+    features_list: List[str],
+    features_column: str,
+    model: pyspark.ml.Model,
+    prediction_data: pyspark.sql.DataFrame,
+) -> Tuple[pyspark.sql.DataFrame, float]:
+    """Compute Shapeley coefficients + expected value for tree-based predictions.
+
+    This is the distributed counterpart of `explanation_data`: the tree ensemble
+    converted by shap is broadcast to the executors, which compute shap values over
+    batches of the prediction dataset. The prediction dataset is never collected.
+
+    Args:
+        features_list: A list of names of features, sorted as they were inserted into
+          `features_column`.
+        features_column: A column containing the model's features.
+        model: A pyspark tree-based model used for prediction.
+        prediction_data: Prediction dataset.
+
+    Returns:
+        A tuple containing:
+        - A DataFrame containing a "siren" column and shap values associated with each
+          feature.
+        - The expected failure probability value over the prediction dataset.
+
+    """
+    if not isinstance(
+        model,
+        (
+            pyspark.ml.classification.DecisionTreeClassificationModel,
+            pyspark.ml.classification.RandomForestClassificationModel,
+            pyspark.ml.classification.GBTClassificationModel,
+        ),
+    ):
+        raise NotImplementedError(f"{model} models are not supported.")
+
+    explainer = shap.TreeExplainer(model)
+    # The original model wraps a JVM object, which cannot be serialized. It is not
+    # needed to compute shap values from the converted trees.
+    explainer.model.original_model = None
+    # See `explanation_data` about these two classes outputs.
+    positive_class_only = isinstance(
+        model,
+        (
+            pyspark.ml.classification.RandomForestClassificationModel,
+            pyspark.ml.classification.DecisionTreeClassificationModel,
+        ),
+    )
+    expected_value = (
+        explainer.expected_value[1] if positive_class_only else explainer.expected_value
+    )
+    broadcast_explainer = prediction_data.sql_ctx.sparkSession.sparkContext.broadcast(
+        explainer
+    )
+
+    def shap_values_batches(batches):
+        for batch in batches:
+            shap_values = broadcast_explainer.value.shap_values(
+                batch[features_list].values, check_additivity=False
+            )
+            if positive_class_only:
+                shap_values = shap_values[1]
+            sv = pd.DataFrame(shap_values, columns=features_list)
+            sv.insert(0, "siren", batch["siren"].values)
+            yield sv
+
+    X_prediction = sf_datalake.transform.vector_disassembler(
+        df=prediction_data,
+        columns=features_list,
+        assembled_col=features_column,
+        keep=["siren"],
+    )
+    schema = T.StructType(
+        [X_prediction.schema["siren"]]
+        + [T.StructField(feature, T.DoubleType()) for feature in features_list]
+    )
+    return (
+        sf_datalake.utils.map_in_pandas(X_prediction, shap_values_batches, schema),
+        expected_value,
+    )
+
+
+def aggregation_matrices(
+    features: List[str], topic_groups: Dict[str, List[str]]
+) -> Tuple[List[str], scipy.sparse.csr_matrix, scipy.sparse.csr_matrix]:
+    """Builds matrices that sum model features contributions by feature and topic.
+
+    Each model feature is associated with the longest source feature (as listed in
+    `topic_groups`) its name starts with, e.g., "ca_lag1m" is associated with "ca".
+
+    Args:
+        features: The names of model features.
+        topic_groups: A grouping of source features, by major topic.
+
+    Returns:
+        A 3-uple containing:
+        - The list of source features, sorted by first appearance in `features`.
+        - A (model features x source features) matrix.
+        - A (source features x topics) matrix.
+
+    Raises:
+        ValueError: If a model feature has no source feature, or if a source feature
+          has no associated model feature.
+
+    """
+    # Longest names come first, so that the first match is the longest prefix.
+    source_features = sorted(
+        set(feature for flist in topic_groups.values() for feature in flist),
+        key=len,
+        reverse=True,
+    )
+    feature_groups: Dict[str, int] = {}
+    feature_index = []
+    for feature in features:
+        source = next(
+            (source for source in source_features if feature.startswith(source)),
+            None,
+        )
+        if source is None:
+            raise ValueError(f"Could not find source variable for feature {feature}.")
+        feature_index.append(feature_groups.setdefault(source, len(feature_groups)))
+    feature_matrix = scipy.sparse.csr_matrix(
+        (np.ones(len(features)), (np.arange(len(features)), feature_index)),
+        shape=(len(features), len(feature_groups)),
+    )
+
+    topic_index = []
+    for topic_idx, flist in enumerate(topic_groups.values()):
+        for feature in flist:
+            if feature not in feature_groups:
+                raise ValueError(f"Could not find any model feature for {feature}.")
+            topic_index.append((feature_groups[feature], topic_idx))
+    rows, cols = zip(*topic_index) if topic_index else ((), ())
+    topic_matrix = scipy.sparse.csr_matrix(
+        (np.ones(len(topic_index)), (rows, cols)),
+        shape=(len(feature_groups), len(topic_groups)),
+    )
+    return list(feature_groups), feature_matrix, topic_matrix
+
+
+def _aggregated_scores(
+    shap_values: np.ndarray,
+    index: pd.Index,
+    topic_groups: Dict[str, List[str]],
+    n_concerning: int,
+    matrices: Tuple[List[str], scipy.sparse.csr_matrix, scipy.sparse.csr_matrix],
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Computes `explanation_scores` outputs using precomputed aggregation matrices."""
+    source_features, feature_matrix, topic_matrix = matrices
+    # Sparse products are computed on the left, hence the transpositions.
+    feature_lvl = np.asarray(feature_matrix.T.dot(shap_values.T).T)
+    macro_scores = pd.DataFrame(
+        np.asarray(topic_matrix.T.dot(feature_lvl.T).T),
+        index=index,
+        columns=[f"{group}_macro_score" for group in topic_groups],
+    )
+
+    # Concerning features (with the most significant feature-level shap values)
+    n_top = min(n_concerning, feature_lvl.shape[1])
+    top = np.argpartition(-feature_lvl, n_top - 1, axis=1)[:, :n_top]
+    rows = np.arange(len(feature_lvl))[:, np.newaxis]
+    top = top[rows, np.argsort(-feature_lvl[rows, top], axis=1)]
+    concerning_feat = pd.DataFrame(
+        np.asarray(source_features, dtype=object)[top],
+        index=index,
+        columns=[f"concerning_feat_{n}" for n in range(n_top)],
+    )
+    concerning_values = pd.DataFrame(
+        feature_lvl[rows, top],
+        index=index,
+        columns=[f"concerning_val_{n}" for n in range(n_top)],
+    )
+    return macro_scores, concerning_feat.join(concerning_values)
+
+
 def explanation_scores(
     shap_df: pd.DataFrame,
     topic_groups: Dict[str, List[str]],
@@ -120,10 +360,14 @@ def explanation_scores(
     features to be returned is read from configuration `N_CONCERNING_MICRO` field.
 
     Contributions are first summed within feature groups:
-    - at a "feature" scale: lagged variables and such, for a given feature.
+    - at a "feature" scale: lagged variables and such, for a given feature. Each
+      model feature is associated with the longest source feature name it starts with.
     - at a "topic" scale: features that describe information within a common topic.
       The corresponding groups will be used as main axes for visualisation.
 
+    Both sums are computed as products with sparse aggregation matrices, see
+    `aggregation_matrices`.
+
     Args:
         shap_df: The shap values associated with the features used for machine learning.
         topic_groups: A grouping of features, by major topic.
@@ -137,42 +381,67 @@ def explanation_scores(
           features contributions.
 
     """
-    feature_groups: Dict[str, str] = {}
-    macro_features = set(
-        feature for flist in topic_groups.values() for feature in flist
-    )
-    feature_lvl_df = pd.DataFrame(index=shap_df.index)
-    macro_scores = pd.DataFrame(index=shap_df.index)
-
-    # Get feature-level shap values
-    for feature in shap_df.columns:
-        source_variable_found = False
-        for mfeature in macro_features:
-            if feature.startswith(mfeature):
-                feature_groups.setdefault(mfeature, []).append(feature)
-                source_variable_found = True
-                break
-        if not source_variable_found:
-            raise ValueError(f"Could not find source variable for feature {feature}.")
-    for group, features in feature_groups.items():
-        feature_lvl_df[group] = shap_df[features].sum(axis=1)
+    return _aggregated_scores(
+        shap_df.values,
+        shap_df.index,
+        topic_groups,
+        n_concerning,
+        aggregation_matrices(list(shap_df.columns), topic_groups),
+    )
 
-    # Compute 'macro' scores per topic group
-    for group, features in topic_groups.items():
-        macro_scores.loc[:, f"{group}_macro_score"] = feature_lvl_df[features].sum(
-            axis=1
-        )
 
-    # Concerning features (with the most significant feature-level shap values)
-    sorter = np.argsort(-feature_lvl_df.values, axis=1)[:, :n_concerning]
-    concerning_feat = pd.DataFrame(
-        feature_lvl_df.columns[sorter], index=feature_lvl_df.index
-    )
-    concerning_values = pd.DataFrame(
-        feature_lvl_df.values[np.arange(len(feature_lvl_df))[:, np.newaxis], sorter],
-        index=feature_lvl_df.index,
+def spark_explanation_scores(
+    shap_df: pyspark.sql.DataFrame,
+    topic_groups: Dict[str, List[str]],
+    n_concerning: int,
+) -> Tuple[pyspark.sql.DataFrame, pyspark.sql.DataFrame]:
+    """Compute plot-ready feature contribution over a distributed dataset.
+
+    This applies `explanation_scores` over batches of `shap_df`, as contributions are
+    computed independently for each SIREN. Aggregation matrices are built once, on the
+    driver. The result is persisted, since both returned DataFrames are derived from
+    it.
+
+    Args:
+        shap_df: A DataFrame containing a "siren" column and the shap values associated
+          with the features used for machine learning.
+        topic_groups: A grouping of features, by major topic.
+        n_concerning: Number of most significant features. At most one concerning
+          feature is returned per source feature.
+
+    Returns:
+        A 2-uple containing the "macro scores" and "concerning scores" DataFrames
+        described in `explanation_scores`, both with a "siren" column.
+
+    """
+    features = [col for col in shap_df.columns if col != "siren"]
+    matrices = aggregation_matrices(features, topic_groups)
+    # There cannot be more concerning features than source features.
+    n_concerning = min(n_concerning, len(matrices[0]))
+
+    macro_columns = [f"{group}_macro_score" for group in topic_groups]
+    concerning_feat_columns = [f"concerning_feat_{n}" for n in range(n_concerning)]
+    concerning_val_columns = [f"concerning_val_{n}" for n in range(n_concerning)]
+    schema = T.StructType(
+        [shap_df.schema["siren"]]
+        + [T.StructField(col, T.DoubleType()) for col in macro_columns]
+        + [T.StructField(col, T.StringType()) for col in concerning_feat_columns]
+        + [T.StructField(col, T.DoubleType()) for col in concerning_val_columns]
     )
-    concerning_feat.columns = [f"concerning_feat_{n}" for n in range(n_concerning)]
-    concerning_values.columns = [f"concerning_val_{n}" for n in range(n_concerning)]
 
-    return macro_scores, concerning_feat.join(concerning_values)
+    def scores_batches(batches):
+        for batch in batches:
+            macro_scores, concerning_scores = _aggregated_scores(
+                batch[features].values,
+                pd.Index(batch["siren"], name="siren"),
+                topic_groups,
+                n_concerning,
+                matrices,
+            )
+            yield macro_scores.join(concerning_scores).reset_index()[schema.names]
+
+    scores = sf_datalake.utils.map_in_pandas(shap_df, scores_batches, schema).persist()
+    return (
+        scores.select(["siren"] + macro_columns),
+        scores.select(["siren"] + concerning_feat_columns + concerning_val_columns),
+    )
@@ -0,0 +1,155 @@
+"""Persistent storage of pre-processed datasets.
+
+A fitted pre-processing `PipelineModel` and the dataset it transformed are stored
+together under a key that hashes everything the pre-processing outcome depends on:
+- the input files (paths, sizes and modification times).
+- the `preprocessing` section of the configuration.
+- the learning parameters that select input rows and columns (target, dates, sampling).
+- the package version.
+
+Runs that share these parameters, e.g., runs that only differ by model parameters, can
+then skip pre-processing and proceed to model fitting using the stored dataset.
+
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+from os import path
+from typing import Any, Dict, Optional, Tuple
+
+import pyspark.sql
+from pyspark.ml import PipelineModel
+
+import sf_datalake.configuration
+import sf_datalake.io
+import sf_datalake.utils
+
+# Should be incremented whenever the storage layout changes.
+STORE_FORMAT_VERSION = 1
+
+
+def _hadoop_path(spark: pyspark.sql.SparkSession, file_path: str):
+    """Returns a (hadoop FileSystem, hadoop Path) couple for some path."""
+    # pylint: disable=protected-access
+    hadoop_path = spark._jvm.org.apache.hadoop.fs.Path(file_path)
+    return hadoop_path.getFileSystem(spark._jsc.hadoopConfiguration()), hadoop_path
+
+
+def dataset_fingerprint(df: pyspark.sql.DataFrame) -> str:
+    """Computes a fingerprint of the files a DataFrame is read from.
+
+    The fingerprint changes whenever an input file is added, removed or modified.
+
+    Args:
+        df: A DataFrame read from some files or table.
+
+    Returns:
+        A sha256 hex digest.
+
+    """
+    spark = df.sql_ctx.sparkSession
+    digest = hashlib.sha256()
+    for file_path in sorted(df.inputFiles()):
+        file_system, hadoop_path = _hadoop_path(spark, file_path)
+        status = file_system.getFileStatus(hadoop_path)
+        digest.update(
+            f"{file_path}|{status.getLen()}|{status.getModificationTime()}\n".encode()
+        )
+    return digest.hexdigest()
+
+
+def preprocessing_key(
+    dataset: pyspark.sql.DataFrame,
+    configuration: sf_datalake.configuration.ConfigurationHelper,
+) -> str:
+    """Computes the feature store key of a pre-processing run.
+
+    Args:
+        dataset: The raw dataset that will be pre-processed.
+        configuration: The run configuration.
+
+    Returns:
+        A sha256 hex digest.
+
+    """
+    learning = configuration.learning
+    content: Dict[str, Any] = {
+        "store_format_version": STORE_FORMAT_VERSION,
+        "version": configuration.version,
+        "dataset": dataset_fingerprint(dataset),
+        "preprocessing": dataclasses.asdict(configuration.preprocessing),
+        "target": {
+            key: learning.target[key] for key in ("class_col", "judgment_date_col")
+        },
+        "features_column": learning.features_column,
+        "train_dates": list(learning.train_dates),
+        "prediction_date": learning.prediction_date,
+        "sample_ratio": configuration.io.sample_ratio,
+    }
+    if configuration.io.sample_ratio != 1.0:
+        content["random_seed"] = configuration.io.random_seed
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def load_features(
+    store_path: str, key: str
+) -> Optional[Tuple[PipelineModel, pyspark.sql.DataFrame]]:
+    """Loads a pipeline model and its transformed dataset from the feature store.
+
+    Args:
+        store_path: The feature store root path.
+        key: A key, as computed by `preprocessing_key`.
+
+    Returns:
+        A (pipeline model, transformed dataset) couple, or None if nothing was stored
+        under this key.
+
+    """
+    spark = sf_datalake.utils.get_spark_session()
+    entry_path = path.join(store_path, key)
+    file_system, hadoop_path = _hadoop_path(
+        spark, path.join(entry_path, "metadata", "_SUCCESS")
+    )
+    if not file_system.exists(hadoop_path):
+        return None
+    logging.info("Loading pre-processed dataset from %s", entry_path)
+    pipeline_model = PipelineModel.load(path.join(entry_path, "pipeline_model"))
+    _, dataset = sf_datalake.io.load_data(
+        {"dataset": path.join(entry_path, "dataset")}, file_format="parquet"
+    ).popitem()
+    return pipeline_model, dataset
+
+
+def save_features(
+    store_path: str,
+    key: str,
+    pipeline_model: PipelineModel,
+    dataset: pyspark.sql.DataFrame,
+):
+    """Saves a pipeline model and its transformed dataset to the feature store.
+
+    Any previous content stored under `key` is removed first. The entry metadata is
+    written last, so that an interrupted write is not considered as a stored entry by
+    `load_features`, and will be overwritten by the next run.
+
+    Args:
+        store_path: The feature store root path.
+        key: A key, as computed by `preprocessing_key`.
+        pipeline_model: A fitted pre-processing pipeline.
+        dataset: The dataset transformed by `pipeline_model`.
+
+    """
+    spark = sf_datalake.utils.get_spark_session()
+    entry_path = path.join(store_path, key)
+    logging.info("Saving pre-processed dataset to %s", entry_path)
+    file_system, hadoop_path = _hadoop_path(spark, entry_path)
+    file_system.delete(hadoop_path, True)
+    PipelineModel(pipeline_model.stages).save(path.join(entry_path, "pipeline_model"))
+    sf_datalake.io.write_data(dataset, path.join(entry_path, "dataset"), "parquet")
+    spark.sparkContext.parallelize(
+        [json.dumps({"key": key, "store_format_version": STORE_FORMAT_VERSION})]
+    ).repartition(1).saveAsTextFile(path.join(entry_path, "metadata"))
@@ -1,12 +1,16 @@
 """Utility functions for data handling."""
 
 import argparse
+import contextlib
+import datetime as dt
 import logging
 from os import path
-from typing import Dict
+from typing import Dict, List, Optional, Tuple, Union
 
 import pyspark.sql
+import pyspark.sql.types as T
 
+import sf_datalake.schemas
 import sf_datalake.utils
 
 
@@ -38,79 +42,359 @@ def data_path_parser() -> argparse.ArgumentParser:
     return parser
 
 
-def write_data(
+def writer_options(
+    file_format: str,
+    compression: str = None,
+    block_size: int = None,
+    bloom_filter_columns: List[str] = None,
+) -> Dict[str, str]:
+    """Builds writer options related to compression and block-level statistics.
+
+    Args:
+        file_format: The file format. Block size and bloom filters options are only
+          set for "orc", "parquet" and "delta" formats.
+        compression: If set, the compression codec, e.g. "snappy", "zlib" or "zstd".
+        block_size: If set, the size, in bytes, of orc stripes / parquet row groups.
+          Smaller blocks make min / max statistics and bloom filters more selective, at
+          the cost of a lower compression ratio.
+        bloom_filter_columns: If set, bloom filters will be written for these columns,
+          so that readers can skip blocks when looking up values of these columns.
+          Parquet bloom filters require spark >= 3.2.
+
+    Returns:
+        A dict of options, to be passed to a `pyspark.sql.DataFrameWriter`.
+
+    """
+    options: Dict[str, str] = {}
+    if compression is not None:
+        options["compression"] = compression
+    if file_format == "orc":
+        if block_size is not None:
+            options["orc.stripe.size"] = str(block_size)
+        if bloom_filter_columns:
+            options["orc.bloom.filter.columns"] = ",".join(bloom_filter_columns)
+    elif file_format in ("parquet", "delta"):
+        if block_size is not None:
+            options["parquet.block.size"] = str(block_size)
+        if bloom_filter_columns:
+            if sf_datalake.utils.spark_version() >= (3, 2):
+                options.update(
+                    (f"parquet.bloom.filter.enabled#{column}", "true")
+                    for column in bloom_filter_columns
+                )
+            else:
+                logging.warning(
+                    "Parquet bloom filters require spark >= 3.2, none will be written."
+                )
+    return options
+
+
+def partitions_predicate(
+    dataset: pyspark.sql.DataFrame, partition_by: List[str]
+) -> str:
+    """Builds a SQL predicate matching the partitions found inside a dataset.
+
+    This triggers a spark job, which collects the distinct values of the partition
+    columns.
+
+    Args:
+        dataset: A dataset.
+        partition_by: The partition columns.
+
+    Returns:
+        A SQL expression, which is true for rows that belong to one of the partitions
+        of `dataset`.
+
+    """
+
+    def sql_literal(value) -> str:
+        if isinstance(value, dt.datetime):
+            return f"TIMESTAMP '{value}'"
+        if isinstance(value, dt.date):
+            return f"DATE '{value}'"
+        if isinstance(value, bool):
+            return str(value).lower()
+        if isinstance(value, str):
+            escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+            return f"'{escaped}'"
+        return str(value)
+
+    partitions = dataset.select(*partition_by).distinct().collect()
+    if not partitions:
+        return "false"
+    return " OR ".join(
+        "("
+        + " AND ".join(
+            f"`{column}` IS NULL"
+            if row[column] is None
+            else f"`{column}` = {sql_literal(row[column])}"
+            for column in partition_by
+        )
+        + ")"
+        for row in partitions
+    )
+
+
+@contextlib.contextmanager
+def _partition_overwrite_mode(spark: pyspark.sql.SparkSession, mode: str = None):
+    """Sets the session's partition overwrite mode, which is restored on exit.
+
+    Nothing is changed if `mode` is None.
+
+    """
+    if mode is None:
+        yield
+        return
+    key = "spark.sql.sources.partitionOverwriteMode"
+    previous_mode = spark.conf.get(key, "static")
+    spark.conf.set(key, mode)
+    try:
+        yield
+    finally:
+        spark.conf.set(key, previous_mode)
+
+
+def _partitions_overwriter(
+    writer: pyspark.sql.DataFrameWriter,
+    dataset: pyspark.sql.DataFrame,
+    file_format: str,
+    partition_by: List[str],
+) -> Tuple[pyspark.sql.DataFrameWriter, Optional[str]]:
+    """Sets up a writer to only overwrite the partitions found in a dataset.
+
+    Returns:
+        A (writer, session overwrite mode) couple. If the latter is not None, it should
+        be set inside the spark session while writing (see `_partition_overwrite_mode`),
+        as older spark versions cannot set it for a single write.
+
+    """
+    writer = writer.mode("overwrite")
+    if file_format == "delta":
+        return (
+            writer.option("replaceWhere", partitions_predicate(dataset, partition_by)),
+            None,
+        )
+    if sf_datalake.utils.spark_version() >= (2, 4):
+        return writer.option("partitionOverwriteMode", "dynamic"), None
+    return writer, "dynamic"
+
+
+def write_data(  # pylint: disable=too-many-arguments, too-many-locals
     dataset: pyspark.sql.DataFrame,
     output_path: str,
     file_format: str,
     sep: str = ",",
+    partition_by: List[str] = None,
+    overwrite_partitions: bool = False,
+    bucket_by: List[str] = None,
+    n_buckets: int = 200,
+    sort_by: List[str] = None,
+    table_name: str = None,
+    compression: str = None,
+    block_size: int = None,
+    bloom_filter_columns: List[str] = None,
 ):
-    """Loads one or more orc-stored datasets and returns them in a dict.
+    """Writes a dataset to some output path.
+
+    Bucketing information can only be stored inside spark's catalog, which means that
+    a bucketed dataset is saved as a table named `table_name`, whose data is stored
+    under `output_path`. It should then be read as a table (see `load_data`) for spark
+    to take advantage of bucketing, which will only persist across sessions if the
+    catalog does (e.g., a Hive metastore).
+
+    The "delta" format writes a versioned Delta Lake table at `output_path`, which
+    requires the delta-spark package to be configured inside the spark session.
 
     Args:
         dataset: A dataset.
         output_path: The output path.
-        file_format: The file format, can be either "csv" or "orc".
+        file_format: The file format, can be either "csv", "orc", "parquet" or "delta".
         sep: Separator character, in case `file_format` is "csv".
+        partition_by: If set, the output will be partitioned by these columns.
+        overwrite_partitions: If True, the partitions found in `dataset` will replace
+          the same partitions under an existing `output_path`, using spark's dynamic
+          partition overwrite mode. Other existing partitions are left untouched. Delta
+          Lake versions prior to 2.0 ignore this mode, so a "delta" output is instead
+          overwritten with a `replaceWhere` predicate over these partitions (see
+          `partitions_predicate`), which requires `partition_by` to be set.
+        bucket_by: If set, the output will be bucketed by these columns.
+        n_buckets: Number of buckets, in case `bucket_by` is set.
+        sort_by: If set, data will be sorted by these columns inside each bucket, or
+          inside each written file if `bucket_by` is not set.
+        table_name: The name of the output table, in case `bucket_by` is set.
+        compression: If set, the compression codec.
+        block_size: If set, the size, in bytes, of orc stripes / parquet row groups.
+        bloom_filter_columns: If set, bloom filters will be written for these columns.
+
+    See `writer_options` for more details about the last three arguments.
 
     """
-    write_options = {"header": True, "sep": sep} if file_format == "csv" else {}
-    dataset.write.format(file_format).options(**write_options).save(output_path)
+    if bucket_by is not None and table_name is None:
+        raise ValueError("A table name is required to write a bucketed dataset.")
+    if bucket_by is not None and overwrite_partitions:
+        raise ValueError("Partitions of a bucketed dataset cannot be overwritten.")
+    if file_format == "delta" and overwrite_partitions and partition_by is None:
+        raise ValueError("Partitions of a delta dataset require `partition_by`.")
+
+    if sort_by is not None and bucket_by is None:
+        dataset = dataset.sortWithinPartitions(*sort_by)
+    write_options = writer_options(
+        file_format, compression, block_size, bloom_filter_columns
+    )
+    if file_format == "csv":
+        write_options.update({"header": True, "sep": sep})
+    writer = dataset.write.format(file_format).options(**write_options)
+    if partition_by is not None:
+        writer = writer.partitionBy(*partition_by)
+    session_overwrite_mode = None
+    if overwrite_partitions:
+        writer, session_overwrite_mode = _partitions_overwriter(
+            writer, dataset, file_format, partition_by
+        )
+    with _partition_overwrite_mode(
+        dataset.sql_ctx.sparkSession, session_overwrite_mode
+    ):
+        if bucket_by is not None:
+            writer = writer.bucketBy(n_buckets, *bucket_by)
+            if sort_by is not None:
+                writer = writer.sortBy(*sort_by)
+            writer.option("path", output_path).saveAsTable(table_name)
+        else:
+            writer.save(output_path)
 
 
-def load_data(
+def load_data(  # pylint: disable=too-many-arguments, too-many-branches
     data_paths: Dict[str, str],
     file_format: str = None,
     sep: str = ",",
     infer_schema: bool = True,
+    schema: T.StructType = None,
+    source: str = None,
+    columns: List[str] = None,
+    filters: Union[pyspark.sql.Column, str] = None,
+    version: int = None,
 ) -> Dict[str, pyspark.sql.DataFrame]:
     """Loads one or more datasets and returns them through a dict.
 
+    Projection and filters are applied right after reading, so that spark only reads
+    the required columns, prunes partitions when filtering over partitioning columns,
+    and pushes other predicates down to the file reader when possible.
+
+    Csv datasets are read using `schema`, or the schema registered for `source` in
+    `sf_datalake.schemas`. Otherwise, column types are inferred if `infer_schema` is
+    true, which costs an extra pass over the data, or columns are read as strings.
+
     Args:
         data_paths: A dict[str, str] structured as follows: {dataframe_name: file_path}
           `dataframe_name` will be the key to use to get access to a given DataFrame in
-          the returned dict.
-        file_format: The file format, can be either "csv" or "orc".
+          the returned dict. If `file_format` is "table", `file_path` should be a table
+          name.
+        file_format: The file format, can be either "csv", "orc", "parquet", "delta"
+          or "table".
         sep: Separator character, in case `file_format` is "csv".
-        infer_schema: If true, spark will infer types, in case `file_format` is "csv".
+        infer_schema: If true, spark will infer types, in case `file_format` is "csv"
+          and no schema is set or registered.
+        schema: If set, the schema of the datasets to read.
+        source: If set, the name of a source registered in `sf_datalake.schemas`,
+          whose schema is used to read csv datasets. Cannot be combined with `schema`.
+        columns: If set, only these columns are read.
+        filters: If set, only rows satisfying this condition are read.
+        version: If set, the version of the datasets to read, in case `file_format` is
+          "delta".
 
     Returns:
         A dictionary of datasets as pyspark DataFrame objects.
 
     """
-    read_options = (
-        {"inferSchema": infer_schema, "header": True, "sep": sep}
-        if file_format == "csv"
-        else {}
-    )
+    if version is not None and file_format != "delta":
+        raise ValueError("Only delta datasets can be read at a given version.")
+    if source is not None:
+        if schema is not None:
+            raise ValueError("Only one of `schema` and `source` can be set.")
+        if file_format != "csv":
+            raise ValueError("Registered source schemas only apply to csv datasets.")
+        schema = sf_datalake.schemas.get_schema(source)
     datasets: Dict[str, pyspark.sql.DataFrame] = {}
 
     spark = sf_datalake.utils.get_spark_session()
     for name, file_path in data_paths.items():
-        if file_format in ("csv", "orc"):
-            df = spark.read.format(file_format).options(**read_options).load(file_path)
+        if file_format == "csv":
+            df = spark.read.csv(
+                file_path,
+                schema=schema,
+                sep=sep,
+                header=True,
+                inferSchema=infer_schema and schema is None,
+            )
+        elif file_format in ("orc", "parquet", "delta"):
+            reader = spark.read.format(file_format)
+            if schema is not None:
+                reader = reader.schema(schema)
+            if version is not None:
+                reader = reader.option("versionAsOf", version)
+            df = reader.load(file_path)
+        elif file_format == "table":
+            df = spark.table(file_path)
         else:
             raise ValueError(f"Unknown file format {file_format}.")
+        if columns is not None:
+            df = df.select(columns)
+        if filters is not None:
+            df = df.filter(filters)
         datasets[name] = df
     return datasets
 
 
-def csv_to_orc(input_filename: str, output_filename: str, sep: str):
-    """Writes a file stored as csv in orc format.
+def csv_to_columnar(  # pylint: disable=too-many-arguments
+    input_filename: str,
+    output_filename: str,
+    file_format: str = "orc",
+    sep: str = ",",
+    source: str = None,
+    partition_by: List[str] = None,
+):
+    """Writes a file stored as csv to a typed columnar format.
+
+    This is meant to be done once per source file, so that later runs read typed
+    columnar data instead of parsing csv. If `source` is not set, types are inferred
+    by spark, which requires an extra pass over the csv file.
 
     Args:
         input_filename: Path to a csv file.
-        output_filename: Path to write the output orc file to.
+        output_filename: Path to write the output dataset to.
+        file_format: The output file format, e.g. "orc" or "parquet".
         sep: Separator character.
+        source: If set, the name of a source registered in `sf_datalake.schemas`,
+          whose schema is used to read the csv file.
+        partition_by: If set, the output will be partitioned by these columns.
 
     """
-    spark = sf_datalake.utils.get_spark_session()
-    df = spark.read.csv(
-        input_filename,
-        sep=sep,
-        inferSchema=True,
-        header=True,
-    )
-    df.write.format("orc").save(output_filename)
+    _, df = load_data(
+        {"csv": input_filename}, file_format="csv", sep=sep, source=source
+    ).popitem()
+    write_data(df, output_filename, file_format, partition_by=partition_by)
+
+
+def csv_to_orc(
+    input_filename: str, output_filename: str, sep: str = ",", source: str = None
+):
+    """Writes a file stored as csv in orc format.
+
+    See `csv_to_columnar` for details.
+
+    """
+    csv_to_columnar(input_filename, output_filename, "orc", sep, source)
+
+
+def csv_to_parquet(
+    input_filename: str, output_filename: str, sep: str = ",", source: str = None
+):
+    """Writes a file stored as csv in parquet format.
+
+    See `csv_to_columnar` for details.
+
+    """
+    csv_to_columnar(input_filename, output_filename, "parquet", sep, source)
 
 
 def write_predictions(
@@ -1,16 +1,21 @@
 """Model selection utilities."""
 
-from typing import Tuple
+import datetime as dt
+from typing import Any, Dict, Tuple
 
 import pyspark.sql
+import pyspark.sql.functions as F
 
+from sf_datalake.utils import count_by_subset
 
-def train_test_split(
+
+def train_test_split(  # pylint: disable=too-many-arguments
     df: pyspark.sql.DataFrame,
     random_seed: int,
     train_size: float = None,
     test_size: float = None,
     group_col: str = "siren",
+    check_groups: bool = True,
 ) -> Tuple[
     pyspark.sql.DataFrame, pyspark.sql.DataFrame, pyspark.sql.DataFrame
 ]:  # pylint: disable=too-many-arguments, too-many-locals
@@ -28,6 +33,8 @@ def train_test_split(
           dataset to include in the test split.
         group_col: If not None, the two sets won't share any common value for this
           column, which is therefore considered as a group label.
+        check_groups: If True, and `group_col` is set, an error is raised if `df`
+          contains less than two groups, which triggers a spark job.
 
     Returns:
         A tuple of two DataFrame associated with the training and testing stages.
@@ -48,18 +55,14 @@ def train_test_split(
         else:
             test_size = 1 - train_size
 
-    if df.select(group_col).distinct().count() < 2:
-        raise ValueError("`df` should contain at leats 2 independant entities.")
-
     # Split according to train/test split ratio and group column, if set.
     if group_col is not None:
-        group_train, group_test = (
-            df.select(group_col)
-            .distinct()
-            .randomSplit(
-                weights=[train_size, test_size],
-                seed=random_seed,
-            )
+        groups = df.select(group_col).distinct()
+        if check_groups and len(groups.head(2)) < 2:
+            raise ValueError("`df` should contain at leats 2 independant entities.")
+        group_train, group_test = groups.randomSplit(
+            weights=[train_size, test_size],
+            seed=random_seed,
         )
         df_train = df.join(group_train, how="left_semi", on=group_col)
         df_test = df.join(group_test, how="left_semi", on=group_col)
@@ -67,3 +70,58 @@ def train_test_split(
         df_train, df_test = df.randomSplit(weights=[train_size, test_size])
 
     return df_train, df_test
+
+
+def learning_subsets(  # pylint: disable=too-many-arguments
+    df: pyspark.sql.DataFrame,
+    train_dates: Tuple[dt.date, dt.date],
+    prediction_date: dt.date,
+    class_col: str,
+    random_seed: int,
+    train_size: float = None,
+    group_col: str = "siren",
+) -> Tuple[Dict[str, pyspark.sql.DataFrame], Dict[str, Dict[Any, int]]]:
+    """Splits a dataset into train, test and prediction subsets.
+
+    Rows for each class of all subsets are counted in a single spark job, which is the
+    only one triggered by this function. Subsets emptiness is checked using these
+    counts.
+
+    Args:
+        df: The DataFrame to split, with a "période" column.
+        train_dates: The (inclusive, exclusive) bounds of the train and test periods.
+        prediction_date: The prediction period.
+        class_col: The class column.
+        random_seed: Controls the random train / test split.
+        train_size: The proportion of train and test periods samples to include in the
+          train subset, see `train_test_split`.
+        group_col: The train and test subsets won't share any common value for this
+          column, see `train_test_split`.
+
+    Returns:
+        A tuple containing:
+        - A mapping from "train", "test" and "prediction" to the associated subsets.
+        - A mapping from the same names to mappings from `class_col` values to number
+          of rows.
+
+    Raises:
+        ValueError: If a subset is empty.
+
+    """
+    train_start_date, train_end_date = train_dates
+    subsets: Dict[str, pyspark.sql.DataFrame] = {}
+    subsets["train"], subsets["test"] = train_test_split(
+        df.filter(
+            (train_start_date <= F.col("période")) & (F.col("période") < train_end_date)
+        ),
+        random_seed,
+        train_size=train_size,
+        group_col=group_col,
+        check_groups=False,
+    )
+    subsets["prediction"] = df.filter(F.col("période") == prediction_date)
+    class_counts = count_by_subset(subsets, class_col)
+    for name, counts in class_counts.items():
+        if not counts:
+            raise ValueError(f"{name.capitalize()} dataset is empty.")
+    return subsets, class_counts
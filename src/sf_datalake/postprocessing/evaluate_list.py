@@ -3,9 +3,11 @@
 
 import os
 
-import pandas as pd
+import pyspark.sql.functions as F
 
 import sf_datalake.evaluation
+import sf_datalake.io
+import sf_datalake.utils
 
 MODEL_OUTPUT_DIR = ""
 PREDICTION_LIST_ID = ""
@@ -18,43 +20,35 @@ test_file = os.path.join(
     "paydex" if WITH_PAYDEX else "standard",
     "test_data.csv",
 )
-test_data = pd.read_csv(
-    test_file,
-    dtype={
-        "failure": bool,
-        "siren": str,
-        "probability": float,
-    },
-    index_col=0,
-)
+spark = sf_datalake.utils.get_spark_session()
+_, test_data = sf_datalake.io.load_data(
+    {"test_data": test_file}, file_format="csv", infer_schema=True
+).popitem()
+test_data = test_data.withColumn("failure", F.col("failure").cast("boolean"))
 
 if DROP_STRONG_SIGNALS:
-    test_data = test_data[test_data["time_til_failure"] > 0]
+    test_data = test_data.filter(F.col("time_til_failure") > 0)
 
-thresholds = sf_datalake.evaluation.optimal_beta_thresholds(
-    y_true=test_data["failure"],
-    y_score=test_data["probability"],
-)
+thresholds = sf_datalake.evaluation.spark_optimal_beta_thresholds(test_data)
 
-red_evaluation = sf_datalake.evaluation.metrics(
-    y_true=test_data["failure"],
-    y_score=test_data["probability"],
+red_evaluation = sf_datalake.evaluation.spark_metrics(
+    test_data,
     beta=0.5,
     thresh=thresholds[0.5],
 )
-orange_evaluation = sf_datalake.evaluation.metrics(
-    y_true=test_data["failure"],
-    y_score=test_data["probability"],
+orange_evaluation = sf_datalake.evaluation.spark_metrics(
+    test_data,
     beta=2,
     thresh=thresholds[2],
 )
+n_samples = sum(red_evaluation["Confusion matrix"].values())
 
 print(
     f"Producing metrics over {PREDICTION_LIST_ID} list "
     f"{'paydex' if WITH_PAYDEX else 'standard'} test set."
 )
 print(f"Strong signals are {'' if DROP_STRONG_SIGNALS else 'NOT '}dropped")
-print(f"Number of SIREN in test dataset: {len(test_data)}")
+print(f"Number of SIREN in test dataset: {n_samples}")
 print("Red level")
 print(red_evaluation)
 print("Orange level")
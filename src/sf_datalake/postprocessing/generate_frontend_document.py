@@ -10,8 +10,7 @@ See the command-line interface for more details on expected inputs.
 """
 
 import argparse
-import json
-from typing import Union
+from typing import Any, Dict, Iterator, Union
 
 import importlib_metadata
 import pandas as pd
@@ -51,7 +50,7 @@ path_group.add_argument(
     "-o",
     "--output_file",
     required=True,
-    help="Generated output path.",
+    help="Generated output path. If it ends with '.gz', output is gzip-compressed.",
 )
 path_group.add_argument(
     "--configuration",
@@ -71,6 +70,12 @@ parser.add_argument(
     help="""Threshold above which a `feature * weight` product is considered
     'concerning'.""",
 )
+parser.add_argument(
+    "--output_format",
+    choices=["json", "ndjson"],
+    default="json",
+    help="Output document format: an indented JSON array, or one record per line.",
+)
 
 
 def normalize_siren(x: Union[pd.Series, pd.Index]) -> pd.Series:
@@ -102,9 +107,10 @@ additional_data = {
 }
 
 # Load prediction lists
-test_set = pd.read_csv(args.test_set)
-test_set["siren"] = normalize_siren(test_set["siren"])
-test_set = test_set.set_index("siren")
+spark = sf_datalake.utils.get_spark_session()
+_, test_set = sf_datalake.io.load_data(
+    {"test_set": args.test_set}, file_format="csv", source="test_data"
+).popitem()
 
 prediction_set = pd.read_csv(args.prediction_set)
 prediction_set["siren"] = normalize_siren(prediction_set["siren"])
@@ -135,14 +141,12 @@ for name, df in {
         )
 
 # Compute alert level thresholds
-score_threshold = sf_datalake.evaluation.optimal_beta_thresholds(
-    y_true=test_set["failure"], y_score=test_set["probability"]
-)
+score_threshold = sf_datalake.evaluation.spark_optimal_beta_thresholds(test_set)
 
 # Create encoded alert groups
-prediction_set["alert_group"] = prediction_set["probability"].apply(
-    lambda x: 2 - (x < score_threshold[0.5]) - (x < score_threshold[2])
-)
+prediction_set["alert_group"] = (
+    prediction_set["probability"] >= score_threshold[0.5]
+).astype(int) + (prediction_set["probability"] >= score_threshold[2]).astype(int)
 
 # Decode alert groups
 alert_categories = pd.CategoricalDtype(
@@ -166,33 +170,46 @@ else:
     concerning_micro_variables = concerning_data[concerning_feats_columns]
 
 ## Export front json document
-for field, value in additional_data.items():
-    prediction_set[field] = value
-
-output_entries = prediction_set.drop(
-    ["alert_group"],
-    axis="columns",
-).to_dict(orient="index")
-
-for siren in prediction_set[prediction_set["alert"] != "Pas d'alerte"].index:
-    output_entries[siren].update(
-        {
-            "macroRadar": macro_explanation.loc[siren].to_dict(),
-            "explSelection": {
+# Explanation data is aligned with alerted SIRENs once, then records are generated and
+# written one at a time.
+entries = prediction_set.drop(["alert_group"], axis="columns").assign(**additional_data)
+alerted = entries["alert"] != "Pas d'alerte"
+alerted_siren = entries.index[alerted.values]
+missing_explanations = alerted_siren.difference(macro_explanation.index)
+if not missing_explanations.empty:
+    raise ValueError(
+        f"Alerted SIRENs have no explanation data: \n {missing_explanations}"
+    )
+missing_concerning = alerted_siren.difference(concerning_data.index)
+if not missing_concerning.empty:
+    raise ValueError(
+        f"Alerted SIRENs have no concerning values data: \n {missing_concerning}"
+    )
+macro_radar = macro_explanation.reindex(alerted_siren)
+concerning_micro_variables = concerning_micro_variables.reindex(alerted_siren)
+
+
+def frontend_records() -> Iterator[Dict[str, Any]]:
+    """Yields front-end records, by joining predictions and explanations."""
+    radar_rows = zip(*(macro_radar[col].tolist() for col in macro_radar.columns))
+    concerning_rows = concerning_micro_variables.itertuples(index=False, name=None)
+    for siren, is_alerted, entry in zip(
+        entries.index,
+        alerted.values,
+        entries.itertuples(index=False, name=None),
+    ):
+        record = {"siren": siren, **dict(zip(entries.columns, entry))}
+        if is_alerted:
+            record["macroRadar"] = dict(zip(macro_radar.columns, next(radar_rows)))
+            record["explSelection"] = {
                 "selectConcerning": [
                     [micro_macro[micro], micro]
-                    for micro in filter(
-                        pd.notna, concerning_micro_variables.loc[siren].values
-                    )
+                    for micro in filter(pd.notna, next(concerning_rows))
                 ]
-            },
-        }
-    )
+            }
+        yield record
 
 
-with open(args.output_file, mode="w", encoding="utf-8") as f:
-    json.dump(
-        [{"siren": siren, **props} for siren, props in output_entries.items()],
-        f,
-        indent=4,
-    )
+sf_datalake.predictions.dump_records(
+    frontend_records(), args.output_file, args.output_format
+)
@@ -1,38 +1,278 @@
 """Post-processing of model predictions.
 
 This module offers tools for:
+- Writing and reading predictions lists, one record at a time.
 - Merging multiple models outputs as a single prediction.
 
 """
 
+import codecs
+import contextlib
+import gzip
 import json
-from typing import List
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import textwrap
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
+# Characters that may surround records in a JSON array or NDJSON document.
+_SEPARATORS = re.compile(r"[ \t\r\n\[\],]*")
 
-def merge_predictions_lists(predictions_paths: List[str], output_path: str):
+
+def dump_records(
+    records: Iterable[Dict[str, Any]], output_path: str, output_format: str = "json"
+):
+    """Writes predictions records to a file, one record at a time.
+
+    Records are serialized as they are consumed from `records`, so that the whole
+    document never has to be held in memory. If `output_path` ends with ".gz", the file
+    is gzip-compressed.
+
+    Args:
+        records: An iterable over JSON-serializable predictions records.
+        output_path: The output file path.
+        output_format: Either "json", for an indented JSON array (identical to a
+          `json.dump(list(records), f, indent=4)` call), or "ndjson", for one compact
+          JSON document per line.
+
+    """
+    if output_format not in {"json", "ndjson"}:
+        raise ValueError(f"Unknown output format: {output_format}")
+    opener = gzip.open if output_path.endswith(".gz") else open
+    with opener(output_path, mode="wt", encoding="utf-8") as f:
+        if output_format == "ndjson":
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            return
+        separator = "[\n"
+        for record in records:
+            f.write(separator + textwrap.indent(json.dumps(record, indent=4), " " * 4))
+            separator = ",\n"
+        f.write("[]" if separator == "[\n" else "\n]")
+
+
+def _open(path: str, mode: str = "rb"):
+    """Opens a file, which is gzip-compressed if its name ends with ".gz"."""
+    return (gzip.open if path.endswith(".gz") else open)(path, mode=mode)
+
+
+@contextlib.contextmanager
+def _uncompressed_copies(paths: List[str]) -> Iterator[List[str]]:
+    """Provides uncompressed versions of some files.
+
+    Gzip-compressed files are decompressed to temporary files, which are removed when
+    exiting the context. Seeking backwards inside a gzip file requires decompressing it
+    again from its start, while seeking inside an uncompressed file is cheap.
+
+    Args:
+        paths: A list of file paths.
+
+    Yields:
+        A list of paths to the uncompressed files, in the same order as `paths`.
+
+    """
+    if not any(path.endswith(".gz") for path in paths):
+        yield paths
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        uncompressed_paths = []
+        for i, path in enumerate(paths):
+            if path.endswith(".gz"):
+                uncompressed_path = os.path.join(tmp_dir, str(i))
+                with gzip.open(path, mode="rb") as f_in, open(
+                    uncompressed_path, mode="wb"
+                ) as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+                path = uncompressed_path
+            uncompressed_paths.append(path)
+        yield uncompressed_paths
+
+
+def iter_records(
+    path: str, chunk_size: int = 1 << 20
+) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """Incrementally parses predictions records from a file.
+
+    The file may either contain a JSON array of records, or one record per line
+    (NDJSON). Only a chunk of the file is held in memory at any time.
+
+    Args:
+        path: Path to a predictions document.
+        chunk_size: Number of bytes read at once.
+
+    Yields:
+        Tuples containing each record's position (in bytes) and length (in bytes) inside
+        the (uncompressed) file, and the record itself.
+
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    # `buffer[pos:]` is the unparsed text, which starts at byte `offset` of the file.
+    buffer, pos, offset, eof = "", 0, 0, False
+    record = None
+    with _open(path) as f:
+        while True:
+            # Separators are ASCII characters, so that their length in bytes is known.
+            start = _SEPARATORS.match(buffer, pos).end()
+            offset += start - pos
+            pos = end = start
+            if pos < len(buffer):
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    # The buffer does not hold a complete record.
+                    pass
+            if end == pos:
+                if eof:
+                    if pos < len(buffer):
+                        raise ValueError(
+                            f"Truncated record at byte {offset} of {path}."
+                        )
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + text_decoder.decode(chunk, final=eof), 0
+                continue
+            if not isinstance(record, dict) or "siren" not in record:
+                raise ValueError(f"Invalid record at byte {offset} of {path}.")
+            length = len(buffer[pos:end].encode("utf-8"))
+            yield offset, length, record
+            offset += length
+            pos = end
+
+
+def merge_predictions_lists(
+    predictions_paths: List[str],
+    output_path: str,
+    output_format: str = "json",
+    n_shards: int = 1,
+    n_jobs: int = 1,
+):
     """Builds a front-end-ready predictions list based on multiple model outputs.
 
     The latest available information is used, that is, if a prediction is found for a
     given SIREN in any prediction list, it will replace any previous prediction for this
-    same SIREN.
+    same SIREN. SIRENs are sorted by first appearance in the predictions lists.
+
+    Merging is done in two passes, so that memory usage does not depend on the size of
+    the records: input files are first parsed incrementally to index the location of
+    the latest record for each SIREN. Then, indexed records are read back and written
+    one at a time.
+
+    The SIREN space may be split into shards, according to a SIREN hash, which are
+    merged independently, possibly in parallel.
+
+    Gzip-compressed inputs are decompressed once to temporary files, so that records can
+    be read back in any order at no extra cost.
+
+    Args:
+        predictions_paths: A list of paths to predictions documents, either JSON arrays
+          or NDJSON files. Each entry in these documents should have at least a "siren"
+          key.
+        output_path: A path where the merged predictions list will be written. If
+          `n_shards` is greater than 1, this is a directory where a file will be written
+          for each shard.
+        output_format: The output format, see `dump_records`.
+        n_shards: Number of SIREN shards.
+        n_jobs: Number of processes used to merge shards.
+
+    """
+    with _uncompressed_copies(predictions_paths) as paths:
+        if n_shards == 1:
+            _merge_uncompressed_shard(paths, output_path, output_format, 0, 1)
+            return
+        os.makedirs(output_path, exist_ok=True)
+        tasks = [
+            (
+                paths,
+                os.path.join(output_path, f"part-{shard:05d}.{output_format}"),
+                output_format,
+                shard,
+                n_shards,
+            )
+            for shard in range(n_shards)
+        ]
+        if n_jobs == 1:
+            for task in tasks:
+                _merge_uncompressed_shard(*task)
+        else:
+            with multiprocessing.Pool(n_jobs) as pool:
+                pool.starmap(_merge_uncompressed_shard, tasks)
+
+
+def merge_predictions_shard(
+    predictions_paths: List[str],
+    output_path: str,
+    output_format: str = "json",
+    shard: int = 0,
+    n_shards: int = 1,
+):
+    """Merges the records of a SIREN shard from multiple predictions lists.
+
+    See `merge_predictions_lists`. A SIREN belongs to shard `crc32(siren) % n_shards`.
 
     Args:
-        predictions: A list of paths to predictions JSON documents. Each entry in these
-          documents should have at least a "siren" key.
+        predictions_paths: A list of paths to predictions documents.
         output_path: A path where the merged predictions list will be written.
+        output_format: The output format, see `dump_records`.
+        shard: The index of the merged shard.
+        n_shards: Number of SIREN shards.
 
     """
-    predictions = []
-    for path in predictions_paths:
-        with open(path, encoding="utf-8") as f:
-            predictions.append({entry["siren"]: entry for entry in json.load(f)})
-    merged = predictions[0].copy()
-    for prediction in predictions[1:]:
-        merged.update(prediction)
-
-    with open(output_path, mode="w", encoding="utf-8") as f:
-        json.dump(
-            list(merged.values()),
-            f,
-            indent=4,
+    with _uncompressed_copies(predictions_paths) as paths:
+        _merge_uncompressed_shard(paths, output_path, output_format, shard, n_shards)
+
+
+def _shard_index(
+    paths: List[str], shard: int, n_shards: int
+) -> Dict[str, Tuple[int, int, int]]:
+    """Indexes the location of the latest record of each SIREN inside a shard.
+
+    Returns:
+        A mapping from SIRENs to (file index, offset, length) tuples, sorted by first
+        appearance of the SIRENs.
+
+    """
+    # Dict insertion order is kept when a SIREN's location is updated.
+    index: Dict[str, Tuple[int, int, int]] = {}
+    for file_idx, path in enumerate(paths):
+        for offset, length, record in iter_records(path):
+            siren = str(record["siren"])
+            if zlib.crc32(siren.encode("utf-8")) % n_shards == shard:
+                index[siren] = (file_idx, offset, length)
+    return index
+
+
+def _merge_uncompressed_shard(
+    paths: List[str],
+    output_path: str,
+    output_format: str,
+    shard: int,
+    n_shards: int,
+):
+    """Merges a SIREN shard from uncompressed predictions lists.
+
+    See `merge_predictions_shard`.
+
+    """
+    index = _shard_index(paths, shard, n_shards)
+    with contextlib.ExitStack() as stack:
+        files = [stack.enter_context(open(path, mode="rb")) for path in paths]
+        dump_records(
+            (
+                _read_record(files[file_idx], offset, length)
+                for file_idx, offset, length in index.values()
+            ),
+            output_path,
+            output_format,
         )
+
+
+def _read_record(f, offset: int, length: int) -> Dict[str, Any]:
+    """Reads a record located at some offset inside a binary file."""
+    f.seek(offset)
+    return json.loads(f.read(length).decode("utf-8"))
@@ -20,7 +20,6 @@ import sys
 from os import path
 
 import pyspark.sql.functions as F
-import pyspark.sql.types as T
 
 # isort: off
 sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/"))
@@ -41,21 +40,9 @@ parser.add_argument(
 )
 args = parser.parse_args()
 
-paydex_schema = T.StructType(
-    [
-        T.StructField("siren", T.StringType(), False),
-        T.StructField("état_organisation", T.StringType(), True),
-        T.StructField("code_paydex", T.IntegerType(), True),
-        T.StructField("paydex", T.FloatType(), True),
-        T.StructField("n_fournisseurs", T.IntegerType(), True),
-        T.StructField("encours_étudiés", T.FloatType(), True),
-        T.StructField("fpi_30", T.FloatType(), True),
-        T.StructField("fpi_90", T.FloatType(), True),
-        T.StructField("date", T.DateType(), False),
-    ]
-)
-
-df = spark.read.csv(args.input, sep=",", header=True, schema=paydex_schema)
+_, df = sf_datalake.io.load_data(
+    {"paydex": args.input}, file_format="csv", source="paydex"
+).popitem()
 num_cols = [
     "paydex",
     "fpi_30",
@@ -0,0 +1,43 @@
+"""Convert a csv source file to a typed columnar dataset.
+
+This is meant to be run once per source file, so that later preprocessing runs read
+typed orc / parquet data instead of parsing csv. If the source is registered in
+`sf_datalake.schemas`, its schema is used, otherwise column types are inferred.
+
+USAGE
+    python convert_csv.py <input_file> <output_directory>
+    [--source SOURCE] [--sep SEP] [--output_format {orc,parquet}]
+
+"""
+import os
+import sys
+from os import path
+
+# isort: off
+sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/"))
+sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
+# isort: on
+
+# pylint: disable=C0413
+import sf_datalake.io
+import sf_datalake.schemas
+
+parser = sf_datalake.io.data_path_parser()
+parser.description = "Convert a csv file to a typed columnar dataset."
+parser.add_argument(
+    "--source",
+    choices=sorted(sf_datalake.schemas.SCHEMAS),
+    help="Name of a registered source, whose schema will be used to read the input.",
+)
+parser.add_argument("--sep", default=",", help="Input csv separator character.")
+parser.add_argument(
+    "--output_format",
+    choices=["orc", "parquet"],
+    default="orc",
+    help="Output dataset file format.",
+)
+args = parser.parse_args()
+
+sf_datalake.io.csv_to_columnar(
+    args.input, args.output, args.output_format, sep=args.sep, source=args.source
+)
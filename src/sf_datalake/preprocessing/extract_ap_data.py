@@ -27,10 +27,8 @@ from pyspark.sql.window import Window
 sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/"))
 sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
 
-# pylint: disable=C0413
-import pandas as pd
-
 # isort: on
+# pylint: disable=C0413
 import sf_datalake.configuration
 import sf_datalake.io
 import sf_datalake.transform
@@ -82,67 +80,23 @@ configuration = sf_datalake.configuration.ConfigurationHelper(
 )
 
 # Load Data
-consommation_schema = T.StructType(
-    [
-        T.StructField("id_da", T.StringType(), True),
-        T.StructField("siret", T.StringType(), False),
-        T.StructField("ap_heures_consommées", T.DoubleType(), True),
-        T.StructField("montants", T.DoubleType(), True),
-        T.StructField("effectifs", T.DoubleType(), True),
-        T.StructField("période", T.DateType(), False),
-    ]
-)
-demande_schema = T.StructType(
-    [
-        T.StructField("id_da", T.StringType(), True),
-        T.StructField("siret", T.StringType(), False),
-        T.StructField("eff_ent", T.DoubleType(), True),
-        T.StructField("eff_étab", T.DoubleType(), True),
-        T.StructField("date_statut", T.DateType(), True),
-        T.StructField("date_début", T.DateType(), False),
-        T.StructField("date_fin", T.DateType(), False),
-        T.StructField("hta", T.DoubleType(), True),
-        T.StructField("mta", T.DoubleType(), True),
-        T.StructField("eff_auto", T.DoubleType(), True),
-        T.StructField("motif_recours_se", T.IntegerType(), True),
-        T.StructField("périmètre_ap", T.IntegerType(), True),
-        T.StructField("s_heure_consom_tot", T.DoubleType(), True),
-        T.StructField("s_eff_consom_tot", T.DoubleType(), True),
-        T.StructField("s_montant_consom_tot", T.DoubleType(), True),
-        T.StructField("recours_antérieur", T.IntegerType(), True),
-    ]
-)
-
 # Select required columns and filter "demande" set according to the reason the
 # unemployment authorization was requested.
-demande = spark.read.csv(args.demande_data, header=True, schema=demande_schema).filter(
-    F.col("motif_recours_se") < 6
-)
-consommation = spark.read.csv(
-    args.consommation_data, header=True, schema=consommation_schema
-)
+_, demande = sf_datalake.io.load_data(
+    {"demande": args.demande_data}, file_format="csv", source="ap_demande"
+).popitem()
+_, consommation = sf_datalake.io.load_data(
+    {"consommation": args.consommation_data},
+    file_format="csv",
+    source="ap_consommation",
+).popitem()
+demande = demande.filter(F.col("motif_recours_se") < 6)
 demande = demande.select(["siret", "date_statut", "date_début", "date_fin", "hta"])
 consommation = consommation.select(["siret", "période", "ap_heures_consommées"])
 
 siret_to_siren_transformer = sf_datalake.transform.SiretToSiren(inputCol="siret")
 
 ### "Demande" dataset
-# Create the time index for the output DataFrame. For now it has daily frequency in
-# order to normalize and aggregate data easily.
-date_range = spark.createDataFrame(
-    pd.DataFrame(
-        pd.date_range(args.min_date, args.max_date, freq="D").to_series(),
-        columns=["période"],
-    )
-)
-
-demande = demande.join(
-    date_range,
-    (date_range["période"] >= demande["date_début"])
-    & (date_range["période"] <= demande["date_fin"]),
-)
-
-
 # Normalize by timeframes length, in days.
 demande = demande.withColumn(
     "ap_heures_autorisées_par_jour",
@@ -179,21 +133,40 @@ demande = (
     .drop("nouvel_intervalle", "date_fin_max_cumulé")
 )
 
-# Sum over newly defined merged timeframes, then over siren. The first aggregation is
-# done over all days belonging to the same month so that "période" becomes a monthly
-# index.
+# Spread over the months covered by the requested time frames, restricted to the
+# user-input dates. Each month gets the granted "ap" for the number of days of the time
+# frame that it contains.
+demande = (
+    demande.withColumn(
+        "_début", F.greatest("date_début", F.lit(args.min_date).cast(T.DateType()))
+    )
+    .withColumn("_fin", F.least("date_fin", F.lit(args.max_date).cast(T.DateType())))
+    .filter(F.col("_fin") >= F.col("_début"))
+    .withColumn("_mois_début", F.trunc("_début", "month"))
+)
+demande = sf_datalake.transform.IntervalExploder(
+    start="_mois_début",
+    end="_fin",
+    outputCol="période",
+    frequency="month",
+    end_inclusive=True,
+).transform(demande)
+demande = demande.withColumn(
+    "ap_heures_autorisées_mois",
+    F.col("ap_heures_autorisées_par_jour")
+    * (
+        F.datediff(
+            F.least("_fin", F.last_day("période")), F.greatest("_début", "période")
+        )
+        + 1
+    ),
+)
+
+# Sum over newly defined merged timeframes, then over siren.
 demande_agg = (
     siret_to_siren_transformer.transform(
-        demande.groupBy(
-            [
-                F.date_trunc(format="month", timestamp="période")
-                .cast("date")
-                .alias("période"),
-                "siret",
-                "id_intervalle",
-            ]
-        ).agg(
-            F.sum("ap_heures_autorisées_par_jour").alias("ap_heures_autorisées"),
+        demande.groupBy(["période", "siret", "id_intervalle"]).agg(
+            F.sum("ap_heures_autorisées_mois").alias("ap_heures_autorisées"),
             # TODO: we may want to keep these boundary dates by early exporting
             # SIRET-level data here
             F.min("date_début").alias("ap_date_début_autorisation"),
@@ -14,7 +14,6 @@ import sys
 from os import path
 
 import pyspark.sql.functions as F
-import pyspark.sql.types as T
 
 # isort: off
 sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/"))
@@ -22,8 +21,6 @@ sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
 # isort: on
 
 # pylint: disable=C0413
-import pandas as pd
-
 import sf_datalake.configuration
 import sf_datalake.io
 import sf_datalake.transform
@@ -53,25 +50,12 @@ configuration = sf_datalake.configuration.ConfigurationHelper(
     config_file=args.configuration
 )
 
-cotisation_schema = T.StructType(
-    [
-        T.StructField("siret", T.StringType(), False),
-        T.StructField("numéro_compte", T.StringType(), True),
-        T.StructField("fenêtre", T.StringType(), False),
-        T.StructField("encaissé", T.DoubleType(), True),
-        T.StructField("dû", T.DoubleType(), True),
-    ]
-)
 siret_to_siren = sf_datalake.transform.SiretToSiren()
 
-# Create a monthly date range that will become the time index
-dr = pd.date_range(args.min_date, dt.date.today().isoformat(), freq="MS")
-date_range = spark.createDataFrame(
-    pd.DataFrame(dr.to_series().dt.date, columns=["période"])
-)
-
 ## "Cotisation" data
-cotisation = spark.read.csv(args.input, header=True, schema=cotisation_schema)
+_, cotisation = sf_datalake.io.load_data(
+    {"cotisation": args.input}, file_format="csv", source="urssaf_cotisation"
+).popitem()
 
 # Preprocess "fenêtre", which comes as two adjacent dates in the following format:
 # "YYYY-MM-DDThh:mm:ss-YYYY-MM-DDThh:mm:ss"
@@ -91,13 +75,14 @@ cotisation = cotisation.withColumn(
     F.col("dû") / F.months_between("date_fin", "date_début"),
 )
 
-cotisation = cotisation.join(
-    date_range,
-    on=date_range["période"].between(
-        cotisation["date_début"], F.date_sub(cotisation["date_fin"], 1)
-    ),
-    how="inner",
-)
+cotisation = sf_datalake.transform.IntervalExploder(
+    start="date_début",
+    end="date_fin",
+    outputCol="période",
+    frequency="month",
+    min_date=args.min_date,
+    max_date=dt.date.today(),
+).transform(cotisation)
 
 # Handle missing values and export
 mvh = sf_datalake.transform.MissingValuesHandler(
@@ -31,10 +31,10 @@ sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
 
 # pylint:disable=wrong-import-position
 import dateutil.parser
-import pandas as pd
 
 import sf_datalake.configuration
 import sf_datalake.io
+import sf_datalake.transform
 import sf_datalake.utils
 
 ####################
@@ -59,6 +59,13 @@ parser.add_argument(
     help="""Requested start date for the output dataset.""",
     default="2014-01-01",
 )
+parser.add_argument(
+    "--metrics_output",
+    help="""
+    If set, per-stage metrics of the processing pipeline are written to this path as a
+    JSON document.
+    """,
+)
 parser.description = "Build a dataset of yearly DGFiP data."
 args = parser.parse_args()
 
@@ -188,26 +195,18 @@ source_variables: List[str] = [
 # Filter by date
 df = df.filter(F.col("date_fin_exercice") > dateutil.parser.parse(args.min_date))
 
+# Spread over the months covered by each fiscal year.
+df = sf_datalake.transform.IntervalExploder(
+    start="date_début_exercice",
+    end="date_fin_exercice",
+    outputCol="période",
+    frequency="month",
+    min_date=args.min_date,
+    max_date=dt.date.today(),
+).transform(df)
+
 # We remove data where multiple declarations exist for a given (SIREN, date) couple and
 # only keep the line with the lowest null values count.
-
-# Create a monthly date range that will become a time index
-date_range = spark.createDataFrame(
-    pd.DataFrame(
-        pd.date_range(args.min_date, dt.date.today().isoformat(), freq="MS")
-        .to_series()
-        .dt.date,
-        columns=["période"],
-    )
-)
-
-df = df.join(
-    date_range,
-    on=date_range["période"].between(
-        df["date_début_exercice"], F.date_sub(df["date_fin_exercice"], 1)
-    ),
-    how="inner",
-)
 df = df.withColumn(
     "null_count",
     sum([F.when(F.col(c).isNull(), 1).otherwise(0) for c in df.columns]),
@@ -305,7 +304,14 @@ mvh_fe = sf_datalake.transform.MissingValuesHandler(
     value=configuration.preprocessing.fill_default_values,
 )
 
-df = PipelineModel([time_normalizer, mvh_fe]).transform(df)
+if args.metrics_output is not None:
+    pipeline_model = sf_datalake.transform.InstrumentedPipelineModel(
+        [time_normalizer, mvh_fe], count_rows=True
+    )
+    df = pipeline_model.transform(df)
+    pipeline_model.write_metrics(args.metrics_output)
+else:
+    df = PipelineModel([time_normalizer, mvh_fe]).transform(df)
 
 ##########
 # Export #
@@ -37,13 +37,14 @@ parser.add_argument(
 )
 args = parser.parse_args()
 
-df = spark.read.csv(
-    args.input,
+_, df = sf_datalake.io.load_data(
+    {"judgments": args.input},
+    file_format="csv",
     sep="|",
-    inferSchema=True,
-    header=True,
-)
-df = df.withColumn("djug", F.to_date(F.col("djug").cast("string"), "yyyyMMdd"))
+    infer_schema=False,
+    columns=["siren", "djug", "najug"],
+).popitem()
+df = df.withColumn("djug", F.to_date(F.col("djug"), "yyyyMMdd"))
 
 judgment_codes = {
     "1": "LIQUIDATION DE BIENS",
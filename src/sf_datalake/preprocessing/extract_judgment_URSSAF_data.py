@@ -36,19 +36,19 @@ parser.add_argument(
 args = parser.parse_args()
 
 # Filter to restricted input time period.
-df = spark.read.csv(
-    args.input,
-    inferSchema=True,
-    header=True,
-)
+_, df = sf_datalake.io.load_data(
+    {"judgments": args.input},
+    file_format="csv",
+    infer_schema=False,
+    columns=["siret", "date_effet"],
+).popitem()
+df = df.withColumn("date_effet", F.to_date(F.col("date_effet")))
 df = df.filter(
     (F.col("date_effet") >= args.start_date) & (F.col("date_effet") <= args.end_date)
 )
 # Group by SIREN, then get first judgment within input time period
 df = sf_datalake.transform.SiretToSiren(inputCol="siret").transform(df)
-df_output = df.groupBy("siren").agg(
-    F.to_date(F.min("date_effet")).alias("date_jugement")
-)
+df_output = df.groupBy("siren").agg(F.min("date_effet").alias("date_jugement"))
 
 # Write output
 sf_datalake.io.write_data(df_output, args.output, args.output_format)
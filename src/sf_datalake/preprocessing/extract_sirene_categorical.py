@@ -13,13 +13,26 @@ See https://www.data.gouv.fr/fr/datasets/base-sirene-des-entreprises-et-de-leurs
 """
 
 import argparse
+import itertools
+import os
+import sys
+from os import path
+from typing import Dict
 
-import pandas as pd
+import pyspark.sql.functions as F
+
+# isort: off
+sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/"))
+sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
+# isort: on
+
+# pylint: disable=C0413
+import sf_datalake.io
+import sf_datalake.utils
 
 # Regions encoding
 
-# pylint: disable=E1136
-REGIONS: dict[str, str] = {
+REGIONS: Dict[str, str] = {
     "01": "Auvergne-Rhône-Alpes",
     "03": "Auvergne-Rhône-Alpes",
     "07": "Auvergne-Rhône-Alpes",
@@ -121,7 +134,7 @@ REGIONS: dict[str, str] = {
     "2B": "Haute-Corse",
 }
 
-DROM: dict[str, str] = {
+DROM: Dict[str, str] = {
     "971": "Guadeloupe",
     "972": "Martinique",
     "973": "Guyane",
@@ -147,56 +160,61 @@ parser.add_argument(
     "--et_file", dest="ET_INPUT_FILE", help="The 'Établissement' database."
 )
 parser.add_argument("-o", "--output_file", dest="OUTPUT_FILE")
+parser.add_argument(
+    "--output_format", default="csv", help="Output dataset file format."
+)
 args = parser.parse_args()
 
-# "Établissement" data
+spark = sf_datalake.utils.get_spark_session()
+
+
+def literal_map(mapping: Dict[str, str]):
+    """Builds a map column holding `mapping` key-value pairs."""
+    return F.create_map([F.lit(x) for x in itertools.chain(*mapping.items())])
+
+
+# "Établissement" data, restricted to head offices. All fields are read as strings,
+# which is how identifiers and codes should be typed anyway.
 df_et = (
-    pd.read_csv(
-        args.ET_INPUT_FILE,
-        usecols=[
+    sf_datalake.io.load_data(
+        {"et": args.ET_INPUT_FILE},
+        file_format="csv",
+        infer_schema=False,
+        columns=[
             "siren",
             "siret",
             "etablissementSiege",
             "codeCommuneEtablissement",
             "activitePrincipaleEtablissement",
         ],
-        dtype={
-            "siren": str,
-            "siret": str,
-            "codeCommuneEtablissement": str,
-            "etablissementSiege": bool,
-        },
-    )
-    .rename(
-        columns={
-            "etablissementSiege": "siège",
-            "codeCommuneEtablissement": "code_commune",
-            "activitePrincipaleEtablissement": "code_naf",
-        },
+    )["et"]
+    .filter(F.col("etablissementSiege").cast("boolean"))
+    .select(
+        "siren",
+        "siret",
+        F.col("codeCommuneEtablissement").alias("code_commune"),
+        F.col("activitePrincipaleEtablissement").alias("code_naf"),
     )
-    .set_index("siren")
 )
 
-df_et["région"] = df_et["code_commune"].str[:2].map(REGIONS)
-df_et.loc[df_et["région"] == "DROM", "région"] = (
-    df_et[df_et["région"] == "DROM"]["code_commune"].str[:3].map(DROM)
+# Regions are looked up inside literal maps, without any join.
+région = literal_map(REGIONS)[F.substring("code_commune", 1, 2)]
+df_et = df_et.withColumn(
+    "région",
+    F.when(
+        région == "DROM", literal_map(DROM)[F.substring("code_commune", 1, 3)]
+    ).otherwise(région),
 )
 
 # "Unité légale" data
-df_ul = (
-    pd.read_csv(
-        args.UL_INPUT_FILE,
-        usecols=["siren", "categorieJuridiqueUniteLegale"],
-        dtype=str,
-    )
-    .set_index("siren")
-    .rename(columns={"categorieJuridiqueUniteLegale": "catégorie_juridique"})
-)
-
-# Keep only head office
-df_et = df_et.loc[df_et["siège"]].drop("siège", axis=1)
+df_ul = sf_datalake.io.load_data(
+    {"ul": args.UL_INPUT_FILE},
+    file_format="csv",
+    infer_schema=False,
+    columns=["siren", "categorieJuridiqueUniteLegale"],
+)["ul"].withColumnRenamed("categorieJuridiqueUniteLegale", "catégorie_juridique")
 
 # Export
-df_et.join(df_ul, on="siren", how="inner").to_csv(
-    args.OUTPUT_FILE,
+sf_datalake.io.write_data(
+    df_et.join(df_ul, on="siren", how="inner"), args.OUTPUT_FILE, args.output_format
 )
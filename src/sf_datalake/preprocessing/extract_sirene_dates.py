@@ -17,8 +17,20 @@ for more info.
 """
 
 import argparse
+import os
+import sys
+from os import path
 
-import pandas as pd
+import pyspark.sql.functions as F
+
+# isort: off
+sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/"))
+sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
+# isort: on
+
+# pylint: disable=C0413
+import sf_datalake.io
+import sf_datalake.utils
 
 parser = argparse.ArgumentParser("Extract sirene data")
 parser.add_argument(
@@ -30,58 +42,36 @@ parser.add_argument(
     help="StockEtablissementHistorique database.",
 )
 parser.add_argument("-o", "--output_file", dest="OUTPUT_FILE")
-args = parser.parse_args()
-
-df_et_hist = pd.read_csv(
-    args.et_hist_file,
-    usecols=[
-        "siret",
-        "etatAdministratifEtablissement",
-        "dateDebut",
-        "dateFin",
-    ],
-    dtype={
-        "siret": str,
-        "etatAdministratifEtablissement": "category",
-        "dateDebut": str,
-        "dateFin": str,
-    },
-).rename(
-    columns={
-        "etatAdministratifEtablissement": "état_actif",
-        "dateFin": "date_fin",
-        "dateDebut": "date_début",
-    },
+parser.add_argument(
+    "--output_format", default="csv", help="Output dataset file format."
 )
+args = parser.parse_args()
 
+spark = sf_datalake.utils.get_spark_session()
 
-df_et_hist = df_et_hist.dropna(subset=["date_début"])  # Entreprise purgée
-df_et_hist = df_et_hist.dropna(subset=["état_actif"])
-
-# Filter on activity status and parse dates
-df_et_hist["état_actif"] = df_et_hist["état_actif"].map({"A": True, "F": False})
-df_et_hist = df_et_hist.loc[df_et_hist["état_actif"]].drop(
-    columns=["état_actif"], axis=1
-)
-df_et_hist["date_début"] = pd.to_datetime(
-    df_et_hist["date_début"], format="%Y-%m-%d", errors="coerce"
-)
-df_et_hist["date_fin"] = pd.to_datetime(
-    df_et_hist["date_fin"], format="%Y-%m-%d", errors="coerce"
+# Only active periods of "établissements" are kept. Rows without a start date concern
+# purged companies.
+df_et_hist = sf_datalake.io.load_data(
+    {"et_hist": args.et_hist_file},
+    file_format="csv",
+    infer_schema=False,
+    columns=["siret", "etatAdministratifEtablissement", "dateDebut", "dateFin"],
+    filters=(F.col("etatAdministratifEtablissement") == "A")
+    & F.col("dateDebut").isNotNull(),
+)["et_hist"].select(
+    "siret",
+    F.to_date("dateFin", "yyyy-MM-dd").alias("date_fin"),
+    F.to_date("dateDebut", "yyyy-MM-dd").alias("date_début"),
 )
 
 # Load head office info from first extraction and merge with date info
-df_et_ul = pd.read_csv(
-    args.catagorical_data,
-    dtype={
-        "siren": "str",
-        "siret": "str",
-    },
-    usecols=["siren", "siret"],
-)
-df_dates = pd.merge(df_et_ul, df_et_hist, on="siret", how="inner").drop(
-    columns=["siret"]
-)
+df_et_ul = sf_datalake.io.load_data(
+    {"et_ul": args.catagorical_data},
+    file_format="csv",
+    infer_schema=False,
+    columns=["siren", "siret"],
+)["et_ul"]
+df_dates = df_et_ul.join(df_et_hist, on="siret", how="inner").drop("siret")
 
 # Export
-df_dates.to_csv(args.OUTPUT_FILE, index=False)
+sf_datalake.io.write_data(df_dates, args.OUTPUT_FILE, args.output_format)
@@ -18,6 +18,10 @@ sources, where a single CSV is expected:
 
 The time index column should be named 'période' and formatted as follows : "yyyy-MM-dd"
 
+The output dataset is partitioned by 'période'. If `--since` is provided, only
+'période' values starting from this date are computed, and the associated partitions of
+an existing output dataset are overwritten, while older partitions are left untouched.
+
 Type
   python join_datasets.py --help
 for detailed usage.
@@ -29,7 +33,6 @@ import sys
 from os import path
 
 import pyspark.sql.functions as F
-import pyspark.sql.types as T
 
 # isort: off
 sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/"))
@@ -98,6 +101,14 @@ parser.add_argument(
 parser.add_argument(
     "--output_format", default="orc", help="Output dataset file format."
 )
+parser.add_argument(
+    "--since",
+    help="""
+    Date formatted as "yyyy-MM-dd". If set, only compute data for 'période' values
+    starting from this date and overwrite the associated partitions of the output
+    dataset.
+    """,
+)
 
 args = parser.parse_args()
 
@@ -114,42 +125,10 @@ datasets = load_data(
     file_format="orc",
 )
 
-sirene_dates_schema = T.StructType(
-    [
-        T.StructField("siren", T.StringType(), False),
-        T.StructField("date_fin", T.DateType(), True),
-        T.StructField("date_début", T.DateType(), True),
-    ]
-)
-
-sirene_categories_schema = T.StructType(
-    [
-        T.StructField("siren", T.StringType(), False),
-        T.StructField("siret", T.StringType(), True),
-        T.StructField("code_commune", T.StringType(), True),
-        T.StructField("code_naf", T.StringType(), True),
-        T.StructField("région", T.StringType(), True),
-        T.StructField("catégorie_juridique", T.StringType(), True),
-    ]
-)
-effectif_schema = T.StructType(
-    [
-        T.StructField("siren", T.StringType(), False),
-        T.StructField("période", T.DateType(), False),
-        T.StructField("effectif", T.IntegerType(), True),
-    ]
-)
-perimeter_schema = T.StructType([T.StructField("siren", T.StringType(), False)])
-
-datasets["sirene_categories"] = spark.read.csv(
-    args.sirene_categories, header=True, schema=sirene_categories_schema
-)
-datasets["sirene_dates"] = spark.read.csv(
-    args.sirene_dates, header=True, schema=sirene_dates_schema
-)
-datasets["effectif"] = spark.read.csv(
-    args.effectif, header=True, schema=effectif_schema
-)
+for name in ("sirene_categories", "sirene_dates", "effectif"):
+    datasets.update(
+        load_data({name: getattr(args, name)}, file_format="csv", source=name)
+    )
 
 # Prepare datasets
 siren_normalizer = sf_datalake.transform.IdentifierNormalizer(inputCol="siren")
@@ -180,23 +159,32 @@ monthly_df = (
     .join(df_sirene_categories, on="siren", how="inner")
 )
 
+# Yearly data is matched with monthly data up to this number of days later.
+yearly_tolerance = 365
+
+# In incremental mode, only keep new periods, as well as yearly data that can be matched
+# with these periods.
+if args.since is not None:
+    monthly_df = monthly_df.filter(F.col("période") >= args.since)
+    df_dgfip_yearly = df_dgfip_yearly.filter(
+        F.col("période") >= F.date_sub(F.lit(args.since).cast("date"), yearly_tolerance)
+    )
+
 # Join monthly dataset with yearly dataset
 joined_df = sf_datalake.utils.merge_asof(
     monthly_df,
     df_dgfip_yearly,
     on="période",
     by="siren",
-    tolerance=365,
+    tolerance=yearly_tolerance,
     direction="backward",
 )
 
 # Filter dataset to perimeter (if provided), and known activity dates
 if args.perimeter is not None:
-    siren_perimeter = spark.read.csv(
-        args.perimeter,
-        header=True,
-        schema=perimeter_schema,
-    )
+    _, siren_perimeter = load_data(
+        {"perimeter": args.perimeter}, file_format="csv", source="perimeter"
+    ).popitem()
     joined_df = joined_df.join(siren_perimeter, on="siren", how="left_semi")
 
 output_df = joined_df.join(
@@ -209,4 +197,10 @@ output_df = joined_df.join(
     how="left_semi",
 )
 
-write_data(output_df, args.output_path, args.output_format)
+write_data(
+    output_df,
+    args.output_path,
+    args.output_format,
+    partition_by=["période"],
+    overwrite_partitions=args.since is not None,
+)
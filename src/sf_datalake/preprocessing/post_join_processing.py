@@ -6,11 +6,32 @@
 - Computation of averages, lags, etc. of existing variables.
 - Computation of some combinations of existing features.
 
-An output dataset will be stored as split orc files under the chosen output directory.
+An output dataset will be stored as split files under the chosen output directory,
+partitioned by 'période'. The file format defaults to the configuration's
+`dataset_format`, and compression codec, block size and bloom filter columns are also
+read from the `io` configuration. Unless the dataset is bucketed, files are sorted by
+'siren', so that siren lookups can skip most blocks using min / max statistics and
+bloom filters.
+
+If `--since` is provided, only 'période' values starting from this date are computed,
+using as many past months of input data as required by time aggregations, and the
+associated partitions of an existing output dataset are overwritten. Older partitions
+are left untouched, which means that:
+- targets will not reflect judgments that became known after these partitions were
+  computed.
+- missing values filled using backward filling, or using statistics computed over the
+  whole dataset, will not be updated. Values filled using forward filling may differ
+  from a full computation if the last known value is older than the look-back period.
+
+If `--table_name` is provided, the output dataset is also bucketed by 'siren' and
+sorted by 'période' inside each bucket, so that downstream siren-level operations
+(windows, grouping, joins) can be carried out without shuffling the whole dataset. It
+is then registered under this table name in spark's catalog, and should be read as a
+table. This cannot be combined with `--since`.
 
 USAGE
     python post_join_processing.py <input_dataset> <output_dataset> \
--c [config_filename]
+-c [config_filename] [--input_format orc] [--since yyyy-MM-dd]
 
 """
 import os
@@ -18,6 +39,7 @@ import sys
 from os import path
 from typing import Any, Dict, List
 
+import pyspark.sql.functions as F
 from pyspark.ml import PipelineModel, Transformer
 
 # isort: off
@@ -29,7 +51,6 @@ sys.path.append(path.join(os.getcwd(), "venv/lib/python3.6/site-packages/"))
 import sf_datalake.configuration
 import sf_datalake.io
 import sf_datalake.transform
-import sf_datalake.utils
 
 ####################
 # Loading datasets #
@@ -39,14 +60,69 @@ parser = sf_datalake.io.data_path_parser()
 parser.description = "Build a complete dataset with new time averaged/lagged variables."
 parser.add_argument("-c", "--configuration", help="Configuration file.", required=True)
 parser.add_argument(
-    "--output_format", default="orc", help="Output dataset file format."
+    "--input_format",
+    choices=["orc", "parquet", "delta"],
+    default="orc",
+    help="Input dataset file format, see `join_datasets.py` output format.",
+)
+parser.add_argument(
+    "--output_format",
+    help="""
+    Output dataset file format. Defaults to the configuration's dataset format, or orc
+    if the dataset is configured to be read as a table.
+    """,
+)
+parser.add_argument(
+    "--since",
+    help="""
+    Date formatted as "yyyy-MM-dd". If set, only compute data for 'période' values
+    starting from this date and overwrite the associated partitions of the output
+    dataset.
+    """,
+)
+parser.add_argument(
+    "--table_name",
+    help="If set, write the output as a table bucketed by 'siren' with this name.",
+)
+parser.add_argument(
+    "--n_buckets",
+    type=int,
+    default=200,
+    help="Number of buckets, in case `--table_name` is set.",
+)
+parser.add_argument(
+    "--metrics_output",
+    help="""
+    If set, per-stage metrics of the processing pipeline are written to this path as a
+    JSON document.
+    """,
 )
 
 
 args = parser.parse_args()
+if args.since is not None and args.table_name is not None:
+    parser.error("--since and --table_name cannot be used together.")
 configuration = sf_datalake.configuration.ConfigurationHelper(args.configuration)
-spark = sf_datalake.utils.get_spark_session()
-input_ds = spark.read.orc(args.input)
+if args.output_format is None:
+    args.output_format = (
+        configuration.io.dataset_format
+        if configuration.io.dataset_format != "table"
+        else "orc"
+    )
+
+# In incremental mode, read enough past months of data to compute lags, diffs and
+# moving averages over the new periods.
+input_filters = None
+if args.since is not None:
+    look_back = sf_datalake.transform.TimeAggregationOperator(
+        time_aggregation=configuration.preprocessing.time_aggregation
+    ).look_back()
+    input_filters = F.col("période") >= F.add_months(
+        F.lit(args.since).cast("date"), -look_back
+    )
+_, input_ds = sf_datalake.io.load_data(
+    {"input": args.input}, file_format=args.input_format, filters=input_filters
+).popitem()
 
 # Set every column name to lower case (if not already).
 df = input_ds.toDF(*(col.lower() for col in input_ds.columns))
@@ -105,19 +181,12 @@ if configuration.preprocessing.fill_imputation_strategy:
 # Time computations #
 #####################
 
-time_computations: List[Transformer] = []
-for feature, n_months in configuration.preprocessing.time_aggregation["lag"].items():
-    time_computations.append(
-        sf_datalake.transform.LagOperator(inputCol=feature, n_months=n_months)
-    )
-for feature, n_months in configuration.preprocessing.time_aggregation["diff"].items():
-    time_computations.append(
-        sf_datalake.transform.DiffOperator(inputCol=feature, n_months=n_months)
-    )
-for feature, n_months in configuration.preprocessing.time_aggregation["mean"].items():
-    time_computations.append(
-        sf_datalake.transform.MovingAverage(inputCol=feature, n_months=n_months)
+# All lags, diffs and moving averages are computed in a single window pass.
+time_computations: List[Transformer] = [
+    sf_datalake.transform.TimeAggregationOperator(
+        time_aggregation=configuration.preprocessing.time_aggregation
     )
+]
 
 # Bfill after time computation
 features_lag_bfill = [
@@ -161,9 +230,15 @@ time_computations.append(
 )
 
 
-df = PipelineModel(
-    stages=labeling_step + missing_values_handling_steps + time_computations
-).transform(df)
+stages = labeling_step + missing_values_handling_steps + time_computations
+if args.metrics_output is not None:
+    pipeline_model = sf_datalake.transform.InstrumentedPipelineModel(
+        stages, count_rows=True
+    )
+    df = pipeline_model.transform(df)
+    pipeline_model.write_metrics(args.metrics_output)
+else:
+    df = PipelineModel(stages=stages).transform(df)
 
 ## Feature engineering based on time computations
 for n_months in configuration.preprocessing.time_aggregation.get("mean", {}).get(
@@ -176,4 +251,19 @@ for n_months in configuration.preprocessing.time_aggregation.get("mean", {}).get
     )
 
 ## Export
-sf_datalake.io.write_data(df, args.output, args.output_format)
+if args.since is not None:
+    df = df.filter(F.col("période") >= args.since)
+sf_datalake.io.write_data(
+    df,
+    args.output,
+    args.output_format,
+    partition_by=["période"],
+    overwrite_partitions=args.since is not None,
+    bucket_by=["siren"] if args.table_name is not None else None,
+    n_buckets=args.n_buckets,
+    sort_by=["période"] if args.table_name is not None else ["période", "siren"],
+    table_name=args.table_name,
+    compression=configuration.io.compression,
+    block_size=configuration.io.block_size,
+    bloom_filter_columns=configuration.io.bloom_filter_columns,
+)
@@ -0,0 +1,143 @@
+"""Schemas of the csv sources ingested by the preprocessing scripts.
+
+Spark applies a csv schema by column position, so a source is only registered here if
+the full layout of its files is known. A registered schema is used by
+`sf_datalake.io.load_data` when its source name is explicitly passed. Other csv files
+are read with inferred types, or with every column typed as a string if inference is
+disabled.
+
+"""
+
+from typing import Dict
+
+import pyspark.sql.types as T
+
+SCHEMAS: Dict[str, T.StructType] = {
+    # Outputs of `extract_sirene_categorical.py` and `extract_sirene_dates.py`.
+    "sirene_categories": T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("siret", T.StringType(), True),
+            T.StructField("code_commune", T.StringType(), True),
+            T.StructField("code_naf", T.StringType(), True),
+            T.StructField("région", T.StringType(), True),
+            T.StructField("catégorie_juridique", T.StringType(), True),
+        ]
+    ),
+    "sirene_dates": T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("date_fin", T.DateType(), True),
+            T.StructField("date_début", T.DateType(), True),
+        ]
+    ),
+    # Outputs of `sf_datalake.io.write_predictions`.
+    "test_data": T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("failure", T.IntegerType(), True),
+            T.StructField("probability", T.DoubleType(), True),
+        ]
+    ),
+    "prediction_data": T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("probability", T.DoubleType(), True),
+        ]
+    ),
+    "effectif": T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("période", T.DateType(), False),
+            T.StructField("effectif", T.IntegerType(), True),
+        ]
+    ),
+    "perimeter": T.StructType([T.StructField("siren", T.StringType(), False)]),
+    "paydex": T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("état_organisation", T.StringType(), True),
+            T.StructField("code_paydex", T.IntegerType(), True),
+            T.StructField("paydex", T.FloatType(), True),
+            T.StructField("n_fournisseurs", T.IntegerType(), True),
+            T.StructField("encours_étudiés", T.FloatType(), True),
+            T.StructField("fpi_30", T.FloatType(), True),
+            T.StructField("fpi_90", T.FloatType(), True),
+            T.StructField("date", T.DateType(), False),
+        ]
+    ),
+    "ap_consommation": T.StructType(
+        [
+            T.StructField("id_da", T.StringType(), True),
+            T.StructField("siret", T.StringType(), False),
+            T.StructField("ap_heures_consommées", T.DoubleType(), True),
+            T.StructField("montants", T.DoubleType(), True),
+            T.StructField("effectifs", T.DoubleType(), True),
+            T.StructField("période", T.DateType(), False),
+        ]
+    ),
+    "ap_demande": T.StructType(
+        [
+            T.StructField("id_da", T.StringType(), True),
+            T.StructField("siret", T.StringType(), False),
+            T.StructField("eff_ent", T.DoubleType(), True),
+            T.StructField("eff_étab", T.DoubleType(), True),
+            T.StructField("date_statut", T.DateType(), True),
+            T.StructField("date_début", T.DateType(), False),
+            T.StructField("date_fin", T.DateType(), False),
+            T.StructField("hta", T.DoubleType(), True),
+            T.StructField("mta", T.DoubleType(), True),
+            T.StructField("eff_auto", T.DoubleType(), True),
+            T.StructField("motif_recours_se", T.IntegerType(), True),
+            T.StructField("périmètre_ap", T.IntegerType(), True),
+            T.StructField("s_heure_consom_tot", T.DoubleType(), True),
+            T.StructField("s_eff_consom_tot", T.DoubleType(), True),
+            T.StructField("s_montant_consom_tot", T.DoubleType(), True),
+            T.StructField("recours_antérieur", T.IntegerType(), True),
+        ]
+    ),
+    "urssaf_cotisation": T.StructType(
+        [
+            T.StructField("siret", T.StringType(), False),
+            T.StructField("numéro_compte", T.StringType(), True),
+            T.StructField("fenêtre", T.StringType(), False),
+            T.StructField("encaissé", T.DoubleType(), True),
+            T.StructField("dû", T.DoubleType(), True),
+        ]
+    ),
+    "urssaf_debit": T.StructType(
+        [
+            T.StructField("siret", T.StringType(), False),
+            T.StructField("numéro_compte", T.StringType(), True),
+            T.StructField("numéro_écart_négatif", T.IntegerType(), True),
+            T.StructField("date_traitement", T.StringType(), False),
+            T.StructField("dette_sociale_ouvrière", T.DoubleType(), True),
+            T.StructField("dette_sociale_patronale", T.DoubleType(), True),
+            T.StructField("numéro_historique_écart_négatif", T.ShortType(), True),
+            T.StructField("état_compte", T.IntegerType(), True),
+            T.StructField("code_procédure_collective", T.ByteType(), True),
+            T.StructField("période_cotisation", T.StringType(), True),
+            T.StructField("code_opération_écart_négatif", T.ByteType(), True),
+            T.StructField("code_motif_écart_négatif", T.ByteType(), True),
+            T.StructField("recours", T.StringType(), True),
+        ]
+    ),
+}
+
+
+def get_schema(source: str) -> T.StructType:
+    """Returns the registered schema of some source.
+
+    Args:
+        source: The source name.
+
+    Returns:
+        The schema of the source files.
+
+    """
+    try:
+        return SCHEMAS[source]
+    except KeyError as err:
+        raise ValueError(
+            f"Unknown source {source}, registered sources are: {', '.join(SCHEMAS)}."
+        ) from err
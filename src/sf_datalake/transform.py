@@ -2,8 +2,11 @@
 
 import datetime as dt
 import itertools
+import json
 import logging
-from typing import List, Tuple, Union
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pyspark.ml
@@ -20,9 +23,16 @@ from pyspark.ml.param.shared import (
     Param,
     Params,
 )
+from pyspark.ml.util import DefaultParamsReadable, DefaultParamsWritable
 from pyspark.sql import Window
 
-from sf_datalake.utils import count_missing_values
+from sf_datalake.utils import (
+    apply_in_pandas,
+    count_missing_values,
+    estimated_size_in_bytes,
+    get_spark_session,
+    spark_version,
+)
 
 
 def vector_disassembler(
@@ -30,14 +40,23 @@ def vector_disassembler(
     columns: List[str],
     assembled_col: str,
     keep: List[str] = None,
+    method: str = None,
 ) -> pyspark.sql.DataFrame:
     """Inverse operation of `pyspark.ml.feature.VectorAssembler` operator.
 
+    Two conversion methods are available:
+    - "native": uses `pyspark.ml.functions.vector_to_array`, which runs inside the JVM
+      and avoids any python worker serialization. It requires spark >= 3.0.
+    - "udf": a python UDF converting each vector to a list. Pandas / Arrow UDFs cannot
+      be used instead, as Arrow does not support the `VectorUDT` type.
+
     Args:.
         df: input DataFrame.
         columns: individual columns previously assembled by a `VectorAssembler`.
         assembled_col: `VectorAssembler`'s output column name.
         keep: additional columns to keep that are not part of the assembled column.
+        method: Either "native" or "udf". If None, the fastest method available with
+          the running spark version is used.
 
     Returns:
         A DataFrame with columns that have been "disassembled".
@@ -46,18 +65,25 @@ def vector_disassembler(
     if keep is None:
         keep = []
     assert set(keep + [assembled_col]) <= set(df.columns)
+    if method is None:
+        method = "native" if spark_version() >= (3, 0) else "udf"
 
-    def udf_vector_disassembler(col):
-        return F.udf(lambda v: v.toArray().tolist(), T.ArrayType(T.DoubleType()))(col)
+    if method == "native":
+        # pylint: disable=import-outside-toplevel
+        from pyspark.ml.functions import vector_to_array
 
-    df = df.select(keep + [assembled_col])
-    df = df.withColumn(
-        assembled_col, udf_vector_disassembler(F.col(assembled_col))
-    ).select(keep + [F.col(assembled_col)[i] for i in range(len(columns))])
+        array_col = vector_to_array(F.col(assembled_col))
+    elif method == "udf":
+        array_col = F.udf(lambda v: v.toArray().tolist(), T.ArrayType(T.DoubleType()))(
+            F.col(assembled_col)
+        )
+    else:
+        raise ValueError(f"Unknown vector disassembling method {method}.")
 
-    for i, col in enumerate(columns):
-        df = df.withColumnRenamed(f"{assembled_col}[{i}]", col)
-    return df
+    df = df.select(keep + [array_col.alias(assembled_col)])
+    return df.select(
+        keep + [F.col(assembled_col)[i].alias(col) for i, col in enumerate(columns)]
+    )
 
 
 class DateParser(
@@ -113,7 +139,11 @@ class DateParser(
 
 
 class BinsOrdinalEncoder(
-    Transformer, HasInputCol, HasOutputCol
+    Transformer,
+    HasInputCol,
+    HasOutputCol,
+    DefaultParamsReadable,
+    DefaultParamsWritable,
 ):  # pylint: disable=too-few-public-methods
     """A transformer that bins continuous features into ordered buckets.
 
@@ -294,7 +324,7 @@ class MissingValuesHandler(
 
 
 class MissingValuesDropper(
-    Transformer, HasInputCols
+    Transformer, HasInputCols, DefaultParamsReadable, DefaultParamsWritable
 ):  # pylint: disable=too-few-public-methods
     """Drops missing values.
 
@@ -302,10 +332,21 @@ class MissingValuesDropper(
     pyspark.sql.DataFrame.dropna() is called using `how=any`, meaning that any row
     containing at least one missing value found among `inputCols` will be dropped.
 
+    Dropped rows are not counted eagerly. With spark >= 3.3, the number of input and
+    dropped rows is collected as a metric attached to the output DataFrame, and can be
+    retrieved using `dropped_rows()` once this DataFrame has been computed. On older
+    versions, no such metric is available.
+
+    If `max_drop_ratio` is set, the number of rows to drop is computed during
+    transformation, in a single pass over the dataset, and an error is raised if the
+    ratio of dropped rows exceeds this value.
+
     Args:
         inputCols (list[str]): The input dataset columns to consider for dropping.
         ignore_type (tuple[str]): Ignore any inputCol if its type is found inside
-          ignore_type.
+          ignore_type. Types are given as names of `pyspark.sql.types` classes, so that
+          this transformer can be saved.
+        max_drop_ratio (float): Optional, maximal allowed ratio of dropped rows.
 
     """
 
@@ -314,26 +355,64 @@ class MissingValuesDropper(
         "ignore_type",
         "Columns of these types will be ignored.",
     )
+    max_drop_ratio = Param(
+        Params._dummy(),  # pylint: disable=protected-access
+        "max_drop_ratio",
+        "Maximal allowed ratio of dropped rows.",
+    )
 
     @keyword_only
     def __init__(self, **kwargs):
         super().__init__()
         self._setDefault(
             ignore_type=(
-                T.ArrayType,
-                T.MapType,
-                T.StructType,
-                T.StructField,
-                T.UserDefinedType,
-            )
+                "ArrayType",
+                "MapType",
+                "StructType",
+                "StructField",
+                "UserDefinedType",
+            ),
+            max_drop_ratio=None,
         )
         self.setParams(**kwargs)
+        self._observation = None
 
     @keyword_only
     def setParams(self, **kwargs):
         """Set parameters for this transformer."""
         return self._set(**kwargs)
 
+    def dropped_rows(self, timeout: float = 1.0) -> Optional[Tuple[int, int]]:
+        """Returns the number of rows dropped during the last transformation.
+
+        Metrics are only available once an action has computed the last transformed
+        DataFrame. If it is being computed, this call waits for at most `timeout`
+        seconds. If it has not been computed, e.g., because it was discarded or because
+        an error occurred, None is returned after `timeout` seconds.
+
+        Args:
+            timeout: Maximal number of seconds to wait for the metrics.
+
+        Returns:
+            A (number of input rows, number of dropped rows) couple, or None if these
+            metrics are not available.
+
+        """
+        if self._observation is None:
+            return None
+        # `Observation.get` blocks until an action has run, it is waited for in a
+        # separate (daemon) thread, which may never return.
+        metrics: Dict[str, int] = {}
+        observation = self._observation
+        waiter = threading.Thread(
+            target=lambda: metrics.update(observation.get), daemon=True
+        )
+        waiter.start()
+        waiter.join(timeout)
+        if not metrics:
+            return None
+        return metrics["n_rows"], metrics["n_dropped"]
+
     def _transform(self, dataset: pyspark.sql.DataFrame) -> pyspark.sql.DataFrame:
         """Applies dropna to a dataset.
 
@@ -343,23 +422,58 @@ class MissingValuesDropper(
         Returns:
             DataFrame where rows with missing values are dropped.
 
+        Raises:
+            ValueError: If `max_drop_ratio` is set and exceeded.
+
         """
         input_cols: List[str] = self.getOrDefault("inputCols")
-        ignore_type: Tuple[str] = self.getOrDefault("ignore_type")
-        dropna_dataset = dataset.dropna(
-            subset=[
-                feature
-                for feature in input_cols
-                if not isinstance(dataset.schema[feature].dataType, ignore_type)
-            ]
+        ignore_type = tuple(
+            getattr(T, type_name) for type_name in self.getOrDefault("ignore_type")
+        )
+        max_drop_ratio: float = self.getOrDefault("max_drop_ratio")
+        self._observation = None
+        subset = [
+            feature
+            for feature in input_cols
+            if not isinstance(dataset.schema[feature].dataType, ignore_type)
+        ]
+        # Same definition of missing values as dropna: null, or NaN for
+        # floating-point columns.
+        is_missing = F.lit(False)
+        for feature in subset:
+            is_missing = is_missing | F.col(feature).isNull()
+            if isinstance(
+                dataset.schema[feature].dataType, (T.DoubleType, T.FloatType)
+            ):
+                is_missing = is_missing | F.isnan(F.col(feature))
+        drop_metrics = (
+            F.count(F.lit(1)).alias("n_rows"),
+            F.sum(is_missing.cast(T.LongType())).alias("n_dropped"),
         )
 
-        if dropna_dataset.count() != dataset.count():
-            logging.info(
-                "Some rows containing null values in subset %s were dropped",
-                input_cols,
+        if max_drop_ratio is not None:
+            n_rows, n_dropped = dataset.agg(*drop_metrics).first()
+            n_dropped = n_dropped or 0
+            if n_rows and n_dropped / n_rows > max_drop_ratio:
+                raise ValueError(
+                    f"{n_dropped} out of {n_rows} rows contain null values in subset "
+                    f"{subset}, which exceeds the allowed ratio of {max_drop_ratio}."
+                )
+            if n_dropped:
+                logging.info(
+                    "%d rows containing null values in subset %s were dropped",
+                    n_dropped,
+                    subset,
+                )
+        elif spark_version() >= (3, 3):
+            from pyspark.sql import (  # pylint: disable=import-outside-toplevel
+                Observation,
             )
-        return dropna_dataset
+
+            self._observation = Observation(f"MissingValuesDropper_{self.uid}")
+            dataset = dataset.observe(self._observation, *drop_metrics)
+
+        return dataset.dropna(subset=subset)
 
 
 class IdentifierNormalizer(
@@ -598,6 +712,314 @@ class TimeNormalizer(
         return dataset
 
 
+class IntervalExploder(
+    Transformer, HasOutputCol
+):  # pylint: disable=too-few-public-methods,protected-access
+    """A transformer that expands time intervals into monthly or daily rows.
+
+    Each input row, associated with a `[start, end)` interval, is replicated once for
+    every time step (first day of a month, or day) lying inside this interval. The time
+    step is stored inside the `outputCol` column. Rows are generated without any join
+    against a time index: an array of offsets is built for each row and exploded.
+
+    Args:
+        start: The column that holds start dates of intervals.
+        end: The column that holds end dates of intervals.
+        outputCol: The column that will hold generated dates. Defaults to "période".
+        frequency: Either "month", which generates the first day of each month found
+          inside intervals, or "day".
+        min_date (optional): If set, no date prior to `min_date` will be generated.
+        max_date (optional): If set, no date after `max_date` will be generated.
+        end_inclusive: If True, intervals are treated as `[start, end]`.
+
+    """
+
+    start = Param(
+        Params._dummy(),
+        "start",
+        "Column holding start dates",
+    )
+    end = Param(
+        Params._dummy(),
+        "end",
+        "Column holding end dates",
+    )
+    frequency = Param(
+        Params._dummy(),
+        "frequency",
+        "Frequency of generated dates, either 'month' or 'day'.",
+    )
+    min_date = Param(
+        Params._dummy(),
+        "min_date",
+        "Lower bound (inclusive) of generated dates.",
+    )
+    max_date = Param(
+        Params._dummy(),
+        "max_date",
+        "Upper bound (inclusive) of generated dates.",
+    )
+    end_inclusive = Param(
+        Params._dummy(),
+        "end_inclusive",
+        "Whether or not interval end dates are included.",
+    )
+
+    @keyword_only
+    def __init__(self, **kwargs):
+        super().__init__()
+        self._setDefault(
+            start=None,
+            end=None,
+            outputCol="période",
+            frequency="month",
+            min_date=None,
+            max_date=None,
+            end_inclusive=False,
+        )
+        self.setParams(**kwargs)
+
+    @keyword_only
+    def setParams(self, **kwargs):
+        """Set parameters for this IntervalExploder transformer."""
+        return self._set(**kwargs)
+
+    def _transform(self, dataset: pyspark.sql.DataFrame) -> pyspark.sql.DataFrame:
+        """Explode intervals into one row per time step.
+
+        Rows whose interval does not contain any time step (after clipping to
+        `[min_date, max_date]`) are dropped.
+
+        Args:
+            dataset: DataFrame to transform, holding intervals boundaries.
+
+        Returns:
+            DataFrame with one row per (input row, time step) couple.
+
+        """
+        for param in ["start", "end"]:
+            if self.getOrDefault(param) is None:
+                raise ValueError(f"Parameter {param} is not set.")
+        frequency = self.getOrDefault("frequency")
+        if frequency not in {"month", "day"}:
+            raise ValueError(f"Unknown frequency {frequency}.")
+
+        start = F.col(self.getOrDefault("start")).cast(T.DateType())
+        end = F.col(self.getOrDefault("end")).cast(T.DateType())
+        if not self.getOrDefault("end_inclusive"):
+            end = F.date_sub(end, 1)
+        if self.getOrDefault("min_date") is not None:
+            start = F.greatest(
+                start, F.lit(str(self.getOrDefault("min_date"))).cast(T.DateType())
+            )
+        if self.getOrDefault("max_date") is not None:
+            end = F.least(
+                end, F.lit(str(self.getOrDefault("max_date"))).cast(T.DateType())
+            )
+
+        if frequency == "month":
+            # First day of a month that is greater or equal to the start date.
+            first = F.add_months(F.trunc(F.date_sub(start, 1), "month"), 1)
+            n_steps = (
+                F.months_between(F.trunc(end, "month"), first).cast(T.IntegerType()) + 1
+            )
+            step_date = "add_months(_first_date, _offset)"
+        else:
+            first = start
+            n_steps = F.datediff(end, first) + 1
+            step_date = "date_add(_first_date, _offset)"
+
+        # `sequence` is only available from spark 2.4 onwards, a string of `n - 1`
+        # spaces split on spaces has the same number of elements otherwise.
+        if spark_version() >= (2, 4):
+            offsets = F.expr("sequence(0, _n_steps - 1)")
+        else:
+            offsets = F.split(F.expr("space(_n_steps - 1)"), " ")
+
+        output_col = self.getOutputCol()
+        columns = [col for col in dataset.columns if col != output_col]
+        return (
+            dataset.withColumn("_first_date", first)
+            .withColumn("_n_steps", n_steps)
+            .filter(F.col("_n_steps") >= 1)
+            .select(
+                *columns,
+                "_first_date",
+                F.posexplode(offsets).alias("_offset", "_unused"),
+            )
+            .select(*columns, F.expr(step_date).alias(output_col))
+        )
+
+
+class DebtHistoryAggregator(
+    Transformer, HasInputCols
+):  # pylint: disable=too-few-public-methods,protected-access
+    """A transformer that computes SIREN-level debt amounts known as of each month.
+
+    Debts are identified by a `siren` and some `debt_keys` columns. Each debt may be
+    updated several times, and the most up to date value is the one that has the
+    highest `history` value among the rows processed up to a given month. For each
+    SIREN and each month, the output holds the sum of the latest known amounts over all
+    debts.
+
+    The state of each debt is only computed at the months where it changes, and the
+    SIREN-level sums are then spread over the following months until the next change.
+    This avoids replicating every input row over all subsequent months.
+
+    Args:
+        inputCols: The debt amounts columns.
+        debt_keys: The columns that identify a debt, along with "siren".
+        history: The column holding the debt update index.
+        processing_date: The column holding the date at which an update was processed.
+          An update is known from the first day of a month following this date
+          (inclusive).
+        min_date (optional): If set, no month prior to `min_date` will be generated.
+        max_date (optional): Last month to be generated. Defaults to today.
+
+    """
+
+    debt_keys = Param(
+        Params._dummy(),
+        "debt_keys",
+        "Columns that identify a debt, along with siren.",
+    )
+    history = Param(
+        Params._dummy(),
+        "history",
+        "Column holding the debt update index.",
+    )
+    processing_date = Param(
+        Params._dummy(),
+        "processing_date",
+        "Column holding debt updates processing dates.",
+    )
+    min_date = Param(
+        Params._dummy(),
+        "min_date",
+        "Lower bound (inclusive) of generated months.",
+    )
+    max_date = Param(
+        Params._dummy(),
+        "max_date",
+        "Upper bound (inclusive) of generated months.",
+    )
+
+    @keyword_only
+    def __init__(self, **kwargs):
+        super().__init__()
+        self._setDefault(
+            inputCols=["dette_sociale_ouvrière", "dette_sociale_patronale"],
+            debt_keys=["numéro_compte", "numéro_écart_négatif", "période_cotisation"],
+            history="numéro_historique_écart_négatif",
+            processing_date="date_traitement",
+            min_date=None,
+            max_date=None,
+        )
+        self.setParams(**kwargs)
+
+    @keyword_only
+    def setParams(self, **kwargs):
+        """Set parameters for this DebtHistoryAggregator transformer."""
+        return self._set(**kwargs)
+
+    def _transform(self, dataset: pyspark.sql.DataFrame) -> pyspark.sql.DataFrame:
+        """Compute monthly SIREN-level debt amounts.
+
+        Missing amounts are treated as zeros. Amounts are summed as decimals, so that
+        adding and removing successive debt states does not accumulate rounding errors.
+
+        Args:
+            dataset: DataFrame holding debt updates.
+
+        Returns:
+            DataFrame with "siren", "période" and debt amounts columns.
+
+        """
+        amounts = self.getInputCols()
+        history = self.getOrDefault("history")
+        keys = ["siren"] + self.getOrDefault("debt_keys")
+        max_date = self.getOrDefault("max_date")
+        if max_date is None:
+            max_date = dt.date.today()
+        decimal_type = T.DecimalType(38, 6)
+
+        # First day of a month following the processing date.
+        processing_date = F.to_date(F.col(self.getOrDefault("processing_date")))
+        month = F.add_months(F.trunc(F.date_sub(processing_date, 1), "month"), 1)
+        updates = (
+            dataset.filter(F.col(history).isNotNull())
+            .withColumn("_month", month)
+            .groupBy(*keys, "_month", history)
+            .agg(
+                *(
+                    F.sum(F.coalesce(F.col(col).cast(decimal_type), F.lit(0))).alias(
+                        col
+                    )
+                    for col in amounts
+                )
+            )
+        )
+
+        # Only updates that hold the highest history index known so far define a debt
+        # state. Updates sharing the same index are added up.
+        debt_window = Window().partitionBy(*keys).orderBy("_month")
+        states = (
+            updates.withColumn("_max_history", F.max(history).over(debt_window))
+            .filter(F.col(history) == F.col("_max_history"))
+            .select(
+                *keys,
+                "_month",
+                *(
+                    F.sum(col)
+                    .over(Window().partitionBy(*keys, history).orderBy("_month"))
+                    .alias(col)
+                    for col in amounts
+                ),
+            )
+        )
+        changes = states.select(
+            "siren",
+            "_month",
+            *(
+                (F.col(col) - F.coalesce(F.lag(col).over(debt_window), F.lit(0))).alias(
+                    col
+                )
+                for col in amounts
+            ),
+        )
+
+        # Sum changes over SIREN, then spread values until the next change.
+        siren_window = Window().partitionBy("siren").orderBy("_month")
+        siren_states = (
+            changes.groupBy("siren", "_month")
+            .agg(*(F.sum(col).alias(col) for col in amounts))
+            .select(
+                "siren",
+                "_month",
+                F.coalesce(
+                    F.lead("_month").over(siren_window),
+                    F.add_months(F.lit(str(max_date)).cast(T.DateType()), 1),
+                ).alias("_next_month"),
+                *(
+                    F.sum(col).over(siren_window).cast(T.DoubleType()).alias(col)
+                    for col in amounts
+                ),
+            )
+        )
+        return (
+            IntervalExploder(
+                start="_month",
+                end="_next_month",
+                outputCol="période",
+                frequency="month",
+                min_date=self.getOrDefault("min_date"),
+                max_date=max_date,
+            )
+            .transform(siren_states)
+            .select("siren", "période", *amounts)
+        )
+
+
 class MovingAverage(
     Transformer, HasInputCol
 ):  # pylint: disable=too-few-public-methods,protected-access
@@ -843,6 +1265,120 @@ class DiffOperator(
         return dataset.drop(*[f"{input_col}_lag{n}m" for n in missing_lags])
 
 
+class TimeAggregationOperator(
+    Transformer
+):  # pylint: disable=too-few-public-methods,protected-access
+    """A transformer that computes lags, diffs and moving averages in a single pass.
+
+    This is equivalent to chaining `LagOperator`, `DiffOperator` and `MovingAverage`
+    stages for all requested features, but every output column is computed inside a
+    single projection, over windows sharing the same partitioning and ordering. Spark
+    therefore only needs one shuffle and one sort per SIREN, whatever the number of
+    features.
+
+    Args:
+        time_aggregation (dict): Mapping from an operation name ("lag", "diff" or
+          "mean") to a mapping from feature names to a number of months (or list of
+          numbers of months).
+
+    """
+
+    time_aggregation = Param(
+        Params._dummy(),
+        "time_aggregation",
+        "Mapping from operation to mapping from features to numbers of months.",
+    )
+    ref_date = Param(
+        Params._dummy(),
+        "ref_date",
+        "A reference date, used to compute number of months between rows.",
+    )
+
+    @keyword_only
+    def __init__(self, **kwargs):
+        super().__init__()
+        self._setDefault(time_aggregation=None, ref_date=dt.date(2014, 1, 1))
+        self.setParams(**kwargs)
+
+    @keyword_only
+    def setParams(self, **kwargs):
+        """Set parameters for this TimeAggregationOperator transformer."""
+        return self._set(**kwargs)
+
+    def look_back(self) -> int:
+        """Returns the number of past months of data used to compute aggregates.
+
+        Aggregates of a given month only depend on the data of this month and of the
+        returned number of previous months, assuming that there is at most one row per
+        month for each SIREN.
+
+        """
+        return max(
+            (
+                max(n_months) if isinstance(n_months, list) else n_months
+                for feature_n_months in self.getOrDefault("time_aggregation").values()
+                for n_months in feature_n_months.values()
+            ),
+            default=0,
+        )
+
+    def _transform(self, dataset: pyspark.sql.DataFrame) -> pyspark.sql.DataFrame:
+        """Compute all time aggregates and add the corresponding new columns.
+
+        Output columns are named after the operation, as done by the single-operation
+        transformers: "var_lag[n]m", "var_diff[n]m" and "var_mean[n]m".
+
+        Args:
+            dataset: DataFrame to transform containing time-series data.
+
+        Returns:
+            DataFrame with new time-aggregated columns.
+
+        """
+        time_aggregation = self.getOrDefault("time_aggregation")
+        if time_aggregation is None:
+            raise ValueError("Parameter time_aggregation is not set.")
+        unknown_operations = set(time_aggregation) - {"lag", "diff", "mean"}
+        if unknown_operations:
+            raise ValueError(f"Unknown time aggregation(s) {unknown_operations}.")
+
+        def as_list(n_months: Union[int, List[int]]) -> List[int]:
+            if isinstance(n_months, int):
+                return [n_months]
+            if isinstance(n_months, list):
+                return n_months
+            raise ValueError("`n_months` should either be an int or a list of ints.")
+
+        months_from_ref = F.months_between(
+            F.col("période"), F.lit(self.getOrDefault("ref_date"))
+        ).cast(T.IntegerType())
+        # All windows share partitioning and ordering, only frames differ.
+        window = Window().partitionBy("siren").orderBy(months_from_ref.asc())
+
+        aggregates: List[pyspark.sql.Column] = []
+        for feat, n_months in time_aggregation.get("lag", {}).items():
+            aggregates.extend(
+                F.lag(F.col(feat), n).over(window).alias(f"{feat}_lag{n}m")
+                for n in as_list(n_months)
+            )
+        for feat, n_months in time_aggregation.get("diff", {}).items():
+            aggregates.extend(
+                (F.col(feat) - F.lag(F.col(feat), n).over(window)).alias(
+                    f"{feat}_diff{n}m"
+                )
+                for n in as_list(n_months)
+            )
+        for feat, n_months in time_aggregation.get("mean", {}).items():
+            aggregates.extend(
+                F.avg(F.col(feat))
+                .over(window.rangeBetween(-n, Window.currentRow))
+                .alias(f"{feat}_mean{n}m")
+                for n in as_list(n_months)
+            )
+
+        return dataset.select("*", *aggregates)
+
+
 class TargetVariable(
     Transformer, HasInputCol, HasOutputCol
 ):  # pylint: disable=too-few-public-methods, protected-access
@@ -942,13 +1478,23 @@ class LinearInterpolationOperator(
     """A transformer that fills missing values using linear interpolation.
 
     Data is grouped using the `id_cols` columns and ordered using the `time_col`, any
-    null values gap between non-null values will be filled.
+    null values gap between non-null values will be filled. Interpolation is made
+    according to rows rank inside each group, whatever the time difference between
+    rows. Leading and trailing null values are left untouched.
+
+    Two computation modes are available:
+    - "projection": all `inputCols` are interpolated inside a single projection, using
+      window functions sharing the same partitioning and ordering.
+    - "pandas": each group is interpolated using `numpy.interp` inside a pandas
+      function. This requires the `pyarrow` package. Interpolated columns are cast to
+      double.
 
     Args:
         inputCols (list[str]): Columns to fill.
         id_cols (str or list[str]): Entity index, along which the dataset will be
           partitioned.
         time_col (str): Time index, used to sort the dataset.
+        mode (str): Either "projection" or "pandas". Defaults to "projection".
 
     """
 
@@ -962,11 +1508,18 @@ class LinearInterpolationOperator(
         "time_col",
         "Columns to follow for interpolation.",
     )
+    mode = Param(
+        Params._dummy(),
+        "mode",
+        "Interpolation computation mode.",
+    )
 
     @keyword_only
     def __init__(self, **kwargs):
         super().__init__()
-        self._setDefault(id_cols="siren", time_col="période", inputCols=None)
+        self._setDefault(
+            id_cols="siren", time_col="période", inputCols=None, mode="projection"
+        )
         self.setParams(**kwargs)
 
     @keyword_only
@@ -984,74 +1537,79 @@ class LinearInterpolationOperator(
             DataFrame where time-series missing values are filled through interpolation.
 
         """
+        mode: str = self.getOrDefault("mode")
+        if mode == "projection":
+            return self._interpolate_projection(dataset)
+        if mode == "pandas":
+            return self._interpolate_pandas(dataset)
+        raise ValueError(f"Unknown interpolation mode {mode}.")
+
+    def _interpolate_projection(
+        self, dataset: pyspark.sql.DataFrame
+    ) -> pyspark.sql.DataFrame:
         id_cols: Union[str, List[str]] = self.getOrDefault("id_cols")
         time_col: str = self.getOrDefault("time_col")
         input_cols: List[str] = self.getOrDefault("inputCols")
 
         w = Window.partitionBy(id_cols).orderBy(time_col)
-        w_start = (
-            Window.partitionBy(id_cols)
-            .orderBy(time_col)
-            .rowsBetween(Window.unboundedPreceding, -1)
-        )
-        w_end = (
-            Window.partitionBy(id_cols)
-            .orderBy(time_col)
-            .rowsBetween(0, Window.unboundedFollowing)
-        )
-        output_df = dataset.withColumn("rn", F.row_number().over(w))
-
-        for col in input_cols:
-
-            # Assign index for non-null rows within partitioned windows
-            output_df = output_df.withColumn(
-                "rn_not_null", F.when(F.col(col).isNotNull(), F.col("rn"))
+        w_start = w.rowsBetween(Window.unboundedPreceding, -1)
+        w_end = w.rowsBetween(0, Window.unboundedFollowing)
+
+        def interpolated(col: str) -> pyspark.sql.Column:
+            # Index of non-null rows within partitioned windows
+            rn_not_null = F.when(F.col(col).isNotNull(), F.col("rn"))
+
+            # Gap start (left bound) and gap end (right bound) values and indexes
+            left_bound_val = F.last(col, ignorenulls=True).over(w_start)
+            left_bound_rn = F.last(rn_not_null, ignorenulls=True).over(w_start)
+            right_bound_val = F.first(col, ignorenulls=True).over(w_end)
+            right_bound_rn = F.first(rn_not_null, ignorenulls=True).over(w_end)
+
+            lin_interp_col = left_bound_val + (right_bound_val - left_bound_val) / (
+                right_bound_rn - left_bound_rn
+            ) * (F.col("rn") - left_bound_rn)
+            return (
+                F.when(F.col(col).isNull(), lin_interp_col)
+                .otherwise(F.col(col))
+                .alias(col)
             )
 
-            # Create relative references to the gap start value (left bound)
-            output_df = output_df.withColumn(
-                "left_bound_val", F.last(col, ignorenulls=True).over(w_start)
-            )
-            output_df = output_df.withColumn(
-                "left_bound_rn", F.last("rn_not_null", ignorenulls=True).over(w_start)
-            )
-
-            # Create relative references to the gap end value (right bound)
-            output_df = output_df.withColumn(
-                "right_bound_val", F.first(col, ignorenulls=True).over(w_end)
-            )
-            output_df = output_df.withColumn(
-                "right_bound_rn", F.first("rn_not_null", ignorenulls=True).over(w_end)
+        # The row index is computed beforehand, as window functions cannot be nested.
+        return dataset.withColumn("rn", F.row_number().over(w)).select(
+            *(
+                interpolated(col) if col in input_cols else F.col(col)
+                for col in dataset.columns
             )
+        )
 
-            # Create references to gap length and current gap position.
-            output_df = output_df.withColumn(
-                "interval_length_rn", F.col("right_bound_rn") - F.col("left_bound_rn")
-            )
-            output_df = output_df.withColumn(
-                "curr_rn",
-                F.col("interval_length_rn") - (F.col("right_bound_rn") - F.col("rn")),
-            )
+    def _interpolate_pandas(
+        self, dataset: pyspark.sql.DataFrame
+    ) -> pyspark.sql.DataFrame:
+        id_cols: Union[str, List[str]] = self.getOrDefault("id_cols")
+        time_col: str = self.getOrDefault("time_col")
+        input_cols: List[str] = self.getOrDefault("inputCols")
 
-            # Compute linear interpolation value
-            lin_interp_col = F.col("left_bound_val") + (
-                F.col("right_bound_val") - F.col("left_bound_val")
-            ) / F.col("interval_length_rn") * F.col("curr_rn")
-            output_df = output_df.withColumn(
-                col,
-                F.when(F.col(col).isNull(), lin_interp_col).otherwise(F.col(col)),
+        def interpolate(pdf):
+            pdf = pdf.sort_values(time_col)
+            rank = np.arange(len(pdf))
+            for col in input_cols:
+                values = pdf[col].values.astype(float)
+                known = ~np.isnan(values)
+                if known.sum() < 2:
+                    continue
+                first, last = rank[known][[0, -1]]
+                gaps = ~known & (rank > first) & (rank < last)
+                values[gaps] = np.interp(rank[gaps], rank[known], values[known])
+                pdf[col] = values
+            return pdf
+
+        dataset = dataset.select(
+            *(
+                F.col(col).cast(T.DoubleType()) if col in input_cols else F.col(col)
+                for col in dataset.columns
             )
-
-        return output_df.drop(
-            "rn",
-            "rn_not_null",
-            "left_bound_val",
-            "right_bound_val",
-            "left_bound_rn",
-            "right_bound_rn",
-            "interval_length_rn",
-            "curr_rn",
         )
+        return apply_in_pandas(dataset, id_cols, interpolate, dataset.schema)
 
 
 class RandomResampler(
@@ -1070,6 +1628,9 @@ class RandomResampler(
           "oversampling" will sample with replacement from minority class.
         class_col (str): Class label column.
         min_class_ratio (float): Requested (minority class / dataset size) ratio.
+        class_counts (dict): Optional mapping from class labels to the number of
+          associated samples in the dataset. If not set, it will be computed during
+          transformation, which triggers a pass over the dataset.
 
     """
 
@@ -1093,12 +1654,18 @@ class RandomResampler(
         "class_col",
         "Class label column.",
     )
+    class_counts = Param(
+        Params._dummy(),
+        "class_counts",
+        "Mapping from class labels to number of samples.",
+    )
 
     @keyword_only
     def __init__(self, **kwargs):
         super().__init__()
         self._setDefault(
             class_col="failure",
+            class_counts=None,
         )
         self.setParams(**kwargs)
 
@@ -1107,6 +1674,26 @@ class RandomResampler(
         """Set parameters for this transformer."""
         return self._set(**kwargs)
 
+    def resampled_size(self, class_counts: Dict[Any, int]) -> int:
+        """Computes the expected number of samples after resampling.
+
+        Args:
+            class_counts: Mapping from class labels to number of samples in the dataset
+              to resample.
+
+        Returns:
+            The expected size of the resampled dataset.
+
+        """
+        min_class_ratio: float = self.getOrDefault("min_class_ratio")
+        majority_class_count = max(class_counts.values())
+        minority_class_count = min(class_counts.values())
+        if self.getOrDefault("method") == "undersampling":
+            subset_size = int(minority_class_count / min_class_ratio)
+            return int((1.0 - min_class_ratio) * subset_size) + minority_class_count
+        subset_size = int(majority_class_count / (1.0 - min_class_ratio))
+        return int(min_class_ratio * subset_size) + majority_class_count
+
     def _transform(  # pylint:disable=too-many-locals
         self, dataset: pyspark.sql.DataFrame
     ) -> pyspark.sql.DataFrame:
@@ -1126,7 +1713,9 @@ class RandomResampler(
             raise ValueError(f"Unknown resampling method {method}.")
 
         # Get class counts and filter subsets
-        class_counts = dataset.groupBy(class_col).count().rdd.collectAsMap()
+        class_counts: Dict[Any, int] = self.getOrDefault("class_counts")
+        if class_counts is None:
+            class_counts = dataset.groupBy(class_col).count().rdd.collectAsMap()
         majority_class_label = max(class_counts, key=class_counts.get)
         minority_class_label = min(class_counts, key=class_counts.get)
         majority_class_count: int = class_counts[majority_class_label]
@@ -1159,3 +1748,71 @@ class RandomResampler(
             resampled_df = upsampled_df.union(majority_class_df)
 
         return resampled_df
+
+
+class InstrumentedPipelineModel(PipelineModel):  # pylint: disable=too-few-public-methods
+    """A pipeline model that records metrics about each of its stages.
+
+    For each stage, the following metrics are recorded in the `metrics` attribute
+    during `transform` calls:
+    - "stage" and "class": the stage uid and class name.
+    - "wall_time": the time spent inside the stage, in seconds. As spark
+      transformations are lazy, this only accounts for computations eagerly triggered
+      by the stage (e.g., aggregations), unless `count_rows` is True.
+    - "n_partitions": the number of partitions of the stage output.
+    - "estimated_size_in_bytes": the size of the stage output, as estimated by the
+      optimizer.
+    - "n_rows": the number of rows of the stage output, if `count_rows` is True. Each
+      stage output is then persisted and counted, so that the stage wall time also
+      accounts for its own computations, and not for the upstream ones.
+
+    Intermediate stage outputs are unpersisted as soon as the next stage output is
+    counted. However, if `count_rows` is True, the DataFrame returned by `transform` is
+    still persisted: the caller owns it, and should unpersist it once it is consumed.
+
+    Args:
+        stages: The pipeline stages.
+        count_rows: If True, each stage output is materialized and counted.
+
+    """
+
+    def __init__(self, stages: List[Transformer], count_rows: bool = False):
+        super().__init__(stages)
+        self.count_rows = count_rows
+        self.metrics: List[Dict[str, Any]] = []
+
+    def _transform(self, dataset: pyspark.sql.DataFrame) -> pyspark.sql.DataFrame:
+        self.metrics = []
+        persisted = None
+        for stage in self.stages:
+            stage_metrics: Dict[str, Any] = {
+                "stage": stage.uid,
+                "class": type(stage).__name__,
+            }
+            start = time.perf_counter()
+            dataset = stage.transform(dataset)
+            if self.count_rows:
+                dataset = dataset.persist()
+                stage_metrics["n_rows"] = dataset.count()
+                if persisted is not None:
+                    persisted.unpersist()
+                persisted = dataset
+            stage_metrics["wall_time"] = time.perf_counter() - start
+            stage_metrics["n_partitions"] = dataset.rdd.getNumPartitions()
+            stage_metrics["estimated_size_in_bytes"] = estimated_size_in_bytes(dataset)
+            self.metrics.append(stage_metrics)
+            logging.info("Pipeline stage metrics: %s", stage_metrics)
+        return dataset
+
+    def write_metrics(self, output_path: str):
+        """Writes the metrics of the last `transform` call as a JSON document.
+
+        Args:
+            output_path: The output path, written as a single-partition text dataset,
+              similarly to the run configuration dump.
+
+        """
+        spark = get_spark_session()
+        spark.sparkContext.parallelize([json.dumps(self.metrics)]).repartition(
+            1
+        ).saveAsTextFile(output_path)
@@ -2,9 +2,13 @@
 
 import datetime as dt
 import functools
-import operator
-from typing import Any, List, Union
+import itertools
+import json
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+import pandas as pd
+import pyspark
 import pyspark.sql
 import pyspark.sql.functions as F
 import pyspark.sql.types as T
@@ -20,6 +24,85 @@ def get_spark_session():
     return spark
 
 
+def spark_version() -> Tuple[int, int]:
+    """Returns the (major, minor) version of the installed pyspark package."""
+    major, minor = pyspark.__version__.split(".")[:2]
+    return int(major), int(minor)
+
+
+def apply_in_pandas(
+    df: pyspark.sql.DataFrame,
+    by: Union[str, List[str]],
+    func: Callable,
+    schema: T.StructType,
+) -> pyspark.sql.DataFrame:
+    """Applies a pandas DataFrame function to each group of a DataFrame.
+
+    This uses `GroupedData.applyInPandas` on spark >= 3.0, and a grouped map pandas UDF
+    on older versions. Both require the `pyarrow` package.
+
+    Args:
+        df: The input DataFrame.
+        by: Column(s) to group by.
+        func: A function taking and returning a pandas DataFrame.
+        schema: The schema of the DataFrames returned by `func`.
+
+    Returns:
+        The concatenation of all `func` outputs, as a spark DataFrame.
+
+    """
+    if spark_version() >= (3, 0):
+        return df.groupBy(by).applyInPandas(func, schema)
+    # pylint: disable=import-outside-toplevel
+    from pyspark.sql.functions import PandasUDFType, pandas_udf
+
+    return df.groupBy(by).apply(pandas_udf(func, schema, PandasUDFType.GROUPED_MAP))
+
+
+def map_in_pandas(
+    df: pyspark.sql.DataFrame,
+    func: Callable,
+    schema: T.StructType,
+    batch_size: int = 10000,
+) -> pyspark.sql.DataFrame:
+    """Applies a function over batches of a DataFrame, as pandas DataFrames.
+
+    This uses `DataFrame.mapInPandas` on spark >= 3.0, which requires the `pyarrow`
+    package. On older versions, each partition is split into pandas DataFrames of
+    `batch_size` rows.
+
+    Args:
+        df: The input DataFrame.
+        func: A function taking an iterator of pandas DataFrames and yielding pandas
+          DataFrames.
+        schema: The schema of the DataFrames yielded by `func`.
+        batch_size: Number of rows of each input pandas DataFrame, for spark < 3.0.
+
+    Returns:
+        The concatenation of all `func` outputs, as a spark DataFrame.
+
+    """
+    if spark_version() >= (3, 0):
+        return df.mapInPandas(func, schema)
+    columns = df.columns
+
+    def batches(rows):
+        rows = iter(rows)
+        batch = list(itertools.islice(rows, batch_size))
+        while batch:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+            batch = list(itertools.islice(rows, batch_size))
+
+    def map_partition(rows):
+        for output in func(batches(rows)):
+            # Series are converted to lists so that values get python types.
+            yield from zip(*(output[col].tolist() for col in output.columns))
+
+    return df.sql_ctx.sparkSession.createDataFrame(
+        df.rdd.mapPartitions(map_partition), schema
+    )
+
+
 def numerical_columns(df: pyspark.sql.DataFrame) -> List[str]:
     """Returns a DataFrame's numerical data column names.
 
@@ -114,7 +197,16 @@ def merge_asof(  # pylint: disable=too-many-arguments, too-many-locals
     This function performs an asof merge on two DataFrames based on a specified column
     'on'. It supports grouping by additional columns specified in 'by'. The 'tolerance'
     parameter allows for merging within a specified difference range. The 'direction'
-    parameter determines the direction of the asof merge.
+    parameter determines the direction of the asof merge:
+    - "backward" matches the last right row whose 'on' value is less than or equal to
+      the left 'on' value.
+    - "forward" matches the first right row whose 'on' value is greater than or equal to
+      the left 'on' value.
+    - "nearest" matches the closest of both, backward being preferred in case of a tie.
+
+    Both DataFrames are tagged and stacked, then right-side values are carried over to
+    left rows using a window partitioned by the `by` keys, which only requires a single
+    shuffle. If multiple right rows share the same keys, only one of them is matched.
 
     Args:
         df_left : The left DataFrame to be merged.
@@ -129,28 +221,10 @@ def merge_asof(  # pylint: disable=too-many-arguments, too-many-locals
         DataFrame resulting from the asof merge.
 
     """
-
-    def backward(
-        w: pyspark.sql.WindowSpec, col: Union[pyspark.sql.column.Column, str]
-    ) -> pyspark.sql.column.Column:
-        return F.last(col, ignorenulls=True).over(
-            w.rowsBetween(W.unboundedPreceding, W.currentRow)
-        )
-
-    def forward(
-        w: pyspark.sql.WindowSpec,
-        col: Union[pyspark.sql.column.Column, str],
-    ) -> pyspark.sql.column.Column:
-        return F.first(col, ignorenulls=True).over(
-            w.rowsBetween(W.currentRow, W.unboundedFollowing)
-        )
-
-    # Handle cases where 'by' is not specified
-    df_r = df_right if by else df_right.withColumn("_by", F.lit(True))
-    df_l = df_left if by else df_left.withColumn("_by", F.lit(True))
+    if direction not in {"backward", "forward", "nearest"}:
+        raise ValueError(f"Unknown asof merge direction {direction}.")
     if by is None:
-        by = ["_by"]
-    # In other cases, use specified group key(s)
+        by = []
     elif isinstance(by, str):
         by = [by]
     elif isinstance(by, list):
@@ -160,85 +234,115 @@ def merge_asof(  # pylint: disable=too-many-arguments, too-many-locals
     else:
         raise ValueError("`by` should either be None, str or list.")
 
-    df_l = df_l.withColumn("from_df_l", F.lit(True))
     join_keys = by + [on]
+    right_cols = [col for col in df_right.columns if col not in join_keys]
 
-    # Join using only specified `by` and `on` from right df, then create `coalesced_key`
-    # columns in case there are any missing `on` values subsequent to the merge.
-    df = df_l.alias("left").join(
-        df_r.select(join_keys).alias("right_join_keys"),
-        on=functools.reduce(
-            operator.and_,
-            (
-                F.col(f"left.{key}") == F.col(f"right_join_keys.{key}")
-                for key in join_keys
+    # Right rows data is packed into a single struct column, which is null for left
+    # rows, so that it can be carried over using `ignorenulls` window lookups.
+    right_struct = F.struct(
+        *(F.col(col) for col in right_cols), F.col(on).alias("_right_on")
+    )
+    stacked = df_left.select(
+        *df_left.columns,
+        F.lit(None).cast(_right_struct_type(df_right, right_cols, on)).alias("_right"),
+        F.lit(True).alias("_from_left"),
+    ).union(
+        df_right.select(
+            *(
+                F.col(col)
+                if col in join_keys
+                else F.lit(None).cast(df_left.schema[col].dataType).alias(col)
+                for col in df_left.columns
             ),
-        ),
-        how="outer",
+            right_struct.alias("_right"),
+            F.lit(False).alias("_from_left"),
+        )
+    )
+
+    # Right rows are sorted before (resp. after) left rows sharing the same `on` value,
+    # so that exact matches are found by backward (resp. forward) lookups.
+    backward_window = (
+        W.partitionBy(*by)
+        .orderBy(F.col(on).asc(), F.col("_from_left").asc())
+        .rowsBetween(W.unboundedPreceding, W.currentRow)
     )
-    for key in join_keys:
+    forward_window = (
+        W.partitionBy(*by)
+        .orderBy(F.col(on).asc(), F.col("_from_left").desc())
+        .rowsBetween(W.currentRow, W.unboundedFollowing)
+    )
+    backward_match = F.last("_right", ignorenulls=True).over(backward_window)
+    forward_match = F.first("_right", ignorenulls=True).over(forward_window)
+
+    if direction == "backward":
+        df = stacked.withColumn("_match", backward_match)
+        distance = F.datediff(F.col(on), F.col("_match._right_on"))
+    elif direction == "forward":
+        df = stacked.withColumn("_match", forward_match)
+        distance = F.datediff(F.col("_match._right_on"), F.col(on))
+    else:
+        df = stacked.withColumn("_backward", backward_match).withColumn(
+            "_forward", forward_match
+        )
+        backward_distance = F.datediff(F.col(on), F.col("_backward._right_on"))
+        forward_distance = F.datediff(F.col("_forward._right_on"), F.col(on))
         df = df.withColumn(
-            f"coalesced_{key}",
-            F.coalesce(F.col(f"left.{key}"), F.col(f"right_join_keys.{key}")),
+            "_match",
+            F.when(F.col("_forward").isNull(), F.col("_backward"))
+            .when(F.col("_backward").isNull(), F.col("_forward"))
+            .when(backward_distance <= forward_distance, F.col("_backward"))
+            .otherwise(F.col("_forward")),
         )
+        distance = F.abs(F.datediff(F.col(on), F.col("_match._right_on")))
 
-    # Compute a target join date for each row, among available dates in df_right, using
-    # a forward / backward time window.
-    window_spec = W.partitionBy(*[f"coalesced_{key}" for key in by]).orderBy(
-        F.col(f"coalesced_{on}")
-    )
-    window_function = {
-        "backward": backward,
-        "forward": forward,
-    }
-    df = df.withColumn(
-        "target_join_date",
-        window_function[direction](window_spec, f"right_join_keys.{on}"),
+    df = df.filter(F.col("_from_left"))
+    # Matches that are farther than tolerance are discarded.
+    if tolerance is not None:
+        df = df.withColumn("_match", F.when(distance <= tolerance, F.col("_match")))
+
+    return df.select(
+        *df_left.columns, *(F.col(f"_match.{col}").alias(col) for col in right_cols)
     )
 
-    # Drop duplicate columns and replace with the coalesced ones now that we're done
-    # with target date computing.
-    df = df.select(
-        *(f"left.{col}" for col in set(df_l.columns) - set(join_keys)),
-        *(f"coalesced_{key}" for key in join_keys),
-        "target_join_date",
+
+def _right_struct_type(
+    df_right: pyspark.sql.DataFrame, right_cols: List[str], on: str
+) -> T.StructType:
+    """Type of the struct used to carry right-side data during an asof merge."""
+    return T.StructType(
+        [df_right.schema[col] for col in right_cols]
+        + [T.StructField("_right_on", df_right.schema[on].dataType, True)]
     )
-    for key in join_keys:
-        df = df.withColumnRenamed(f"coalesced_{key}", key)
 
-    # If the date difference between left and right dates is greater than tolerance, a
-    # flag that will prevent the join is added.
-    if tolerance:
-        sign = 1 if direction == "forward" else -1
-        df = df.withColumn(
-            "_do_not_join",
-            F.when(
-                (sign * F.datediff(F.col("target_join_date"), F.col(f"{on}")))
-                <= tolerance,
-                False,
-            ).otherwise(True),
-        )
-        by.append("_do_not_join")
-
-    # Actually join right df data over `by` and pre-computed target date. Filter as if
-    # we'd done a left join during the outer join, drop temporary columns.
-    df = (
-        df.filter("from_df_l")
-        .alias("pre_join")
-        .join(
-            df_r.withColumn("_do_not_join", F.lit(False)).alias("right"),
-            on=functools.reduce(
-                operator.and_,
-                (F.col(f"pre_join.{key}") == F.col(f"right.{key}") for key in by),
-            )
-            & (F.col("pre_join.target_join_date") == F.col(f"right.{on}")),
-            how="left",
-        )
-    ).drop("from_df_l", "_by", "_do_not_join", "target_join_date")
 
-    return df.select(
-        "pre_join.*", *(f"right.{col}" for col in set(df_r.columns) - set(join_keys))
+def count_by_subset(
+    subsets: Dict[str, pyspark.sql.DataFrame], col: str
+) -> Dict[str, Dict[Any, int]]:
+    """Counts rows for each value of a column, over several DataFrames at once.
+
+    All DataFrames are stacked and aggregated together, so that counting only triggers
+    a single spark job, instead of one per DataFrame.
+
+    Args:
+        subsets: A mapping from names to DataFrames that all contain `col`.
+        col: The column whose values are counted.
+
+    Returns:
+        A mapping from each name in `subsets` to a mapping from `col` values to number
+        of rows. Empty DataFrames are associated with an empty mapping.
+
+    """
+    stacked = functools.reduce(
+        pyspark.sql.DataFrame.union,
+        (
+            df.select(F.lit(name).alias("_subset"), F.col(col).alias("_value"))
+            for name, df in subsets.items()
+        ),
     )
+    counts: Dict[str, Dict[Any, int]] = {name: {} for name in subsets}
+    for row in stacked.groupBy("_subset", "_value").count().collect():
+        counts[row["_subset"]][row["_value"]] = row["count"]
+    return counts
 
 
 def count_nan_values(
@@ -271,3 +375,50 @@ def count_missing_values(df: pyspark.sql.DataFrame) -> pyspark.sql.Row:
     return df.select(
         [F.count(F.when(F.isnull(c), c)).alias(c) for c in df.columns]
     ).collect()[0]
+
+
+def estimated_size_in_bytes(df: pyspark.sql.DataFrame) -> int:
+    """Returns the size of a DataFrame, as estimated by spark's optimizer.
+
+    This does not trigger any computation. For file-based sources, the estimate is
+    derived from input files size and scaled according to the projected columns, but
+    it does not take partition pruning into account.
+
+    Args:
+        df: The input DataFrame.
+
+    Returns:
+        The estimated size, in bytes.
+
+    """
+    # pylint: disable=protected-access
+    size = df._jdf.queryExecution().optimizedPlan().stats().sizeInBytes()
+    # Scala's BigInt is converted to a python int by recent py4j versions only.
+    return int(size if isinstance(size, int) else size.toString())
+
+
+def input_bytes_read(spark: SparkSession = None) -> Optional[int]:
+    """Returns the number of bytes read from input sources by the current application.
+
+    Bytes read by all stages run so far are summed. This data is fetched from the spark
+    UI REST API.
+
+    Args:
+        spark (optional): A SparkSession. If not set, the current session is used.
+
+    Returns:
+        The number of bytes, or None if the spark UI is not available.
+
+    """
+    if spark is None:
+        spark = get_spark_session()
+    sc = spark.sparkContext
+    if not sc.uiWebUrl:
+        return None
+    url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/stages"
+    try:
+        with urllib.request.urlopen(url) as response:
+            stages = json.loads(response.read().decode())
+    except OSError:
+        return None
+    return sum(stage.get("inputBytes", 0) for stage in stages)
@@ -3,6 +3,7 @@
 
 import datetime as dt
 import random
+import uuid
 from typing import List, Tuple
 
 import pyspark.sql
@@ -12,6 +13,8 @@ from pyspark.sql import types as T
 spark_session = (
     pyspark.sql.SparkSession.builder.master("local[2]")
     .appName("sf_datalake-unit-tests")
+    # Adaptive execution submits extra jobs, which makes job counts harder to predict.
+    .config("spark.sql.adaptive.enabled", "false")
     .getOrCreate()
 )
 
@@ -21,6 +24,30 @@ def spark():
     return spark_session
 
 
+class SparkJobCounter:
+    """Counts spark jobs triggered inside a `with` block.
+
+    Attributes:
+        n_jobs: The number of jobs triggered, available after exiting the block.
+
+    """
+
+    def __init__(self, spark: pyspark.sql.SparkSession):
+        self.spark_context = spark.sparkContext
+        self.group_id = str(uuid.uuid4())
+        self.n_jobs = None
+
+    def __enter__(self):
+        self.spark_context.setJobGroup(self.group_id, "Job counting")
+        return self
+
+    def __exit__(self, *args):
+        self.spark_context.setLocalProperty("spark.jobGroup.id", None)
+        self.n_jobs = len(
+            self.spark_context.statusTracker().getJobIdsForGroup(self.group_id)
+        )
+
+
 class MockDataFrameGenerator:
     """Generates mock data for pyspark tests.
 
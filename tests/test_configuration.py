@@ -0,0 +1,19 @@
+import pytest
+
+from sf_datalake.configuration import ConfigurationHelper
+
+
+def test_required_columns():
+    configuration = ConfigurationHelper("standard.json")
+    columns = configuration.required_columns()
+    assert columns[:2] == ["siren", "période"]
+    assert len(columns) == len(set(columns))
+    assert configuration.learning.target["class_col"] in columns
+    assert set(configuration.preprocessing.features_transformers) <= set(columns)
+
+
+def test_unknown_feature_perturbation():
+    with pytest.raises(ValueError, match="Unknown feature perturbation"):
+        ConfigurationHelper(
+            "standard.json", cli_args={"feature_perturbation": "tree_path_dependent"}
+        )
@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+from sklearn.metrics import (
+    average_precision_score,
+    balanced_accuracy_score,
+    fbeta_score,
+    precision_score,
+    recall_score,
+    roc_auc_score,
+)
+
+from sf_datalake.evaluation import (
+    metrics,
+    metrics_ci,
+    optimal_beta_thresholds,
+    spark_metrics,
+    spark_optimal_beta_thresholds,
+)
+
+
+@pytest.fixture
+def scored_samples():
+    rng = np.random.RandomState(42)
+    y_true = rng.randint(0, 2, 500)
+    # Scores are rounded so that some of them are tied.
+    y_score = np.round(np.clip(0.3 * y_true + rng.random_sample(500) * 0.7, 0, 1), 2)
+    return y_true, y_score
+
+
+def brute_force_thresholds(y_true, y_score, betas, thresh_array):
+    f_beta = np.array(
+        [
+            [
+                fbeta_score(y_true, y_score >= thresh, beta=beta)
+                for thresh in thresh_array
+            ]
+            for beta in betas
+        ]
+    )
+    return dict(zip(betas, thresh_array[np.argmax(f_beta, axis=1)]))
+
+
+def test_optimal_beta_thresholds_grid(scored_samples):
+    y_true, y_score = scored_samples
+    betas = (0.5, 1.0, 2.0)
+    assert optimal_beta_thresholds(
+        y_true, y_score, betas=betas, n_thr=101
+    ) == brute_force_thresholds(y_true, y_score, betas, np.linspace(0, 1, 101))
+
+
+def test_optimal_beta_thresholds_exact(scored_samples):
+    y_true, y_score = scored_samples
+    betas = (0.5, 2.0)
+    assert optimal_beta_thresholds(
+        y_true, y_score, betas=betas, n_thr=None
+    ) == brute_force_thresholds(y_true, y_score, betas, np.unique(y_score))
+
+
+def test_optimal_beta_thresholds_no_positive():
+    thresholds = optimal_beta_thresholds(
+        np.zeros(10), np.linspace(0, 1, 10), betas=(0.5,), n_thr=11
+    )
+    assert thresholds == {0.5: 0.0}
+
+
+def test_metrics_ci_estimates(scored_samples):
+    y_true, y_score = scored_samples
+    y_pred = y_score >= 0.5
+    intervals = metrics_ci(
+        y_true, y_score, beta=2, n_bootstrap=100, n_bins=None, seed=0, n_jobs=1
+    )
+    expected = {
+        "F2-score": fbeta_score(y_true, y_pred, beta=2),
+        "Precision": precision_score(y_true, y_pred),
+        "Recall": recall_score(y_true, y_pred),
+        "Balanced accuracy": balanced_accuracy_score(y_true, y_pred),
+        "Area under Precision-Recall curve": average_precision_score(y_true, y_score),
+        "Area under ROC curve": roc_auc_score(y_true, y_score),
+    }
+    assert intervals.keys() == expected.keys()
+    for name, value in expected.items():
+        assert intervals[name]["estimate"] == pytest.approx(value)
+        assert intervals[name]["lower"] <= value <= intervals[name]["upper"]
+
+
+def test_metrics_ci_processes(scored_samples):
+    y_true, y_score = scored_samples
+    assert metrics_ci(
+        y_true, y_score, n_bootstrap=120, chunk_size=50, seed=1, n_jobs=1
+    ) == metrics_ci(y_true, y_score, n_bootstrap=120, chunk_size=50, seed=1, n_jobs=2)
+
+
+def test_metrics_ci_groups(scored_samples):
+    # Duplicating each sample inside its own group should not change the intervals.
+    y_true, y_score = scored_samples
+    intervals = metrics_ci(y_true, y_score, n_bootstrap=100, seed=2, n_jobs=1)
+    grouped_intervals = metrics_ci(
+        np.repeat(y_true, 2),
+        np.repeat(y_score, 2),
+        groups=np.repeat(np.arange(y_true.size), 2),
+        n_bootstrap=100,
+        seed=2,
+        n_jobs=1,
+    )
+    for name, interval in intervals.items():
+        assert grouped_intervals[name] == pytest.approx(interval)
+
+
+@pytest.fixture
+def scored_samples_df(spark):
+    # Scores are multiples of 1 / 128, so that binning is free of rounding errors.
+    rng = np.random.RandomState(0)
+    y_true = rng.randint(0, 2, 1000)
+    y_score = (
+        np.floor(np.clip(0.3 * y_true + rng.random_sample(1000) * 0.7, 0, 1) * 128)
+        / 128
+    )
+    df = spark.createDataFrame(
+        [(bool(label), float(score)) for label, score in zip(y_true, y_score)],
+        ["failure", "probability"],
+    )
+    return y_true, y_score, df
+
+
+def test_spark_optimal_beta_thresholds(scored_samples_df):
+    y_true, y_score, df = scored_samples_df
+    assert spark_optimal_beta_thresholds(
+        df, betas=(0.5, 2.0), n_thr=129
+    ) == optimal_beta_thresholds(y_true, y_score, betas=(0.5, 2.0), n_thr=129)
+
+
+def test_spark_metrics(scored_samples_df):
+    y_true, y_score, df = scored_samples_df
+    assert spark_metrics(df, beta=2, thresh=0.5, n_bins=128) == metrics(
+        y_true, y_score, beta=2, thresh=0.5
+    )
+
+
+@pytest.mark.parametrize("missing_score", [None, float("nan")])
+def test_spark_metrics_missing_scores(spark, missing_score):
+    df = spark.createDataFrame(
+        [(True, 0.8), (False, 0.2), (True, missing_score)],
+        "failure boolean, probability double",
+    )
+    with pytest.raises(ValueError, match="missing"):
+        spark_metrics(df, thresh=0.5)
+    with pytest.raises(ValueError, match="missing"):
+        spark_optimal_beta_thresholds(df)
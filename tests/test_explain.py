@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pyspark.ml.classification import (
+    GBTClassifier,
+    LogisticRegression,
+    RandomForestClassifier,
+)
+from pyspark.ml.feature import VectorAssembler
+
+from sf_datalake.explain import (
+    aggregation_matrices,
+    explanation_data,
+    explanation_scores,
+    spark_explanation_scores,
+    spark_linear_explanation_data,
+    spark_tree_explanation_data,
+)
+from sf_datalake.transform import vector_disassembler
+
+
+@pytest.fixture
+def shap_values():
+    # fmt: off
+    return pd.DataFrame(
+        {
+            "siren": ["219385723", "043339338", "293736607"],
+            "ca_lag1m": [0.1, -0.3, 0.2],
+            "ca_lag2m": [0.0, 0.1, 0.1],
+            "dette_par_effectif": [-0.2, 0.4, 0.05],
+            "effectif": [0.3, 0.0, -0.1],
+        }
+    ).set_index("siren")
+    # fmt: on
+
+
+TOPIC_GROUPS = {"sante_financiere": ["ca"], "dette": ["dette_par_effectif", "effectif"]}
+
+
+def test_aggregation_matrices():
+    source_features, feature_matrix, topic_matrix = aggregation_matrices(
+        ["effectif_lag1m", "dette_par_effectif", "effectif"],
+        {"dette": ["dette_par_effectif"], "emploi": ["effectif"]},
+    )
+    assert source_features == ["effectif", "dette_par_effectif"]
+    assert (feature_matrix.toarray() == [[1, 0], [0, 1], [1, 0]]).all()
+    assert (topic_matrix.toarray() == [[0, 1], [1, 0]]).all()
+
+
+def test_aggregation_matrices_missing_source():
+    with pytest.raises(ValueError):
+        aggregation_matrices(["ca_lag1m", "apart"], {"sante_financiere": ["ca"]})
+
+
+def test_explanation_scores(shap_values):
+    macro_scores, concerning_scores = explanation_scores(shap_values, TOPIC_GROUPS, 2)
+    assert np.allclose(macro_scores.values, [[0.1, 0.1], [-0.2, 0.4], [0.3, -0.05]])
+    assert list(macro_scores.columns) == [
+        "sante_financiere_macro_score",
+        "dette_macro_score",
+    ]
+    assert concerning_scores[
+        ["concerning_feat_0", "concerning_feat_1"]
+    ].values.tolist() == [
+        ["effectif", "ca"],
+        ["dette_par_effectif", "effectif"],
+        ["ca", "dette_par_effectif"],
+    ]
+    assert np.allclose(
+        concerning_scores[["concerning_val_0", "concerning_val_1"]].values,
+        [[0.3, 0.1], [0.4, 0.0], [0.3, 0.05]],
+    )
+
+
+# There are only 3 source features, so that 5 concerning features cannot be found.
+@pytest.mark.parametrize("n_concerning", [2, 5])
+def test_spark_explanation_scores(spark, shap_values, n_concerning):
+    macro_scores, concerning_scores = explanation_scores(
+        shap_values, TOPIC_GROUPS, n_concerning
+    )
+    spark_macro_scores, spark_concerning_scores = spark_explanation_scores(
+        spark.createDataFrame(shap_values.reset_index()), TOPIC_GROUPS, n_concerning
+    )
+    pd.testing.assert_frame_equal(
+        spark_macro_scores.toPandas().set_index("siren").loc[macro_scores.index],
+        macro_scores,
+    )
+    pd.testing.assert_frame_equal(
+        spark_concerning_scores.toPandas()
+        .set_index("siren")
+        .loc[concerning_scores.index],
+        concerning_scores,
+    )
+
+
+def test_spark_linear_explanation_data(spark, shap_values):
+    # Shap values are used here as arbitrary features.
+    features = list(shap_values.columns)
+    df = VectorAssembler(inputCols=features, outputCol="features").transform(
+        spark.createDataFrame(shap_values.reset_index().assign(failure=[1.0, 0.0, 1.0]))
+    )
+    model = LogisticRegression(labelCol="failure", regParam=0.1).fit(df)
+    sv, ev = spark_linear_explanation_data(features, "features", model, df, df)
+
+    # Shap values should sum up to the model's output margin, in log-odds units.
+    margins = (
+        vector_disassembler(
+            model.transform(df),
+            ["comp_margin", "margin"],
+            assembled_col="rawPrediction",
+            keep=["siren"],
+        )
+        .toPandas()
+        .set_index("siren")["margin"]
+    )
+    sv = sv.toPandas().set_index("siren")
+    assert np.allclose(sv.sum(axis=1) + ev, margins.loc[sv.index])
+    assert np.allclose(sv.mean(), 0)
+
+
+@pytest.fixture
+def tree_learning_df(spark):
+    rng = np.random.RandomState(0)
+    features = rng.random_sample((60, 3))
+    failure = (features[:, 0] + 0.5 * rng.random_sample(60) > 0.7).astype(float)
+    df = pd.DataFrame(features, columns=["ca", "dette", "effectif"]).assign(
+        siren=[f"{i:09d}" for i in range(60)], failure=failure
+    )
+    return VectorAssembler(
+        inputCols=["ca", "dette", "effectif"], outputCol="features"
+    ).transform(spark.createDataFrame(df))
+
+
+@pytest.mark.parametrize(
+    "classifier",
+    [
+        GBTClassifier(labelCol="failure", maxIter=5, maxDepth=3, seed=0),
+        # Random forests shap values are computed for both classes, only the positive
+        # class values should be kept.
+        RandomForestClassifier(labelCol="failure", numTrees=5, maxDepth=3, seed=0),
+    ],
+)
+def test_spark_tree_explanation_data(tree_learning_df, classifier):
+    features = ["ca", "dette", "effectif"]
+    model = classifier.fit(tree_learning_df)
+    sv, ev = explanation_data(
+        features, "features", model, tree_learning_df, tree_learning_df, 10
+    )
+    spark_sv, spark_ev = spark_tree_explanation_data(
+        features, "features", model, tree_learning_df
+    )
+    spark_sv = spark_sv.toPandas().set_index("siren")
+    assert spark_sv.shape == (60, 3)
+    assert np.shape(spark_ev) == np.shape(ev) and np.allclose(spark_ev, ev)
+    pd.testing.assert_frame_equal(spark_sv.loc[sv.index], sv)
@@ -0,0 +1,77 @@
+import datetime as dt
+
+import pytest
+from pyspark.ml import Pipeline
+from pyspark.ml.feature import VectorAssembler
+
+from sf_datalake.configuration import ConfigurationHelper
+from sf_datalake.feature_store import load_features, preprocessing_key, save_features
+from sf_datalake.io import load_data, write_data
+from sf_datalake.transform import BinsOrdinalEncoder, MissingValuesDropper
+
+
+@pytest.fixture
+def raw_dataset(spark, tmp_path):
+    output_path = str(tmp_path / "dataset")
+    write_data(
+        spark.createDataFrame(
+            [
+                ("043339338", dt.date(2020, 1, 1), 12.0, 0.5),
+                ("043339338", dt.date(2020, 2, 1), 70.0, None),
+                ("293736607", dt.date(2020, 1, 1), 30.0, 0.1),
+                ("293736607", dt.date(2020, 2, 1), 90.0, 0.7),
+            ],
+            ["siren", "période", "ca", "ebe"],
+        ),
+        output_path,
+        "parquet",
+    )
+    return output_path
+
+
+def test_save_load_features(raw_dataset, tmp_path):
+    _, df = load_data({"dataset": raw_dataset}, file_format="parquet").popitem()
+    pipeline_model = Pipeline(
+        stages=[
+            BinsOrdinalEncoder(
+                inputCol="ca", outputCol="ca_bin", bins=[[0, 50], [50, float("inf")]]
+            ),
+            MissingValuesDropper(inputCols=["ca_bin", "ebe"]),
+            VectorAssembler(inputCols=["ca_bin", "ebe"], outputCol="features"),
+        ]
+    ).fit(df)
+    pre_dataset = pipeline_model.transform(df)
+    store_path = str(tmp_path / "store")
+
+    assert load_features(store_path, "key") is None
+    save_features(store_path, "key", pipeline_model, pre_dataset)
+    loaded_model, loaded_dataset = load_features(store_path, "key")
+    assert sorted(loaded_dataset.collect()) == sorted(pre_dataset.collect())
+    assert sorted(loaded_model.transform(df).collect()) == sorted(pre_dataset.collect())
+
+
+def test_preprocessing_key(spark, raw_dataset):
+    _, df = load_data({"dataset": raw_dataset}, file_format="parquet").popitem()
+    configuration = ConfigurationHelper("standard.json")
+    key = preprocessing_key(df, configuration)
+
+    configuration.learning.model_params["LogisticRegression"]["regParam"] = 1.0
+    assert preprocessing_key(df, configuration) == key
+
+    max_drop_ratio = configuration.preprocessing.max_drop_ratio
+    configuration.preprocessing.max_drop_ratio = 0.123
+    assert preprocessing_key(df, configuration) != key
+    configuration.preprocessing.max_drop_ratio = max_drop_ratio
+    assert preprocessing_key(df, configuration) == key
+
+    write_data(
+        spark.createDataFrame(
+            [("043339338", dt.date(2020, 3, 1), 1.0, 1.0)],
+            df.schema,
+        ),
+        raw_dataset,
+        "parquet",
+        overwrite_partitions=True,
+    )
+    _, df = load_data({"dataset": raw_dataset}, file_format="parquet").popitem()
+    assert preprocessing_key(df, configuration) != key
@@ -0,0 +1,163 @@
+import datetime as dt
+
+import pytest
+from pyspark.sql import functions as F
+from pyspark.sql import types as T
+
+import sf_datalake.utils
+from sf_datalake.io import (
+    csv_to_columnar,
+    load_data,
+    partitions_predicate,
+    write_data,
+    writer_options,
+)
+from sf_datalake.schemas import SCHEMAS
+
+
+@pytest.fixture
+def monthly_df(spark):
+    schema = T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("période", T.DateType(), False),
+            T.StructField("ca", T.DoubleType(), True),
+        ]
+    )
+    # fmt: off
+    return spark.createDataFrame(
+        [
+            ("043339338", dt.date(2020, 1, 1), 1.0),
+            ("043339338", dt.date(2020, 2, 1), 2.0),
+            ("293736607", dt.date(2020, 1, 1), 3.0),
+            ("293736607", dt.date(2020, 2, 1), 4.0),
+        ],
+        schema,
+    )
+    # fmt: on
+
+
+def test_partitioned_load(monthly_df, tmp_path):
+    output_path = str(tmp_path / "dataset")
+    write_data(monthly_df, output_path, "orc", partition_by=["période"])
+    _, df = load_data(
+        {"dataset": output_path},
+        file_format="orc",
+        columns=["siren", "ca", "période"],
+        filters=F.col("période") == dt.date(2020, 2, 1),
+    ).popitem()
+    assert df.columns == ["siren", "ca", "période"]
+    assert sorted(r["ca"] for r in df.collect()) == [2.0, 4.0]
+
+
+@pytest.mark.parametrize("file_format", ["orc", "parquet"])
+def test_overwrite_partitions(spark, monthly_df, tmp_path, file_format):
+    output_path = str(tmp_path / "dataset")
+    overwrite_mode_key = "spark.sql.sources.partitionOverwriteMode"
+    overwrite_mode = spark.conf.get(overwrite_mode_key)
+    write_data(monthly_df, output_path, file_format, partition_by=["période"])
+    write_data(
+        monthly_df.filter(F.col("période") == dt.date(2020, 2, 1)).withColumn(
+            "ca", F.col("ca") * 10
+        ),
+        output_path,
+        file_format,
+        partition_by=["période"],
+        overwrite_partitions=True,
+    )
+    _, df = load_data({"dataset": output_path}, file_format=file_format).popitem()
+    assert sorted(r["ca"] for r in df.collect()) == [1.0, 3.0, 20.0, 40.0]
+    # Later overwrites in the same session should not be affected.
+    assert spark.conf.get(overwrite_mode_key) == overwrite_mode
+
+
+def test_overwrite_delta_partitions_without_partitioning(monthly_df, tmp_path):
+    with pytest.raises(ValueError, match="partition_by"):
+        write_data(
+            monthly_df, str(tmp_path / "dataset"), "delta", overwrite_partitions=True
+        )
+
+
+def test_partitions_predicate(monthly_df):
+    predicate = partitions_predicate(
+        monthly_df.filter(F.col("ca") > 1.5), ["siren", "période"]
+    )
+    df = monthly_df.filter(predicate)
+    assert sorted(r["ca"] for r in df.collect()) == [2.0, 3.0, 4.0]
+    empty_predicate = partitions_predicate(monthly_df.limit(0), ["période"])
+    assert monthly_df.filter(empty_predicate).count() == 0
+
+
+@pytest.fixture
+def effectif_csv(tmp_path):
+    csv_path = tmp_path / "effectif.csv"
+    csv_path.write_text(
+        "siren,période,effectif\n043339338,2020-01-01,12\n293736607,2020-02-01,3\n"
+    )
+    return str(csv_path)
+
+
+def test_load_registered_csv(effectif_csv):
+    _, df = load_data(
+        {"dataset": effectif_csv}, file_format="csv", source="effectif"
+    ).popitem()
+    assert df.dtypes == [
+        (field.name, field.dataType.simpleString()) for field in SCHEMAS["effectif"]
+    ]
+    # Dataset names are not matched against registered sources.
+    _, df = load_data(
+        {"effectif": effectif_csv}, file_format="csv", infer_schema=False
+    ).popitem()
+    assert [field.dataType for field in df.schema] == [T.StringType()] * 3
+    assert df.collect()[0]["siren"] == "043339338"
+
+
+def test_load_unknown_source(effectif_csv):
+    with pytest.raises(ValueError, match="Unknown source"):
+        load_data({"dataset": effectif_csv}, file_format="csv", source="unknown")
+
+
+def test_csv_to_columnar(effectif_csv, tmp_path):
+    output_path = str(tmp_path / "effectif")
+    csv_to_columnar(effectif_csv, output_path, "parquet", source="effectif")
+    _, df = load_data(
+        {"effectif": effectif_csv}, file_format="csv", source="effectif"
+    ).popitem()
+    converted_df = df.sql_ctx.sparkSession.read.parquet(output_path)
+    assert converted_df.dtypes == df.dtypes
+    assert sorted(converted_df.collect()) == sorted(df.collect())
+
+
+def test_parquet_write_options(monthly_df, tmp_path):
+    output_path = tmp_path / "dataset"
+    write_data(
+        monthly_df,
+        str(output_path),
+        "parquet",
+        partition_by=["période"],
+        compression="gzip",
+        block_size=2**20,
+        bloom_filter_columns=["siren"],
+    )
+    assert all(f.name.endswith(".gz.parquet") for f in output_path.glob("*/*.parquet"))
+    _, df = load_data(
+        {"dataset": str(output_path)},
+        file_format="parquet",
+        filters=F.col("siren") == "293736607",
+    ).popitem()
+    assert sorted(r["ca"] for r in df.collect()) == [3.0, 4.0]
+
+
+def test_writer_options(monkeypatch):
+    assert writer_options("orc", "zlib", 2**20, ["siren", "période"]) == {
+        "compression": "zlib",
+        "orc.stripe.size": "1048576",
+        "orc.bloom.filter.columns": "siren,période",
+    }
+    monkeypatch.setattr(sf_datalake.utils, "spark_version", lambda: (3, 3))
+    assert writer_options("parquet", "zstd", None, ["siren"]) == {
+        "compression": "zstd",
+        "parquet.bloom.filter.enabled#siren": "true",
+    }
+    monkeypatch.setattr(sf_datalake.utils, "spark_version", lambda: (2, 3))
+    assert writer_options("parquet", None, None, ["siren"]) == {}
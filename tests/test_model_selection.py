@@ -1,9 +1,11 @@
+import datetime as dt
 import random
 
 import pytest
 
-from sf_datalake.model_selection import train_test_split
-from tests.conftest import MockDataFrameGenerator
+from sf_datalake.model_selection import learning_subsets, train_test_split
+from sf_datalake.transform import RandomResampler
+from tests.conftest import MockDataFrameGenerator, SparkJobCounter
 
 
 @pytest.fixture(scope="class")
@@ -46,3 +48,61 @@ class TestTrainTestSplit:
             < test_data.count() / n_samples
             < test_size + tolerance
         )
+
+
+@pytest.fixture
+def learning_dataset(spark):
+    return spark.createDataFrame(
+        [
+            (f"{siren:09d}", dt.date(2020, month, 1), int(siren % 5 == 0))
+            for siren in range(100)
+            for month in range(1, 7)
+        ],
+        ["siren", "période", "failure"],
+    )
+
+
+def test_learning_subsets_jobs(spark, learning_dataset):
+    # Mimics the sequence of operations of a run, from the pre-processed dataset to
+    # the resampled train set. Broadcasting split groups would run extra jobs, which do
+    # not read the dataset again.
+    broadcast_threshold = spark.conf.get("spark.sql.autoBroadcastJoinThreshold")
+    spark.conf.set("spark.sql.autoBroadcastJoinThreshold", "-1")
+    try:
+        with SparkJobCounter(spark) as counter:
+            subsets, class_counts = learning_subsets(
+                learning_dataset,
+                (dt.date(2020, 1, 1), dt.date(2020, 6, 1)),
+                dt.date(2020, 6, 1),
+                class_col="failure",
+                random_seed=0,
+                train_size=0.8,
+            )
+            resampler = RandomResampler(
+                class_col="failure",
+                method="oversampling",
+                min_class_ratio=0.4,
+                seed=0,
+                class_counts=class_counts["train"],
+            )
+            resampler.transform(subsets["train"])
+            resampler.resampled_size(class_counts["train"])
+    finally:
+        spark.conf.set("spark.sql.autoBroadcastJoinThreshold", broadcast_threshold)
+    assert counter.n_jobs == 1
+    assert (
+        sum(class_counts["train"].values()) + sum(class_counts["test"].values())
+        == 100 * 5
+    )
+    assert class_counts["prediction"] == {0: 80, 1: 20}
+
+
+def test_learning_subsets_empty(learning_dataset):
+    with pytest.raises(ValueError, match="Prediction dataset is empty"):
+        learning_subsets(
+            learning_dataset,
+            (dt.date(2020, 1, 1), dt.date(2020, 6, 1)),
+            dt.date(2021, 1, 1),
+            class_col="failure",
+            random_seed=0,
+        )
@@ -0,0 +1,107 @@
+import gzip
+import json
+
+import pytest
+
+import sf_datalake.predictions
+from sf_datalake.predictions import dump_records, iter_records, merge_predictions_lists
+
+RECORDS = [
+    {"siren": "043339338", "probability": 0.8, "macroRadar": {"dette": 0.12}},
+    {"siren": "293736607", "probability": 0.1, "alert": "Pas d'alerte"},
+]
+
+
+@pytest.mark.parametrize("records", [RECORDS, RECORDS[:1], []])
+def test_dump_records_json(tmp_path, records):
+    output_path = str(tmp_path / "predictions.json")
+    dump_records(iter(records), output_path)
+    with open(output_path, encoding="utf-8") as f:
+        assert f.read() == json.dumps(records, indent=4)
+
+
+def test_dump_records_ndjson_gzip(tmp_path):
+    output_path = str(tmp_path / "predictions.ndjson.gz")
+    dump_records(iter(RECORDS), output_path, output_format="ndjson")
+    with gzip.open(output_path, mode="rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == RECORDS
+
+
+@pytest.fixture
+def predictions_paths(tmp_path):
+    # fmt: off
+    lists = [
+        [{"siren": "043339338", "score": 0.1}, {"siren": "293736607", "score": 0.2}],
+        [{"siren": "219385723", "score": 0.3}, {"siren": "043339338", "score": 0.4}],
+    ]
+    # fmt: on
+    paths = [str(tmp_path / "list_0.json"), str(tmp_path / "list_1.ndjson.gz")]
+    dump_records(lists[0], paths[0])
+    dump_records(lists[1], paths[1], output_format="ndjson")
+    return paths
+
+
+def test_iter_records(predictions_paths):
+    with open(predictions_paths[0], mode="rb") as f:
+        content = f.read()
+    for offset, length, record in iter_records(predictions_paths[0], chunk_size=5):
+        assert json.loads(content[offset : offset + length]) == record
+
+
+def test_merge_predictions_lists(tmp_path, predictions_paths):
+    output_path = str(tmp_path / "merged.json")
+    merge_predictions_lists(predictions_paths, output_path)
+    with open(output_path, encoding="utf-8") as f:
+        assert json.load(f) == [
+            {"siren": "043339338", "score": 0.4},
+            {"siren": "293736607", "score": 0.2},
+            {"siren": "219385723", "score": 0.3},
+        ]
+
+
+def test_merge_predictions_lists_shards(tmp_path, predictions_paths):
+    output_dir = tmp_path / "merged"
+    merge_predictions_lists(
+        predictions_paths, str(output_dir), output_format="ndjson", n_shards=2
+    )
+    merged = {
+        record["siren"]: record["score"]
+        for path in output_dir.iterdir()
+        for _, _, record in iter_records(str(path))
+    }
+    assert merged == {"043339338": 0.4, "293736607": 0.2, "219385723": 0.3}
+
+
+def test_merge_predictions_lists_gzip(tmp_path, monkeypatch):
+    # SIRENs appear in opposite orders, so that records are read back non sequentially.
+    records = [{"siren": f"{i:09d}", "score": i / 100} for i in range(100)]
+    paths = [str(tmp_path / "list_0.json.gz"), str(tmp_path / "list_1.json.gz")]
+    dump_records(records, paths[0])
+    dump_records(reversed(records[:50]), paths[1])
+
+    def no_seek(*args, **kwargs):
+        raise AssertionError("Compressed inputs should not be seeked.")
+
+    monkeypatch.setattr(gzip.GzipFile, "seek", no_seek)
+    output_path = str(tmp_path / "merged.json")
+    merge_predictions_lists(paths, output_path)
+    with open(output_path, encoding="utf-8") as f:
+        assert json.load(f) == records
+
+
+def test_merge_predictions_lists_shards_decompress_once(
+    tmp_path, monkeypatch, predictions_paths
+):
+    n_decompressions = 0
+    uncompressed_copies = sf_datalake.predictions._uncompressed_copies
+
+    def counting_uncompressed_copies(paths):
+        nonlocal n_decompressions
+        n_decompressions += 1
+        return uncompressed_copies(paths)
+
+    monkeypatch.setattr(
+        sf_datalake.predictions, "_uncompressed_copies", counting_uncompressed_copies
+    )
+    merge_predictions_lists(predictions_paths, str(tmp_path / "merged"), n_shards=3)
+    assert n_decompressions == 1
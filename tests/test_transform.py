@@ -2,16 +2,30 @@ import datetime as dt
 import random
 
 import pytest
+from pyspark.ml import PipelineModel
+from pyspark.ml.feature import VectorAssembler
+from pyspark.sql import Window
+from pyspark.sql import functions as F
 from pyspark.sql import types as T
 
 from sf_datalake.transform import (
     DateParser,
+    DebtHistoryAggregator,
+    DiffOperator,
     IdentifierNormalizer,
+    InstrumentedPipelineModel,
+    IntervalExploder,
     LagOperator,
+    LinearInterpolationOperator,
+    MissingValuesDropper,
     MissingValuesHandler,
+    MovingAverage,
     RandomResampler,
+    TimeAggregationOperator,
+    vector_disassembler,
 )
-from tests.conftest import MockDataFrameGenerator
+from sf_datalake.utils import spark_version
+from tests.conftest import MockDataFrameGenerator, SparkJobCounter
 
 
 @pytest.fixture
@@ -132,6 +146,49 @@ def fixture_missing_value_handler_df(spark):
     return df
 
 
+@pytest.fixture(scope="class")
+def interpolation_df(spark):
+    schema = T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("période", T.DateType(), False),
+            T.StructField("x", T.DoubleType(), True),
+            T.StructField("y", T.DoubleType(), True),
+            T.StructField("expected_x", T.DoubleType(), True),
+            T.StructField("expected_y", T.DoubleType(), True),
+        ]
+    )
+    # fmt: off
+    df = spark.createDataFrame(
+        [
+            ("043339338", dt.date(2018, 1, 1), 1.0,  0.0,  1.0,  0.0),
+            ("043339338", dt.date(2018, 2, 1), None, None, 2.0,  5.0),
+            ("043339338", dt.date(2018, 3, 1), None, 10.0, 3.0,  10.0),
+            ("043339338", dt.date(2018, 4, 1), 4.0,  None, 4.0,  None),
+            ("043339338", dt.date(2018, 5, 1), None, None, 7.0,  None),
+            ("043339338", dt.date(2018, 6, 1), 10.0, None, 10.0, None),
+            ("293736607", dt.date(2020, 1, 1), None, 3.0,  None, 3.0),
+            ("293736607", dt.date(2020, 2, 1), 2.0,  None, 2.0,  3.0),
+            ("293736607", dt.date(2020, 3, 1), None, 3.0,  None, 3.0),
+        ],
+        schema=schema,
+    )
+    # fmt: on
+    return df
+
+
+def test_vector_disassembler():
+    df = MockDataFrameGenerator(n_siren=10).data.withColumn("ca", F.col("ca") * 1.0)
+    assembled = VectorAssembler(inputCols=["ca", "ebe"], outputCol="v").transform(df)
+    disassembled = vector_disassembler(
+        assembled, ["ca_out", "ebe_out"], assembled_col="v", keep=["ca", "ebe"]
+    )
+    assert all(
+        r["ca"] == r["ca_out"] and r["ebe"] == r["ebe_out"]
+        for r in disassembled.collect()
+    )
+
+
 def test_siren_padding(siren_padding_df):
     df = IdentifierNormalizer(inputCol="siren", n_pad=9).transform(siren_padding_df)
     assert all(r["siren"] == r["padded_siren"] for r in df.collect())
@@ -169,6 +226,22 @@ class TestRandomResampler:
         ).transform(random_resampler_df)
         return self.check_balance(oversampled_df, min_class_ratio, tolerance)
 
+    def test_known_class_counts(self, spark, random_resampler_df):
+        class_counts = random_resampler_df.groupBy("label").count().rdd.collectAsMap()
+        resampler = RandomResampler(
+            class_col="label",
+            seed=42,
+            min_class_ratio=0.5,
+            method="undersampling",
+            class_counts=class_counts,
+        )
+        with SparkJobCounter(spark) as counter:
+            undersampled_df = resampler.transform(random_resampler_df)
+        assert counter.n_jobs == 0
+        assert undersampled_df.count() == pytest.approx(
+            resampler.resampled_size(class_counts), rel=0.2
+        )
+
     def test_class_balance_undersampling(self, random_resampler_df):
         tolerance = 0.2
         min_class_ratio = 0.5
@@ -218,3 +291,276 @@ class TestLagOperator:
             n_months=1,
         ).transform(lag_operator_df)
         assert all(r["expected_ca_lag1m"] == r["ca_lag1m"] for r in df_1m.collect())
+
+
+@pytest.mark.usefixtures("lag_operator_df")
+class TestTimeAggregationOperator:
+    def test_matches_single_operators(self, lag_operator_df):
+        time_aggregation = {
+            "lag": {"ca": [1, 2]},
+            "diff": {"ca": 3},
+            "mean": {"ca": [2]},
+        }
+        expected = PipelineModel(
+            [
+                LagOperator(inputCol="ca", n_months=[1, 2]),
+                DiffOperator(inputCol="ca", n_months=3),
+                MovingAverage(inputCol="ca", n_months=[2]),
+            ]
+        ).transform(lag_operator_df)
+        df = TimeAggregationOperator(time_aggregation=time_aggregation).transform(
+            lag_operator_df
+        )
+        output_cols = ["ca_lag1m", "ca_lag2m", "ca_diff3m", "ca_mean2m"]
+        assert df.columns == lag_operator_df.columns + output_cols
+        assert sorted(
+            df.select(["siren", "période"] + output_cols).collect()
+        ) == sorted(expected.select(["siren", "période"] + output_cols).collect())
+
+    def test_look_back(self, lag_operator_df):
+        # Mimics the incremental mode of `post_join_processing.py`, where only the
+        # periods starting from `since` are computed, using `look_back` past months.
+        operator = TimeAggregationOperator(
+            time_aggregation={"lag": {"ca": [1, 2]}, "mean": {"ca": 3}}
+        )
+        assert operator.look_back() == 3
+        since = dt.date(2018, 6, 1)
+        expected = operator.transform(lag_operator_df).filter(F.col("période") >= since)
+        df = operator.transform(
+            lag_operator_df.filter(
+                F.col("période") >= F.add_months(F.lit(since), -operator.look_back())
+            )
+        ).filter(F.col("période") >= since)
+        assert sorted(df.collect()) == sorted(expected.collect())
+
+
+@pytest.mark.usefixtures("interpolation_df")
+class TestLinearInterpolationOperator:
+    def check_interpolation(self, df):
+        assert all(
+            r["x"] == r["expected_x"] and r["y"] == r["expected_y"]
+            for r in df.collect()
+        )
+
+    def test_projection_mode(self, interpolation_df):
+        df = LinearInterpolationOperator(
+            inputCols=["x", "y"], mode="projection"
+        ).transform(interpolation_df)
+        assert df.columns == interpolation_df.columns
+        self.check_interpolation(df)
+
+    def test_pandas_mode(self, interpolation_df):
+        pytest.importorskip("pyarrow")
+        df = LinearInterpolationOperator(inputCols=["x", "y"], mode="pandas").transform(
+            interpolation_df
+        )
+        self.check_interpolation(df)
+
+
+@pytest.fixture
+def intervals_df(spark):
+    schema = T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("date_début", T.DateType(), False),
+            T.StructField("date_fin", T.DateType(), False),
+        ]
+    )
+    # fmt: off
+    return spark.createDataFrame(
+        [
+            ("043339338", dt.date(2013, 11, 15), dt.date(2014, 3, 1)),
+            ("293736607", dt.date(2020, 2, 1), dt.date(2020, 2, 4)),
+            ("293736607", dt.date(2020, 5, 10), dt.date(2020, 5, 20)),
+        ],
+        schema,
+    )
+    # fmt: on
+
+
+class TestIntervalExploder:
+    def test_monthly(self, intervals_df):
+        df = IntervalExploder(
+            start="date_début",
+            end="date_fin",
+            frequency="month",
+            min_date="2014-01-01",
+        ).transform(intervals_df)
+        assert df.columns == intervals_df.columns + ["période"]
+        assert sorted((r["siren"], r["période"]) for r in df.collect()) == [
+            ("043339338", dt.date(2014, 1, 1)),
+            ("043339338", dt.date(2014, 2, 1)),
+            ("293736607", dt.date(2020, 2, 1)),
+        ]
+
+    def test_daily_end_inclusive(self, intervals_df):
+        df = IntervalExploder(
+            start="date_début",
+            end="date_fin",
+            frequency="day",
+            min_date="2014-01-01",
+            max_date="2020-05-11",
+            end_inclusive=True,
+        ).transform(intervals_df.filter(F.col("siren") == "293736607"))
+        assert sorted(r["période"] for r in df.collect()) == [
+            dt.date(2020, 2, 1),
+            dt.date(2020, 2, 2),
+            dt.date(2020, 2, 3),
+            dt.date(2020, 2, 4),
+            dt.date(2020, 5, 10),
+            dt.date(2020, 5, 11),
+        ]
+
+
+@pytest.fixture
+def debit_df(spark):
+    schema = T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("numéro_compte", T.StringType(), True),
+            T.StructField("numéro_écart_négatif", T.IntegerType(), True),
+            T.StructField("période_cotisation", T.StringType(), True),
+            T.StructField("numéro_historique_écart_négatif", T.ShortType(), True),
+            T.StructField("date_traitement", T.StringType(), False),
+            T.StructField("dette_sociale_ouvrière", T.DoubleType(), True),
+            T.StructField("dette_sociale_patronale", T.DoubleType(), True),
+        ]
+    )
+    random.seed(42)
+    rows = []
+    for _ in range(300):
+        siren = f"00000000{random.randint(0, 4)}"
+        processing_date = dt.date(2019, 1, 1) + dt.timedelta(random.randint(0, 700))
+        rows.append(
+            (
+                siren,
+                f"{siren}_{random.randint(0, 2)}",
+                random.randint(0, 2),
+                "2019-01-01",
+                random.randint(0, 5),
+                processing_date.isoformat(),
+                random.randint(0, 100000) / 100,
+                random.choice([None, random.randint(0, 100000) / 100]),
+            )
+        )
+    # Only keep one row per (debt, history index): updates sharing the same index are
+    # ambiguous in the reference algorithm.
+    unique_rows = {row[:5]: row for row in rows}
+    return spark.createDataFrame(list(unique_rows.values()), schema)
+
+
+def test_debt_history_aggregator(spark, debit_df):
+    amounts = ["dette_sociale_ouvrière", "dette_sociale_patronale"]
+    min_date, max_date = dt.date(2019, 6, 1), dt.date(2021, 3, 1)
+    df = DebtHistoryAggregator(
+        inputCols=amounts, min_date=min_date, max_date=max_date
+    ).transform(debit_df)
+
+    # Reference: join every debt update with all subsequent months.
+    months = spark.createDataFrame(
+        [
+            (dt.date(year, month, 1),)
+            for year in range(2019, 2022)
+            for month in range(1, 13)
+            if min_date <= dt.date(year, month, 1) <= max_date
+        ],
+        ["période"],
+    )
+    w = Window().partitionBy(
+        ["numéro_compte", "numéro_écart_négatif", "période", "période_cotisation"]
+    )
+    expected = (
+        debit_df.join(
+            months,
+            on=months["période"] >= F.to_date(debit_df["date_traitement"]),
+            how="inner",
+        )
+        .withColumn("max_historique", F.max("numéro_historique_écart_négatif").over(w))
+        .filter(F.col("numéro_historique_écart_négatif") == F.col("max_historique"))
+        .groupBy(["siren", "période"])
+        .agg(*(F.sum(F.coalesce(col, F.lit(0.0))).alias(col) for col in amounts))
+    )
+
+    def as_dict(df):
+        return {
+            (r["siren"], r["période"]): tuple(r[col] for col in amounts)
+            for r in df.collect()
+        }
+
+    output, reference = as_dict(df), as_dict(expected)
+    assert df.columns == ["siren", "période"] + amounts
+    assert output.keys() == reference.keys()
+    assert all(
+        output[key] == pytest.approx(reference[key], abs=1e-6) for key in reference
+    )
+
+
+@pytest.fixture
+def missing_values_df(spark):
+    schema = T.StructType(
+        [
+            T.StructField("siren", T.StringType(), False),
+            T.StructField("ca", T.DoubleType(), True),
+            T.StructField("effectif", T.IntegerType(), True),
+        ]
+    )
+    # fmt: off
+    return spark.createDataFrame(
+        [
+            ("043339338", 1.0, 10),
+            ("043339338", None, 12),
+            ("293736607", float("nan"), 5),
+            ("293736607", 4.0, None),
+            ("293736607", 5.0, 8),
+        ],
+        schema,
+    )
+    # fmt: on
+
+
+class TestMissingValuesDropper:
+    def test_dropped_rows(self, missing_values_df):
+        dropper = MissingValuesDropper(inputCols=["ca", "effectif"])
+        df = dropper.transform(missing_values_df)
+        assert df.count() == 2
+        if spark_version() >= (3, 3):
+            assert dropper.dropped_rows() == (5, 3)
+        else:
+            assert dropper.dropped_rows() is None
+
+    def test_dropped_rows_not_computed(self, missing_values_df):
+        dropper = MissingValuesDropper(inputCols=["ca", "effectif"])
+        dropper.transform(missing_values_df)
+        assert dropper.dropped_rows(timeout=0.1) is None
+
+    def test_max_drop_ratio(self, missing_values_df):
+        df = MissingValuesDropper(inputCols=["ca"], max_drop_ratio=0.5).transform(
+            missing_values_df
+        )
+        assert df.count() == 3
+        with pytest.raises(ValueError):
+            MissingValuesDropper(
+                inputCols=["ca", "effectif"], max_drop_ratio=0.5
+            ).transform(missing_values_df)
+
+
+def test_instrumented_pipeline_model(missing_values_df):
+    pipeline_model = InstrumentedPipelineModel(
+        [
+            MissingValuesDropper(inputCols=["ca"]),
+            MissingValuesDropper(inputCols=["effectif"]),
+        ],
+        count_rows=True,
+    )
+    df = pipeline_model.transform(missing_values_df)
+    assert df.count() == 2
+    assert [metrics["n_rows"] for metrics in pipeline_model.metrics] == [3, 2]
+    assert all(
+        metrics["class"] == "MissingValuesDropper"
+        and metrics["wall_time"] >= 0
+        and metrics["n_partitions"] > 0
+        and metrics["estimated_size_in_bytes"] > 0
+        for metrics in pipeline_model.metrics
+    )
+    assert df.is_cached
+    df.unpersist()
@@ -1,9 +1,16 @@
 import datetime as dt
+from types import SimpleNamespace
 
 import pytest
 from pyspark.sql import types as T
 
-from sf_datalake.utils import merge_asof
+from sf_datalake.utils import (
+    count_by_subset,
+    estimated_size_in_bytes,
+    map_in_pandas,
+    merge_asof,
+)
+from tests.conftest import SparkJobCounter
 
 
 @pytest.fixture
@@ -31,7 +38,7 @@ def df_merged_asof_365(spark):
             ("043339338", dt.date(2018, 8, 1), 87, "806", 40, None, 40),
             ("043339338", dt.date(2018, 9, 1), 68, "979", 40, None, 40),
             ("043339338", dt.date(2018, 10, 1), 21, "387", 40, None, 40),
-            ("293736607", dt.date(2019, 12, 1), 23, "107", 50, 70, 50),
+            ("293736607", dt.date(2019, 12, 1), 23, "107", 50, 70, 70),
             ("293736607", dt.date(2020, 1, 1), 97, "107", 50, 70, 70),
             ("293736607", dt.date(2020, 2, 1), 96, "538", 70, 70, 70),
             ("293736607", dt.date(2020, 3, 1), 33, "068", 70, 30, 70),
@@ -127,3 +134,73 @@ def test_merge_asof_forward(df_left, df_right, df_merged_asof_365):
         r["ebe"] == r_merge["ebe_forward"]
         for r, r_merge in zip(df.collect(), df_merged_asof_365.collect())
     )
+
+
+def test_merge_asof_nearest(df_left, df_right, df_merged_asof_365):
+    df = merge_asof(
+        df_left, df_right, on="période", by="siren", tolerance=365, direction="nearest"
+    ).orderBy(["siren", "période"])
+    assert all(
+        r["ebe"] == r_merge["ebe_nearest"]
+        for r, r_merge in zip(df.collect(), df_merged_asof_365.collect())
+    )
+
+
+def test_merge_asof_columns(df_left, df_right):
+    df = merge_asof(df_left, df_right, on="période", by="siren", direction="backward")
+    assert df.columns == df_left.columns + ["ebe"]
+    assert df.count() == df_left.count()
+
+
+def test_count_by_subset(spark, df_left):
+    with SparkJobCounter(spark) as counter:
+        counts = count_by_subset(
+            {
+                "all": df_left,
+                "2018": df_left.filter(df_left["période"] < dt.date(2019, 1, 1)),
+                "empty": df_left.filter(df_left["période"] > dt.date(2100, 1, 1)),
+            },
+            "siren",
+        )
+    assert counter.n_jobs == 1
+    assert counts == {
+        "all": {"043339338": 10, "293736607": 11},
+        "2018": {"043339338": 10},
+        "empty": {},
+    }
+
+
+def test_map_in_pandas(spark, df_left):
+    def batch_length(batches):
+        for batch in batches:
+            yield batch[["siren"]].assign(n_rows=len(batch))
+
+    schema = T.StructType(
+        [
+            T.StructField("siren", T.StringType()),
+            T.StructField("n_rows", T.LongType()),
+        ]
+    )
+    df = map_in_pandas(df_left.coalesce(1), batch_length, schema, batch_size=4)
+    assert df.count() == df_left.count()
+    assert df.schema == schema
+
+
+def test_estimated_size_in_bytes(spark):
+    size = estimated_size_in_bytes(spark.range(1000))
+    assert isinstance(size, int) and size > 0
+
+
+class JavaBigInt:
+    def toString(self):
+        return "12345678901234567890"
+
+
+@pytest.mark.parametrize("size", [12345678901234567890, JavaBigInt()])
+def test_estimated_size_in_bytes_conversion(size):
+    # Depending on py4j version, scala's BigInt may or may not be converted to an int.
+    stats = SimpleNamespace(sizeInBytes=lambda: size)
+    plan = SimpleNamespace(stats=lambda: stats)
+    query_execution = SimpleNamespace(optimizedPlan=lambda: plan)
+    df = SimpleNamespace(_jdf=SimpleNamespace(queryExecution=lambda: query_execution))
+    assert estimated_size_in_bytes(df) == 12345678901234567890